@@ -1,6 +1,5 @@
-from flask import Flask, request, url_for
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+import click
+from flask import Flask, current_app
 from flask_bcrypt import Bcrypt
 from flask_wtf.csrf import CSRFProtect
 from flask_login import LoginManager
@@ -8,37 +7,33 @@ from flask_mail import Mail
 from datetime import datetime
 from flask_login import UserMixin
 import itsdangerous
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
-from config import Config
+from config import get_config
+from utils.routing import RoutingSQLAlchemy
 
-app = Flask(__name__)
-app._static_folder = 'static'
-app.config['SECRET_KEY'] = '5791628bb0b13ce0c676df2de280ba245'
-app.config.from_object(Config)
-db = SQLAlchemy(app)
-
-bcrypt = Bcrypt(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+# Расширения создаются без приложения и подключаются в create_app.
+db = RoutingSQLAlchemy()
+bcrypt = Bcrypt()
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
 login_manager.login_message_category = 'info'
-mail = Mail(app)
-
-
-migrate = Migrate(app, db)
-csrf = CSRFProtect(app)
-
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+mail = Mail()
+csrf = CSRFProtect()
 
 
 followers = db.Table('followers',
                      db.Column('follower_id', db.Integer,
                                db.ForeignKey('user.id')),
                      db.Column('followed_id', db.Integer,
-                               db.ForeignKey('user.id'))
+                               db.ForeignKey('user.id')),
+                     # Одна подписка на пару пользователей.
+                     db.Index('ix_followers_follower_followed',
+                              'follower_id', 'followed_id', unique=True),
+                     # Поиск подписчиков автора.
+                     db.Index('ix_followers_followed_follower',
+                              'followed_id', 'follower_id'),
                      )
 
 
@@ -54,7 +49,7 @@ class User(db.Model, UserMixin):
     posts = db.relationship('Post', backref='author', lazy=True)
     comments = db.relationship('Comment', backref='author', lazy=True)
     # Отображение последнего посещения.
-    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     # Персональные данные, необязательные, для профиля
     age = db.Column(db.Integer,
                     default='Не заполнено.', nullable=True)
@@ -73,29 +68,39 @@ class User(db.Model, UserMixin):
         backref='Подписчики',
         lazy='dynamic')
     likes = db.relationship('Like', backref='user', lazy=True)
-    messages = db.relationship('Message', backref='user', lazy=True)
+    # Счетчики для профиля, обновляются в utils/counters.py.
+    posts_count = db.Column(db.Integer, nullable=False, default=0,
+                            server_default='0')
+    likes_count = db.Column(db.Integer, nullable=False, default=0,
+                            server_default='0')
+    comments_count = db.Column(db.Integer, nullable=False, default=0,
+                               server_default='0')
+    followers_count = db.Column(db.Integer, nullable=False, default=0,
+                                server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0,
+                                server_default='0')
+    # Заполнена ли лента постов избранных авторов (utils/timeline.py).
+    timeline_built = db.Column(db.Boolean, nullable=False, default=False,
+                               server_default='0')
+    # Непрочитанные личные сообщения во всех переписках.
+    unread_messages = db.Column(db.Integer, nullable=False, default=0,
+                                server_default='0')
 
     def __repr__(self):
         return self.username
 
-    def follow(self, user):
-        """Добавления в избранные авторы."""
-        if not self.is_following(user):
-            self.followed.append(user)
-
-    def unfollow(self, user):
-        """Удаление из избранных авторов."""
-        if self.is_following(user):
-            self.followed.remove(user)
-
     def is_following(self, user):
-        """Проверка, является ли подписчиком."""
-        return self.followed.filter(
-            followers.c.followed_id == user.id).count() > 0
+        """Проверка, является ли подписчиком. Подписка и отписка,
+        а также проверка списком - в utils/follows.py.
+        """
+        return db.session.query(followers.c.follower_id).filter(
+            followers.c.follower_id == self.id,
+            followers.c.followed_id == user.id,
+        ).first() is not None
 
     def get_reset_token(self):
         """Получение токкена."""
-        auth_s = itsdangerous.Serializer(app.config['SECRET_KEY'])
+        auth_s = itsdangerous.Serializer(current_app.config['SECRET_KEY'])
         return auth_s.dumps({'user_id': self.id})
 
     @staticmethod
@@ -103,7 +108,7 @@ class User(db.Model, UserMixin):
         """Подтверждение токена из письма,
         отправленного на почту при смене пароля.
         """
-        auth_s = itsdangerous.Serializer(app.config['SECRET_KEY'])
+        auth_s = itsdangerous.Serializer(current_app.config['SECRET_KEY'])
         try:
             user_id = auth_s.loads(token)['user_id']
         except:
@@ -113,6 +118,12 @@ class User(db.Model, UserMixin):
 
 class Post(db.Model):
     """ДМодель отображения всех записей."""
+    __table_args__ = (
+        # Лента всех постов от новых к старым.
+        db.Index('ix_post_created_at_id', 'created_at', 'id'),
+        # Посты конкретного автора от новых к старым.
+        db.Index('ix_post_user_id_created_at', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     created_at = db.Column(
@@ -126,8 +137,14 @@ class Post(db.Model):
         db.ForeignKey('user.id'),
         nullable=False
     )
-    comments = db.relationship('Comment', backref='posts', lazy=True)
-    likes = db.relationship('Like', backref='post', lazy=True)
+    comments = db.relationship('Comment', backref='posts', lazy=True,
+                               cascade='all, delete-orphan')
+    likes = db.relationship('Like', backref='post', lazy=True,
+                            cascade='all, delete-orphan')
+    likes_count = db.Column(db.Integer, nullable=False, default=0,
+                            server_default='0')
+    comments_count = db.Column(db.Integer, nullable=False, default=0,
+                               server_default='0')
 
     def __repr__(self):
         return f"Post '{self.title}', created '{self.created_at}')"
@@ -135,12 +152,18 @@ class Post(db.Model):
 
 class Comment(db.Model):
     """Комментарии к посту."""
+    __table_args__ = (
+        db.Index('ix_comment_post_id_timestamp', 'post_id', 'timestamp'),
+        db.Index('ix_comment_user_id_timestamp', 'user_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.String(100), nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False,
                           default=datetime.utcnow)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Под этим именем дата нужна курсорной пагинации (utils/pagination.py).
+    created_at = db.synonym('timestamp')
 
     def __repr__(self):
         return self.body[:20]
@@ -148,6 +171,11 @@ class Comment(db.Model):
 
 class Like(db.Model):
     """Лайки к посту."""
+    __table_args__ = (
+        # Один лайк от пользователя на пост.
+        db.Index('ix_like_author_post_id', 'author', 'post_id', unique=True),
+        db.Index('ix_like_post_id', 'post_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     author = db.Column(db.Integer, db.ForeignKey(
         'user.id', ondelete="CASCADE"), nullable=False)
@@ -155,15 +183,142 @@ class Like(db.Model):
         'post.id', ondelete="CASCADE"), nullable=False)
 
 
+class TimelineEntry(db.Model):
+    """Пост в ленте подписчика. Записывается при публикации поста."""
+    __table_args__ = (
+        db.Index('ix_timeline_entry_user_id_created_at',
+                 'user_id', 'created_at', 'post_id'),
+        db.Index('ix_timeline_entry_post_id', 'post_id'),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey(
+        'user.id', ondelete="CASCADE"), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey(
+        'post.id', ondelete="CASCADE"), primary_key=True)
+    # Копия post.created_at, чтобы лента сортировалась по своему индексу.
+    created_at = db.Column(db.DateTime, nullable=False)
+
+
+class OutboxMessage(db.Model):
+    """Письмо в очереди на отправку. Отправляется фоновым процессом
+    flask mail-worker из utils/mail_queue.py.
+    """
+    __table_args__ = (
+        db.Index('ix_outbox_message_status_next_attempt_at',
+                 'status', 'next_attempt_at'),
+        db.Index('ix_outbox_message_dedup_key_created_at',
+                 'dedup_key', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(199), nullable=False)
+    # Адреса получателей через запятую.
+    recipients = db.Column(db.Text, nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    # Хеш письма, одинаковые письма в окне MAIL_DEDUP_WINDOW не дублируются.
+    dedup_key = db.Column(db.String(64), nullable=False)
+    # pending, sent или failed.
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False,
+                                default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+
+class Conversation(db.Model):
+    """Переписка. Последнее сообщение скопировано сюда, чтобы список
+    переписок строился без обращения к таблице сообщений.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    # Пара участников личной переписки вида "1:2", меньший id первым.
+    direct_key = db.Column(db.String(32), unique=True, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    last_message_text = db.Column(db.String(199), nullable=True)
+    last_sender_id = db.Column(db.Integer, db.ForeignKey(
+        'user.id', ondelete="SET NULL"), nullable=True)
+
+
+class ConversationMember(db.Model):
+    """Участник переписки со своим счетчиком непрочитанных."""
+    __table_args__ = (
+        # Список переписок пользователя по последней активности.
+        db.Index('ix_conversation_member_user_id_last_activity_at',
+                 'user_id', 'last_activity_at', 'conversation_id'),
+    )
+    conversation_id = db.Column(db.Integer, db.ForeignKey(
+        'conversation.id', ondelete="CASCADE"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey(
+        'user.id', ondelete="CASCADE"), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0,
+                             server_default='0')
+    # Копия conversation.last_message_at для сортировки по индексу.
+    last_activity_at = db.Column(db.DateTime, nullable=False,
+                                 default=datetime.utcnow)
+    conversation = db.relationship('Conversation', lazy=True)
+    user = db.relationship('User', lazy=True)
+
+
 class Message(db.Model):
-    """Личные сообщения."""
+    """Личные сообщения. Отправка и чтение - в utils/messages.py."""
+    __table_args__ = (
+        # История переписки от новых к старым.
+        db.Index('ix_message_conversation_id_timestamp',
+                 'conversation_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey(
+        'conversation.id', ondelete="CASCADE"), nullable=False)
     text = db.Column(db.String(199), nullable=False)
     # Кто отправил.
-    sender = db.Column(db.Integer, db.ForeignKey(
-        'user.id', ondelete="CASCADE"), nullable=False)
-    # Кто получил.
-    getter = db.Column(db.Integer, db.ForeignKey(
+    sender_id = db.Column(db.Integer, db.ForeignKey(
         'user.id', ondelete="CASCADE"), nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False,
                           default=datetime.utcnow)
+    # Имя, под которым сортирует utils/pagination.py.
+    created_at = db.synonym('timestamp')
+    sender = db.relationship('User', lazy=True)
+
+
+def create_app(config=None):
+    """Собирает приложение: настройки профиля config или YATUBE_ENV,
+    расширения, блюпринты и служебные модули из utils. Соединений с
+    базой и потоков здесь не создается, поэтому приложение можно
+    загрузить в мастере gunicorn --preload и разделить между воркерами.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config or get_config())
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app,
+                                x_for=app.config['PROXY_FIX_X_FOR'])
+    db.init_app(app)
+    bcrypt.init_app(app)
+    login_manager.init_app(app)
+    mail.init_app(app)
+    csrf.init_app(app)
+    if click.get_current_context(silent=True) is not None:
+        # Flask-Migrate тянет alembic, а нужен он только командам flask db.
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from auth.views import bp as auth
+    from blog.views import bp as blog
+    from follow.view import bp as follow
+    from profile.views import bp as profile
+    for blueprint in (auth, blog, follow, profile):
+        app.register_blueprint(blueprint)
+
+    # Этим модулям достаточно импорта: они подписываются на события
+    # моделей и движка SQLAlchemy и регистрируют загрузчик пользователя.
+    from utils import database, identity  # noqa: F401
+    from utils import (
+        assets, avatars, cache, counters, events, last_seen, mail_queue,
+        metrics, pagination, passwords, search, timeline,
+    )
+    for module in (cache, assets, avatars, counters, events, last_seen,
+                   mail_queue, metrics, pagination, passwords, search,
+                   timeline):
+        module.init_app(app)
+    return app
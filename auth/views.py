@@ -1,46 +1,65 @@
-from datetime import datetime
-
-from flask import render_template, flash, redirect, url_for, request
+from flask import Blueprint, render_template, flash, redirect, url_for, request
 from flask_login import login_user, current_user, logout_user, login_required
 from flask_mail import Message
 
-from app import app, db, mail, User, bcrypt
+from app import db, mail, User
 from forms import RegistrationForm, LoginForm, RequestResetForm, ResetPassForm
-from utils.utils import send_reset_email, make_hashed_password
+from utils.identity import forget_user
+from utils.last_seen import last_seen_buffer
+from utils.passwords import check_password
+from utils.rate_limit import login_account_limit, login_ip_limit
+from utils.utils import (
+    is_local_url, make_hashed_password, send_reset_email
+)
+
+bp = Blueprint('auth', __name__)
 
-@app.before_request
+
+@bp.before_app_request
 def get_last_seen_before_request():
-    """Отображение последнего визита пользователя."""
-    if current_user.is_authenticated:
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
+    """Отображение последнего визита пользователя.
+    Время визита копится в памяти и записывается в базу фоновым потоком.
+    """
+    if request.endpoint != 'static' and current_user.is_authenticated:
+        last_seen_buffer.touch(current_user)
 
 
-@app.route('/login', methods=['POST', 'GET'])
+@bp.route('/login', methods=['POST', 'GET'], endpoint='login')
 def make_login_user():
     """Авторизация пользователя."""
     form = LoginForm()
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('blog.index'))
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(
-                user.password,
-                form.password.data):
+        email, ip = form.email.data, request.remote_addr
+        # Смена регистра и пробелы не дают обойти лимит аккаунта.
+        account = email.strip().lower()
+        # Лимиты проверяются до bcrypt, самой дорогой части входа.
+        if login_ip_limit.exceeded(ip) or \
+                login_account_limit.exceeded(account):
+            flash('Слишком много попыток входа. Попробуйте позже.', 'danger')
+            return render_template('auth/login.html', form=form), 429
+        login_ip_limit.hit(ip)
+        user = User.query.filter_by(email=email).first()
+        if user and check_password(user, form.password.data):
+            # Сохраняет хеш, пересчитанный с новой стоимостью.
+            db.session.commit()
+            login_account_limit.reset(account)
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(
-                url_for('index'))
+            return redirect(next_page) if is_local_url(next_page) else \
+                redirect(url_for('blog.index'))
         else:
+            login_account_limit.hit(account)
             flash('Проверьте email', 'danger')
     return render_template('auth/login.html', form=form)
 
 
-@app.route("/register", methods=['GET', 'POST'])
+@bp.route("/register", methods=['GET', 'POST'], endpoint='register')
 def make_register_user():
     """Авторизация пользователя."""
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('blog.index'))
     form = RegistrationForm()
     if form.validate_on_submit():
         hashed_password = make_hashed_password(form)
@@ -52,53 +71,56 @@ def make_register_user():
         db.session.add(user)
         db.session.commit()
         flash('регистрация прошла успешно. Можете войти на сайт', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     return render_template('auth/register.html', form=form)
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
+    if current_user.is_authenticated:
+        forget_user(current_user.id)
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('blog.index'))
 
 
-@app.route('/reset_password_request', methods=['GET', 'POST'])
+@bp.route('/reset_password_request', methods=['GET', 'POST'])
 def reset_password_request():
     """Страница для отображения формы смены пароля.
     При валидации данных отправляется письмо на email.
     """
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('blog.index'))
     form = RequestResetForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         send_reset_email(user)
         flash('На Вашу почту отправлено сообщение', 'warning')
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     return render_template(
         'auth/reset_pass.html',
         form=form,
     )
 
 
-@app.route('/reset_password/<token>', methods=['GET', 'POST'])
+@bp.route('/reset_password/<token>', methods=['GET', 'POST'],
+           endpoint='reset_token')
 def reset_password_process(token):
     """При получении ссылки при смене пароля, пользователь получает хешированную ссылку,
      которая будет проверять и при верификации тот может сменить пароль.
      """
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('blog.index'))
     user = User.verify_reset_token(token)
     if not user:
         flash('Введите заново email. Произошла ошибка', 'warning')
-        return redirect(url_for('reset_password_request'))
+        return redirect(url_for('auth.reset_password_request'))
     form = ResetPassForm()
     if form.validate_on_submit():
         hashed_password = make_hashed_password(form)
         user.password = hashed_password
         db.session.commit()
         flash('Пароль изменен. Можете войти на сайт', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     is_reset = True
     return render_template(
         'auth/reset_pass.html',
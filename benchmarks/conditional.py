@@ -0,0 +1,131 @@
+"""Проверка условных GET (utils/conditional.py): повторный запрос с
+If-None-Match получает 304 без SQL и рендера, а любое изменение данных
+страницы или шапки вошедшего пользователя выдает новую страницу.
+
+Запуск: python -m benchmarks.conditional --repeat 200
+"""
+import argparse
+import sys
+import time
+
+from yatube import app
+from app import db, User, Post, Comment
+from utils.likes import add_like
+from utils.queries import count_queries
+from benchmarks.helpers import check, login
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    for i in (1, 2):
+        db.session.add(User(id=i, username=f'user{i}',
+                            email=f'user{i}@example.com', password='x'))
+    db.session.flush()
+    db.session.add(Post(id=1, title='Пост', text='Текст', user_id=1))
+    db.session.add_all(Comment(body=f'Комментарий {i}', post_id=1, user_id=2)
+                       for i in range(20))
+    db.session.commit()
+
+
+def revalidate(client, url):
+    """Первый ответ и повторный запрос с его ETag."""
+    first = client.get(url)
+    with count_queries() as counter:
+        second = client.get(url, headers={'If-None-Match': first.headers[
+            'ETag']})
+    return first, second, counter.count
+
+
+def changes(client, url, change):
+    """True, если после change старый ETag больше не подходит."""
+    etag = client.get(url).headers['ETag']
+    with app.app_context():
+        change()
+    return client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+
+def timing(client, url, repeat, headers=None):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        client.get(url, headers=headers or {})
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    results = []
+    with app.app_context():
+        seed()
+        anonymous = app.test_client()
+        viewer = app.test_client()
+        login(viewer, 2)
+        viewer.get('/about')
+
+        for url in ('/post/1', '/profile/user1', '/user/user1'):
+            first, second, queries = revalidate(anonymous, url)
+            results.append(check(
+                f'{url}: 304 без SQL для анонимного посетителя',
+                second.status_code == 304 and not second.data and
+                queries == 0 and
+                'public' in first.headers['Cache-Control'] and
+                'no-cache' in first.headers['Cache-Control'],
+                f': {queries} запросов'))
+            first, second, queries = revalidate(viewer, url)
+            results.append(check(
+                f'{url}: 304 для вошедшего, ответ private',
+                second.status_code == 304 and
+                'private' in first.headers['Cache-Control'] and
+                'Cookie' in first.headers['Vary'],
+                f': {queries} запросов'))
+
+        anonymous_etag = anonymous.get('/post/1').headers['ETag']
+        results.append(check(
+            'ETag анонимного и вошедшего различаются',
+            anonymous_etag != viewer.get('/post/1').headers['ETag']))
+
+        def comment():
+            db.session.add(Comment(body='Новый', post_id=1, user_id=1))
+            db.session.commit()
+
+        def like():
+            add_like(db.session.get(User, 2), 1)
+            db.session.commit()
+
+        def rename():
+            db.session.get(User, 2).username = 'user2x'
+            db.session.commit()
+
+        def profile():
+            db.session.get(User, 1).city = 'Казань'
+            db.session.commit()
+
+        def post():
+            db.session.add(Post(title='Еще', text='Текст', user_id=1))
+            db.session.commit()
+
+        results.append(check('новый комментарий меняет пост',
+                             changes(anonymous, '/post/1', comment)))
+        results.append(check('свой лайк меняет пост для вошедшего',
+                             changes(viewer, '/post/1', like)))
+        results.append(check('переименование автора комментария меняет пост',
+                             changes(anonymous, '/post/1', rename)))
+        results.append(check('правка профиля меняет профиль',
+                             changes(anonymous, '/profile/user1', profile)))
+        results.append(check('новый пост меняет список постов автора',
+                             changes(anonymous, '/user/user1', post)))
+
+        for url in ('/post/1', '/profile/user1'):
+            etag = viewer.get(url).headers['ETag']
+            full = timing(viewer, url, args.repeat)
+            not_modified = timing(viewer, url, args.repeat,
+                                  {'If-None-Match': etag})
+            print(f'    {url}: 200 {full:.2f} мс, 304 {not_modified:.2f} мс')
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
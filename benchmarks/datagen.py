@@ -0,0 +1,271 @@
+"""Генератор синтетических данных для нагрузочных тестов: пользователи,
+посты, комментарии, лайки, подписки и личные сообщения, пачками через
+executemany. Популярность авторов и постов распределена неравномерно,
+как на живом сайте. Все пароли - 'password'.
+
+Запуск:
+    python -m benchmarks.datagen --scale 10k --database-url sqlite:///bench.db
+    python -m benchmarks.datagen --scale 1m --posts 2000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from yatube import app
+from app import db, bcrypt, User, Post, Comment, Like, Conversation, \
+    ConversationMember, Message, followers
+from utils.counters import reconcile_counters
+from utils.search import get_backend
+
+# Число строк каждого вида для готовых масштабов.
+SCALES = {
+    '10k': {'users': 1000, 'posts': 10000, 'comments': 20000,
+            'likes': 50000, 'follows': 20000, 'conversations': 2000,
+            'messages': 20000},
+    '1m': {'users': 50000, 'posts': 1000000, 'comments': 1000000,
+           'likes': 2000000, 'follows': 1000000, 'conversations': 50000,
+           'messages': 500000},
+    '10m': {'users': 500000, 'posts': 10000000, 'comments': 10000000,
+            'likes': 20000000, 'follows': 10000000, 'conversations': 500000,
+            'messages': 5000000},
+}
+PASSWORD = 'password'
+# Слова для заголовков и текстов, по ним же ищет сценарий поиска.
+WORDS = ('фласк', 'питон', 'база', 'запрос', 'индекс', 'кеш', 'лента',
+         'подписка', 'комментарий', 'сервер', 'очередь', 'релиз', 'тест',
+         'профиль', 'котики', 'путешествие', 'музыка', 'книга', 'кофе',
+         'горы', 'море', 'город', 'весна', 'осень', 'проект', 'код')
+# Данные охватывают год до этого момента.
+START = datetime(2026, 1, 1)
+PERIOD = timedelta(days=365).total_seconds()
+
+
+def skewed(rng, count):
+    """Id от 1 до count, малые id встречаются намного чаще:
+    популярные авторы и посты.
+    """
+    return int(count * rng.random() ** 3) + 1
+
+
+def moment(share):
+    """Дата на доле share от начала периода."""
+    return START + timedelta(seconds=PERIOD * share)
+
+
+def text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def insert(connection, table, rows, batch_size):
+    """Вставляет строки из генератора пачками по batch_size."""
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+        total += len(batch)
+    return total
+
+
+def unique_pairs(rng, count, per_owner, owners, targets):
+    """count пар (владелец, цель) без повторов, например лайки
+    пользователя или его подписки. Цели выбираются skewed.
+    """
+    made = 0
+    for owner in range(1, owners + 1):
+        wanted = min(per_owner(owner), count - made, targets)
+        chosen = set()
+        while len(chosen) < wanted:
+            chosen.add(skewed(rng, targets))
+        for target in sorted(chosen):
+            yield owner, target
+        made += wanted
+        if made >= count:
+            return
+
+
+def spread(count, owners):
+    """Сколько строк достанется владельцу, чтобы в сумме вышло count."""
+    base, extra = divmod(count, owners)
+    return lambda owner: base + (1 if owner <= extra else 0)
+
+
+def users(counts, password):
+    for i in range(1, counts['users'] + 1):
+        yield {'id': i, 'username': f'user{i}',
+               'email': f'user{i}@example.com', 'password': password,
+               'last_seen': moment(i / counts['users'])}
+
+
+def posts(rng, counts):
+    for i in range(1, counts['posts'] + 1):
+        yield {'id': i, 'title': text(rng, 4).capitalize(),
+               'text': text(rng, 40),
+               'user_id': skewed(rng, counts['users']),
+               'created_at': moment(i / counts['posts'])}
+
+
+def comments(rng, counts):
+    for i in range(1, counts['comments'] + 1):
+        yield {'id': i, 'body': text(rng, 8),
+               'post_id': skewed(rng, counts['posts']),
+               'user_id': rng.randint(1, counts['users']),
+               'timestamp': moment(i / counts['comments'])}
+
+
+def likes(rng, counts):
+    pairs = unique_pairs(rng, counts['likes'],
+                         spread(counts['likes'], counts['users']),
+                         counts['users'], counts['posts'])
+    for user_id, post_id in pairs:
+        yield {'author': user_id, 'post_id': post_id}
+
+
+def follows(rng, counts):
+    pairs = unique_pairs(rng, counts['follows'],
+                         spread(counts['follows'], counts['users']),
+                         counts['users'], counts['users'])
+    for follower_id, followed_id in pairs:
+        if follower_id != followed_id:
+            yield {'follower_id': follower_id, 'followed_id': followed_id}
+
+
+def conversation_pairs(rng, counts):
+    """Пары собеседников без повторов, по одной переписке на пару."""
+    pairs = set()
+    limit = counts['users'] * (counts['users'] - 1) // 2
+    while len(pairs) < min(counts['conversations'], limit):
+        low, high = sorted(rng.sample(range(1, counts['users'] + 1), 2))
+        pairs.add((low, high))
+    return sorted(pairs)
+
+
+def conversation_messages(seed, number, low, high, count):
+    """Сообщения одной переписки по порядку. Генератор переписки свой,
+    поэтому последнее сообщение можно узнать до вставки всех остальных.
+    """
+    rng = random.Random(f'{seed}:{number}')
+    stamps = sorted(moment(rng.random()) for _ in range(count))
+    for stamp in stamps:
+        yield {'conversation_id': number,
+               'sender_id': rng.choice((low, high)),
+               'text': text(rng, 6), 'timestamp': stamp}
+
+
+def conversations(seed, pairs, per_conversation):
+    for number, (low, high) in enumerate(pairs, 1):
+        last = None
+        for last in conversation_messages(seed, number, low, high,
+                                          per_conversation(number)):
+            pass
+        yield {'id': number, 'direct_key': f'{low}:{high}',
+               'created_at': START,
+               'last_message_at': last and last['timestamp'],
+               'last_message_text': last and last['text'],
+               'last_sender_id': last and last['sender_id']}
+
+
+def members(pairs, conversation_rows):
+    for (low, high), conversation in zip(pairs, conversation_rows):
+        for user_id in (low, high):
+            yield {'conversation_id': conversation['id'], 'user_id': user_id,
+                   'last_activity_at': conversation['last_message_at']
+                   or START}
+
+
+def messages(seed, pairs, per_conversation):
+    for number, (low, high) in enumerate(pairs, 1):
+        yield from conversation_messages(seed, number, low, high,
+                                         per_conversation(number))
+
+
+def reset_sequences(connection):
+    """После вставки с явными id последовательности PostgreSQL
+    отстают, и следующий INSERT получил бы занятый id.
+    """
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in ('user', 'post', 'comment', 'conversation', 'message'):
+        connection.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f'COALESCE((SELECT max(id) FROM "{table}"), 1))')
+
+
+def generate(counts, seed=0, batch_size=10000, log=print):
+    """Заполняет пустую базу. Вызывается в контексте приложения."""
+    rng = random.Random(seed)
+    # Один хеш на всех: bcrypt с минимальной стоимостью, при входе
+    # пароль все равно пересчитается с BCRYPT_LOG_ROUNDS.
+    password = bcrypt.generate_password_hash(PASSWORD, 4).decode('utf-8')
+    pairs = conversation_pairs(rng, counts)
+    per_conversation = spread(counts['messages'], max(len(pairs), 1))
+    conversation_rows = list(conversations(seed, pairs, per_conversation))
+    steps = [
+        ('users', User.__table__, users(counts, password)),
+        ('posts', Post.__table__, posts(rng, counts)),
+        ('comments', Comment.__table__, comments(rng, counts)),
+        ('likes', Like.__table__, likes(rng, counts)),
+        ('follows', followers, follows(rng, counts)),
+        ('conversations', Conversation.__table__, iter(conversation_rows)),
+        ('members', ConversationMember.__table__,
+         members(pairs, conversation_rows)),
+        ('messages', Message.__table__,
+         messages(seed, pairs, per_conversation)),
+    ]
+    for name, table, rows in steps:
+        started = time.perf_counter()
+        total = insert(db.session.connection(), table, rows, batch_size)
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        log(f'{name:>13}: {total:>9} строк за {elapsed:6.1f} с, '
+            f'{total / max(elapsed, 1e-9):8.0f} строк/с')
+
+    started = time.perf_counter()
+    connection = db.session.connection()
+    reset_sequences(connection)
+    reconcile_counters(connection)
+    db.session.commit()
+    get_backend().rebuild()
+    db.session.commit()
+    log(f'{"счетчики":>13}: пересчитаны вместе с поисковым индексом за '
+        f'{time.perf_counter() - started:6.1f} с')
+
+
+def scale_counts(args):
+    """Масштаб --scale с поправками из отдельных аргументов."""
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        value = getattr(args, name, None)
+        if value is not None:
+            counts[name] = value
+    return counts
+
+
+def add_arguments(parser):
+    parser.add_argument('--scale', choices=SCALES, default='10k')
+    for name in SCALES['10k']:
+        parser.add_argument(f'--{name}', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=10000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-url', default='sqlite:///bench.db')
+    add_arguments(parser)
+    args = parser.parse_args()
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(scale_counts(args), args.seed, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
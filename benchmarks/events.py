@@ -0,0 +1,170 @@
+"""Нагрузочная проверка SSE (utils/events.py).
+
+1. --idle соединений открываются прямо через WSGI: ни одно не держит
+   соединение с базой, все получают события новых комментариев, а
+   клиент, который не читает, получает reset вместо роста буфера.
+2. --subscribers клиентов слушают поток через HTTP-сервер, пока
+   публикуются --events событий: задержка доставки и потери.
+
+Запуск: python -m benchmarks.events --idle 2000 --subscribers 200
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from sqlalchemy import event
+from werkzeug.serving import make_server
+from werkzeug.test import EnvironBuilder
+
+from yatube import app
+from app import db, User, Post, Comment
+from benchmarks.helpers import check, percentile
+
+# Брокер приложения: проверки обращаются к нему вне контекста.
+broker = app.extensions['events']
+
+
+def open_stream(path):
+    """Поток события как его видит WSGI-сервер, после первой строки."""
+    environ = EnvironBuilder(path=path).get_environ()
+    body = app(environ, lambda status, headers: None)
+    chunks = iter(body)
+    next(chunks)
+    return body, chunks
+
+
+def idle_connections(args, post_id, user_id):
+    results = []
+    checked_out = [0]
+    engine = db.get_engine(app)
+    event.listen(engine, 'checkout', lambda *a: checked_out.__setitem__(
+        0, checked_out[0] + 1))
+    event.listen(engine, 'checkin', lambda *a: checked_out.__setitem__(
+        0, checked_out[0] - 1))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    streams = [open_stream(f'/events/post/{post_id}')
+               for _ in range(args.idle)]
+    memory = (tracemalloc.get_traced_memory()[0] - before) / args.idle
+    tracemalloc.stop()
+    results.append(check(
+        f'{args.idle} открытых соединений без соединений с базой',
+        checked_out[0] == 0 and
+        broker.subscribers() == args.idle,
+        f': занято {checked_out[0]}, ~{memory / 1024:.1f} КБ на соединение'))
+
+    started = time.perf_counter()
+    with app.app_context():
+        for i in range(args.events):
+            db.session.add(Comment(body=f'Комментарий {i}', post_id=post_id,
+                                   user_id=user_id))
+            db.session.commit()
+    elapsed = time.perf_counter() - started
+    print(f'    {args.events} комментариев разосланы за {elapsed:.2f} с, '
+          f'{elapsed / args.events * 1000:.1f} мс на комментарий')
+    received = 0
+    for body, chunks in streams:
+        events = [next(chunks).decode() for _ in range(args.events)]
+        received += all(f'Комментарий {i}' in chunk
+                        for i, chunk in enumerate(events))
+        body.close()
+    results.append(check('все соединения получили все события',
+                         received == args.idle,
+                         f': {received} из {args.idle}'))
+    results.append(check('закрытые соединения отписаны',
+                         broker.subscribers() == 0))
+
+    body, chunks = open_stream(f'/events/post/{post_id}')
+    for i in range(app.config['EVENTS_BUFFER_SIZE'] + 1):
+        broker.publish(f'post:{post_id}', {'type': 'like', 'delta': 1})
+    results.append(check('переполненный буфер сбрасывает клиента',
+                         next(chunks).startswith(b'event: reset')))
+    body.close()
+    return results
+
+
+def listen(port, path, count, latencies, ready):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('GET', path)
+    response = connection.getresponse()
+    response.readline()
+    ready.release()
+    received = 0
+    while received < count:
+        line = response.readline()
+        if not line:
+            break
+        if line.startswith(b'data: '):
+            sent = json.loads(line[6:])['sent']
+            latencies.append(time.time() - sent)
+            received += 1
+    connection.close()
+
+
+def subscribers(args, post_id):
+    # Без строки в логе на каждое соединение.
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    latencies = []
+    ready = threading.Semaphore(0)
+    threads = [threading.Thread(target=listen, args=(
+        server.server_port, f'/events/post/{post_id}', args.events,
+        latencies, ready)) for _ in range(args.subscribers)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        ready.acquire()
+    for i in range(args.events):
+        broker.publish(f'post:{post_id}', {
+            'type': 'like', 'delta': 1, 'sent': time.time()})
+        time.sleep(args.interval)
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    expected = args.subscribers * args.events
+    print(f'    {args.subscribers} подписчиков: доставка p50 '
+          f'{percentile(latencies, 0.5):.1f} мс, '
+          f'p99 {percentile(latencies, 0.99):.1f} мс')
+    return [check('HTTP-подписчики получили все события',
+                  len(latencies) == expected,
+                  f': {len(latencies)} из {expected}')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--idle', type=int, default=2000)
+    parser.add_argument('--subscribers', type=int, default=200)
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = \
+        f'sqlite:///{os.path.join(directory, "events.db")}'
+    with app.app_context():
+        db.create_all()
+        user = User(username='writer', email='writer@example.com',
+                    password='x')
+        db.session.add(user)
+        db.session.flush()
+        post = Post(title='Пост', text='Текст', user_id=user.id)
+        db.session.add(post)
+        db.session.commit()
+        post_id, user_id = post.id, user.id
+    results = idle_connections(args, post_id, user_id)
+    results += subscribers(args, post_id)
+    shutil.rmtree(directory)
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
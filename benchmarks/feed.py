@@ -0,0 +1,111 @@
+"""Сравнение ленты подписок: материализованная лента (fan-out-on-write)
+против сборки при чтении через JOIN followers и post (fan-out-on-read).
+
+Запуск: python -m benchmarks.feed --authors 5000 --posts 40 --following 50
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import joinedload
+
+from yatube import app
+from app import db, User, Post, followers
+from utils.timeline import build_timeline, feed_page
+
+PER_PAGE = 10
+
+
+def seed(args, rng):
+    """Авторы, их посты и подписки читателя; всё через executemany."""
+    connection = db.session.connection()
+    connection.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+         'password': 'x'} for i in range(1, args.authors + 2)
+    ])
+    start = datetime(2020, 1, 1)
+    posts = [
+        {'title': 'Пост', 'text': 'Текст', 'user_id': author,
+         'created_at': start + timedelta(minutes=rng.randrange(10 ** 6))}
+        for author in range(2, args.authors + 2)
+        for _ in range(args.posts)
+    ]
+    connection.execute(Post.__table__.insert(), posts)
+    reader_follows = rng.sample(range(2, args.authors + 2), args.following)
+    connection.execute(followers.insert(), [
+        {'follower_id': 1, 'followed_id': author}
+        for author in reader_follows
+    ])
+    db.session.commit()
+
+
+def fan_out_on_read(reader_id):
+    """Та же страница ленты без материализации: JOIN при каждом чтении."""
+    return Post.query.options(joinedload(Post.author)).join(
+        followers, followers.c.followed_id == Post.user_id
+    ).filter(followers.c.follower_id == reader_id).order_by(
+        Post.created_at.desc(), Post.id.desc()
+    ).limit(PER_PAGE).all()
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--authors', type=int, default=5000)
+    parser.add_argument('--posts', type=int, default=40)
+    parser.add_argument('--following', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    path = os.path.join(tempfile.mkdtemp(), 'feed.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    with app.app_context(), app.test_request_context():
+        db.create_all()
+        seed(args, rng)
+        reader = User.query.get(1)
+        started = time.perf_counter()
+        build_timeline(reader)
+        db.session.commit()
+        build = (time.perf_counter() - started) * 1000
+        on_read = timed(lambda: fan_out_on_read(reader.id), args.repeat)
+        on_write = timed(lambda: feed_page(reader, per_page=PER_PAGE),
+                         args.repeat)
+
+        # Цена публикации: пост автора раскладывается по лентам подписчиков.
+        author = User.query.get(2)
+        connection = db.session.connection()
+        connection.execute(followers.insert(), [
+            {'follower_id': i, 'followed_id': 2}
+            for i in range(3, args.authors + 2)
+        ])
+        connection.execute(User.__table__.update().values(
+            timeline_built=True))
+        db.session.commit()
+
+        def publish():
+            db.session.add(Post(title='Новый', text='Текст',
+                                user_id=author.id))
+            db.session.commit()
+
+        write = timed(publish, 5)
+    print(f'постов: {args.authors * args.posts}, '
+          f'подписок читателя: {args.following}')
+    print(f'построение ленты при первом чтении: {build:.2f} мс')
+    print(f'чтение, fan-out-on-read (JOIN):    {on_read:.2f} мс')
+    print(f'чтение, fan-out-on-write (лента):  {on_write:.2f} мс')
+    print(f'публикация поста для {args.authors - 1} подписчиков: '
+          f'{write:.2f} мс')
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
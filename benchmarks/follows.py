@@ -0,0 +1,113 @@
+"""Запросы к графу подписок на синтетическом графе: проверка подписки
+по одному против is_following_many, списки подписчиков с курсором,
+взаимные подписки и рекомендации по подпискам подписок.
+
+Запуск: python -m benchmarks.follows --users 100000 --edges 5000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import func
+
+from yatube import app
+from app import db, User, followers
+from utils.follows import (
+    followers_page, following_page, is_following_many, mutual_page,
+    suggestions,
+)
+
+CHUNK = 100000
+
+
+def edges(args, rng):
+    """Подписки со степенным распределением популярности: у авторов
+    с маленьким id подписчиков на порядки больше, чем у остальных.
+    """
+    degree = args.edges // args.users
+    for follower in range(1, args.users + 1):
+        targets = set()
+        count = rng.randint(0, 2 * degree)
+        while len(targets) < count:
+            followed = int(args.users * rng.random() ** 3) + 1
+            if followed != follower:
+                targets.add(followed)
+        for followed in targets:
+            yield {'follower_id': follower, 'followed_id': followed}
+
+
+def seed(args, rng):
+    connection = db.session.connection()
+    connection.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+         'password': 'x'} for i in range(1, args.users + 1)
+    ])
+    chunk = []
+    for edge in edges(args, rng):
+        chunk.append(edge)
+        if len(chunk) == CHUNK:
+            connection.execute(followers.insert(), chunk)
+            chunk = []
+    if chunk:
+        connection.execute(followers.insert(), chunk)
+    db.session.commit()
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--edges', type=int, default=5000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    path = os.path.join(tempfile.mkdtemp(), 'follows.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed(args, rng)
+        total = db.session.query(followers).count()
+        print(f'Граф: {args.users} пользователей, {total} подписок, '
+              f'{time.perf_counter() - started:.0f} с на заполнение')
+
+        reader = db.session.get(User, args.users // 2)
+        celebrity = db.session.get(User, 1)
+        # Курсор перед последним подписчиком: страница из самого конца.
+        deep_cursor = db.session.query(
+            func.max(followers.c.follower_id)
+        ).filter(followers.c.followed_id == celebrity.id).scalar() - 1
+        ids = rng.sample(range(1, args.users + 1), 100)
+        others = [db.session.get(User, user_id) for user_id in ids]
+        rows = [
+            ('is_following x100 по одному',
+             lambda: [reader.is_following(other) for other in others]),
+            ('is_following_many(100 id)',
+             lambda: is_following_many(reader, ids)),
+            ('подписчики популярного, первая страница',
+             lambda: followers_page(celebrity, None, args.per_page)),
+            ('подписчики популярного, последняя страница',
+             lambda: followers_page(celebrity, deep_cursor, args.per_page)),
+            ('подписки, первая страница',
+             lambda: following_page(reader, None, args.per_page)),
+            ('взаимные подписки',
+             lambda: mutual_page(reader, None, args.per_page)),
+            ('рекомендации',
+             lambda: suggestions(reader)),
+        ]
+        for title, function in rows:
+            print(f'{title:>45}: {timed(function, args.repeat):8.2f} мс')
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
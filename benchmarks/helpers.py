@@ -0,0 +1,20 @@
+"""Общие функции проверок из benchmarks."""
+
+
+def check(title, passed, details=''):
+    """Печатает результат проверки и возвращает его."""
+    print(f'{"OK " if passed else "FAIL"} {title}{details}')
+    return passed
+
+
+def login(client, user_id):
+    """Входит в тестовом клиенте без формы входа."""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def percentile(values, share):
+    """Перцентиль share значений в секундах, в миллисекундах."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] * 1000
@@ -0,0 +1,65 @@
+"""Проверка кеша пользователя Flask-Login: повторный запрос вошедшего
+пользователя не обращается к базе за ним, а правка профиля и выход
+сбрасывают кеш.
+
+Запуск: python -m benchmarks.identity
+"""
+import sys
+
+from yatube import app
+from app import db, User
+from utils.queries import count_queries
+from benchmarks.helpers import check, login
+
+
+def user_queries(counter):
+    return sum('FROM user' in statement for statement in counter.statements)
+
+
+def main():
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    results = []
+    with app.app_context():
+        db.create_all()
+        user = User(username='reader', email='reader@example.com',
+                    password='x', age=30)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.remove()
+
+    client = app.test_client()
+    login(client, user_id)
+    with count_queries(app) as cold:
+        client.get('/about')
+    with count_queries(app) as warm:
+        page = client.get('/about').get_data(as_text=True)
+    results.append(check('первый запрос загружает пользователя',
+                         user_queries(cold) == 1,
+                         f': запросов {cold.count}'))
+    results.append(check('повторный запрос без обращения к базе',
+                         warm.count == 0, f': запросов {warm.count}'))
+    results.append(check('имя в шапке из кеша', 'reader' in page))
+
+    with count_queries(app) as counter:
+        page = client.get('/profile/change_data').get_data(as_text=True)
+    results.append(check('профильные поля догружаются одним запросом',
+                         user_queries(counter) == 1 and '30' in page,
+                         f': запросов {counter.count}'))
+
+    client.post('/profile_edit', data={'username': 'writer',
+                                       'email': 'reader@example.com'})
+    page = client.get('/about').get_data(as_text=True)
+    results.append(check('правка профиля сбрасывает кеш', 'writer' in page))
+
+    client.get('/logout')
+    login(client, user_id)
+    with count_queries(app) as counter:
+        client.get('/about')
+    results.append(check('выход сбрасывает кеш', user_queries(counter) == 1,
+                         f': запросов {counter.count}'))
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Задержка входа и просмотра страниц при одновременных входах:
+пул хеширования размера --pool против пула на все потоки входа,
+то есть без ограничения.
+
+Запуск: python -m benchmarks.login --rounds 12 --duration 10
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from yatube import app
+from app import db, bcrypt, User, Post
+import utils.passwords
+from benchmarks.helpers import percentile
+
+
+def seed(args):
+    password = bcrypt.generate_password_hash(
+        'password', args.rounds).decode('utf-8')
+    connection = db.session.connection()
+    connection.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+         'password': password} for i in range(1, args.users + 1)
+    ])
+    connection.execute(Post.__table__.insert(), [
+        {'id': i, 'title': f'Пост {i}', 'text': 'Текст поста ' * 20,
+         'user_id': i % args.users + 1} for i in range(1, args.posts + 1)
+    ])
+    db.session.commit()
+
+
+def login_loop(args, deadline, latencies):
+    rng = random.Random()
+    while time.time() < deadline:
+        # Новый клиент на каждый вход: вошедшего пользователя
+        # страница входа сразу перенаправляет.
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/login', data={
+            'email': f'user{rng.randint(1, args.users)}@example.com',
+            'password': 'password',
+        })
+        assert response.status_code in (302, 503), response.status_code
+        latencies.append(time.perf_counter() - started)
+
+
+def browse_loop(args, deadline, latencies):
+    rng = random.Random()
+    client = app.test_client()
+    # Вошедший пользователь, чтобы страницы не отдавались из кеша.
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    while time.time() < deadline:
+        started = time.perf_counter()
+        client.get(f'/post/{rng.randint(1, args.posts)}')
+        latencies.append(time.perf_counter() - started)
+
+
+def run(args, pool_size):
+    app.config['PASSWORD_HASH_WORKERS'] = pool_size
+    utils.passwords._executor = None
+    deadline = time.time() + args.duration
+    logins, pages = [], []
+    threads = [
+        threading.Thread(target=login_loop, args=(args, deadline, logins))
+        for _ in range(args.login_threads)
+    ] + [
+        threading.Thread(target=browse_loop, args=(args, deadline, pages))
+        for _ in range(args.browse_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f'Пул {pool_size:>2}: входов {len(logins) / args.duration:5.1f}/с,'
+          f' вход p50 {percentile(logins, 0.5):6.0f} мс,'
+          f' p99 {percentile(logins, 0.99):6.0f} мс;'
+          f' страниц {len(pages) / args.duration:5.1f}/с,'
+          f' p50 {percentile(pages, 0.5):5.0f} мс,'
+          f' p99 {percentile(pages, 0.99):5.0f} мс')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--pool', type=int, default=2)
+    parser.add_argument('--login-threads', type=int, default=8)
+    parser.add_argument('--browse-threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--posts', type=int, default=1000)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = \
+        f'sqlite:///{os.path.join(directory, "login.db")}'
+    app.config['BCRYPT_LOG_ROUNDS'] = args.rounds
+    # Без ограничений по числу попыток: замеряется только хеширование.
+    app.config['PASSWORD_HASH_TIMEOUT'] = 600
+    app.config['LOGIN_LIMIT_PER_ACCOUNT'] = (float('inf'), 300)
+    app.config['LOGIN_LIMIT_PER_IP'] = (float('inf'), 60)
+    with app.app_context():
+        db.create_all()
+        seed(args)
+    for pool_size in (args.login_threads, args.pool):
+        run(args, pool_size)
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Пропускная способность очереди писем на локальном SMTP-сервере.
+Нужен пакет aiosmtpd: pip install aiosmtpd
+
+Запуск: python -m benchmarks.mail --messages 1000
+"""
+import argparse
+import time
+
+from aiosmtpd.controller import Controller
+
+from yatube import app
+from app import db, mail, OutboxMessage
+from utils.mail_queue import enqueue_mail, send_pending
+
+
+class CountingHandler:
+    """Обработчик тестового сервера: только считает принятые письма."""
+
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 OK'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        MAIL_SERVER='127.0.0.1',
+        MAIL_PORT=args.port,
+        MAIL_USE_TLS=False,
+        MAIL_USE_SSL=False,
+        MAIL_USERNAME=None,
+        MAIL_PASSWORD=None,
+        MAIL_DEFAULT_SENDER='yatube@example.com',
+        MAIL_DEBUG=False,
+    )
+    # Flask-Mail читает настройки один раз, при подключении к приложению.
+    mail.init_app(app)
+    try:
+        with app.app_context(), app.test_request_context():
+            db.create_all()
+            started = time.perf_counter()
+            for number in range(args.messages):
+                enqueue_mail('Проверка', [f'user{number}@example.com'],
+                             'Текст письма')
+            # Повторы не попадают в очередь.
+            enqueue_mail('Проверка', ['user0@example.com'], 'Текст письма')
+            enqueued = time.perf_counter() - started
+
+            started = time.perf_counter()
+            while send_pending(args.batch_size):
+                pass
+            sent = time.perf_counter() - started
+            queued = OutboxMessage.query.count()
+    finally:
+        controller.stop()
+    print(f'в очереди: {queued}, принято сервером: {handler.received}')
+    print(f'постановка в очередь: {args.messages / enqueued:.0f} писем/с')
+    print(f'отправка пачками по {args.batch_size}: '
+          f'{handler.received / sent:.0f} писем/с')
+
+
+if __name__ == '__main__':
+    main()
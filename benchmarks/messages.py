@@ -0,0 +1,112 @@
+"""Проверка личных сообщений: отправка и чтение через страницы,
+счетчики непрочитанных и число запросов списка переписок, которое не
+должно зависеть от числа переписок и сообщений.
+
+Запуск: python -m benchmarks.messages
+"""
+import sys
+from datetime import datetime, timedelta
+
+from yatube import app
+from app import db, User, Conversation, ConversationMember, Message
+from utils.queries import count_queries
+from benchmarks.helpers import check, login
+
+SIZES = ((5, 10), (50, 100), (500, 100))
+
+
+def seed(conversations, messages):
+    """Читатель переписывается с conversations собеседниками, в каждой
+    переписке messages сообщений.
+    """
+    db.drop_all()
+    db.create_all()
+    connection = db.session.connection()
+    now = datetime.utcnow()
+    connection.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+         'password': 'x'} for i in range(1, conversations + 2)
+    ])
+    connection.execute(Conversation.__table__.insert(), [
+        {'id': i, 'direct_key': f'1:{i + 1}', 'created_at': now,
+         'last_message_at': now + timedelta(seconds=i),
+         'last_message_text': 'Привет', 'last_sender_id': i + 1}
+        for i in range(1, conversations + 1)
+    ])
+    connection.execute(ConversationMember.__table__.insert(), [
+        {'conversation_id': i, 'user_id': user_id,
+         'last_activity_at': now + timedelta(seconds=i)}
+        for i in range(1, conversations + 1) for user_id in (1, i + 1)
+    ])
+    if messages:
+        connection.execute(Message.__table__.insert(), [
+            {'conversation_id': i, 'sender_id': i + 1, 'text': 'Привет',
+             'timestamp': now + timedelta(seconds=j)}
+            for i in range(1, conversations + 1) for j in range(messages)
+        ])
+    db.session.commit()
+
+
+def inbox_queries(client):
+    with count_queries() as counter:
+        response = client.get('/profile/all_messages')
+    assert response.status_code == 200, response.status_code
+    return counter.count
+
+
+def main():
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    results = []
+    with app.app_context():
+        client = app.test_client()
+        counts = []
+        for conversations, messages in SIZES:
+            seed(conversations, messages)
+            login(client, 1)
+            # Первый запрос заполняет кеш пользователя.
+            inbox_queries(client)
+            counts.append(inbox_queries(client))
+            print(f'переписок {conversations:>4}, сообщений '
+                  f'{conversations * messages:>6}: {counts[-1]} запросов')
+        results.append(check('список переписок за один запрос',
+                             set(counts) == {1}))
+
+        seed(1, 0)
+        db.session.add(User(username='reader', email='reader@example.com',
+                            password='x'))
+        db.session.commit()
+        sender, reader = 1, User.query.filter_by(username='reader').one().id
+        login(client, sender)
+        response = client.post('/profile/reader/send_message',
+                               data={'body': 'Первое'})
+        conversation_url = response.headers['Location']
+        client.post(conversation_url, data={'body': 'Второе'})
+        db.session.expire_all()
+        results.append(check('у получателя 2 непрочитанных',
+                             db.session.get(User, reader).unread_messages
+                             == 2))
+        response = client.get('/profile/reader/send_message')
+        results.append(check('повторное сообщение в ту же переписку',
+                             response.headers['Location'] ==
+                             conversation_url))
+
+        login(client, reader)
+        page = client.get('/profile/all_messages').get_data(as_text=True)
+        results.append(check('переписка в списке получателя',
+                             'Второе' in page and 'user1' in page))
+        page = client.get(conversation_url).get_data(as_text=True)
+        results.append(check('история переписки',
+                             'Первое' in page and 'Второе' in page))
+        db.session.expire_all()
+        results.append(check('прочитанные сброшены',
+                             db.session.get(User, reader).unread_messages
+                             == 0))
+        login(client, 2)
+        response = client.get(conversation_url)
+        results.append(check('чужая переписка недоступна',
+                             response.status_code == 404))
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
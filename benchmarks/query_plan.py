@@ -0,0 +1,88 @@
+"""Проверка планов запросов: EXPLAIN QUERY PLAN для каждого запроса,
+выполненного страницами сайта. Завершается с ошибкой, если хоть один
+запрос полностью сканирует таблицу.
+
+Запуск: python -m benchmarks.query_plan
+"""
+import re
+import sys
+
+from yatube import app
+from app import db, User, Post, Comment, Like
+from utils.queries import count_queries
+
+# Полный просмотр таблицы: SCAN без индекса. Обход по индексу
+# ('SCAN post USING INDEX ...') и виртуальные таблицы FTS допустимы.
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+PAGES = (
+    '/',
+    '/?page=2',
+    '/search?q=пост',
+    '/post/1',
+    '/profile/user0',
+    '/user/user0',
+    '/profile/user0/followers',
+    '/profile/user0/comments',
+    '/profile/user0/likes',
+)
+
+
+def seed():
+    db.create_all()
+    users = [User(username=f'user{i}', email=f'user{i}@example.com',
+                  password='x') for i in range(3)]
+    db.session.add_all(users)
+    db.session.flush()
+    posts = [Post(title=f'Пост {i}', text='Текст поста',
+                  user_id=users[i % 3].id) for i in range(10)]
+    db.session.add_all(posts)
+    db.session.flush()
+    for user in users:
+        user.followed.append(users[0] if user != users[0] else users[1])
+        db.session.add(Like(author=user.id, post_id=posts[0].id))
+        db.session.add(Comment(body='Комментарий', post_id=posts[0].id,
+                               user_id=user.id))
+    db.session.commit()
+
+
+def collect_queries(client, url):
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    return zip(counter.statements, counter.parameters)
+
+
+def full_scans(statement, parameters):
+    """Таблицы, которые запрос просматривает целиком."""
+    if not statement.lstrip().upper().startswith('SELECT'):
+        return []
+    rows = db.session.connection().exec_driver_sql(
+        'EXPLAIN QUERY PLAN ' + statement, tuple(parameters or ()))
+    return [match.group(1) for *_, detail in rows
+            if (match := FULL_SCAN_RE.match(detail))]
+
+
+def main():
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    failed = False
+    with app.app_context():
+        seed()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = '1'
+        for url in PAGES:
+            for statement, parameters in collect_queries(client, url):
+                tables = full_scans(statement, parameters)
+                if tables:
+                    failed = True
+                    print(f'{url}: полный просмотр {", ".join(tables)}')
+                    print(f'    {" ".join(statement.split())}')
+    if failed:
+        return 1
+    print('Все запросы используют индексы.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
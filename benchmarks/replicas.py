@@ -0,0 +1,126 @@
+"""Проверка маршрутизации чтения на реплику на двух файлах SQLite:
+основная база и ее копия в роли реплики.
+
+Запуск: python -m benchmarks.replicas
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from yatube import app
+from app import db, User, Post
+
+STICKY_SECONDS = 1
+
+
+@contextmanager
+def queries_by_engine(engines):
+    """Число запросов к основной базе и к реплике внутри блока."""
+    counts = {'primary': 0, 'replica': 0}
+    listeners = {}
+    for name, engine in engines.items():
+        def listener(*args, name=name):
+            counts[name] += 1
+        listeners[name] = listener
+        event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        yield counts
+    finally:
+        for name, engine in engines.items():
+            event.remove(engine, 'before_cursor_execute', listeners[name])
+
+
+def check(title, counts, primary, replica):
+    """None в primary или replica: обращения к этой базе не важны."""
+    passed = primary in (None, counts['primary'] > 0) and \
+        replica in (None, counts['replica'] > 0)
+    print(f'{"OK " if passed else "FAIL"} {title}: основная база '
+          f'{counts["primary"]}, реплика {counts["replica"]}')
+    return passed
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    primary_path = os.path.join(directory, 'primary.db')
+    replica_path = os.path.join(directory, 'replica.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{primary_path}'
+    app.config['SQLALCHEMY_BINDS'] = {'replica0': f'sqlite:///{replica_path}'}
+    app.config['REPLICA_STICKY_SECONDS'] = STICKY_SECONDS
+    results = []
+    with app.app_context():
+        db.create_all()
+        user = User(username='reader', email='reader@example.com',
+                    password='x')
+        db.session.add(user)
+        db.session.flush()
+        post = Post(title='Пост', text='Текст', user_id=user.id)
+        db.session.add(post)
+        db.session.commit()
+        user_id, post_id = user.id, post.id
+        db.session.remove()
+        db.engine.dispose()
+        engines = {
+            'primary': db.engine,
+            'replica': db.get_engine(app, bind='replica0'),
+        }
+    # Реплика - снимок основной базы, дальше она не обновляется.
+    shutil.copy(primary_path, replica_path)
+
+    # Запросы выполняются вне app_context, иначе все они делили бы
+    # один контекст приложения, g и сессию, как не бывает в gunicorn.
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    with queries_by_engine(engines) as counts:
+        client.get(f'/post/{post_id}')
+    results.append(check('чтение поста', counts, False, True))
+
+    # Поиск - тоже чтение и не должен закреплять посетителя за основной
+    # базой: следующая страница снова читается с реплики.
+    anonymous = app.test_client()
+    with queries_by_engine(engines) as counts:
+        found = 'Пост' in anonymous.get('/search?q=пост').get_data(
+            as_text=True)
+    results.append(check('поиск', counts, False, True))
+    with anonymous.session_transaction() as session:
+        sticky = 'primary_until' in session
+    passed = found and not sticky
+    print(f'{"OK " if passed else "FAIL"} поиск находит пост и не '
+          f'закрепляет за основной базой')
+    results.append(passed)
+    with queries_by_engine(engines) as counts:
+        anonymous.get('/')
+    results.append(check('главная после поиска', counts, False, True))
+
+    with queries_by_engine(engines) as counts:
+        client.get(f'/like_post/{post_id}?action=like')
+    results.append(check('запись лайка в GET-запросе', counts, True, None))
+
+    with queries_by_engine(engines) as counts:
+        page = client.get(f'/post/{post_id}').get_data(as_text=True)
+    results.append(check('чтение сразу после записи', counts, True, False))
+    liked = 'action=unlike' in page
+    print(f'{"OK " if liked else "FAIL"} свой лайк виден сразу')
+    results.append(liked)
+
+    time.sleep(STICKY_SECONDS + 0.1)
+    with queries_by_engine(engines) as counts:
+        client.get(f'/post/{post_id}')
+    results.append(check('чтение после окна', counts, False, True))
+
+    with queries_by_engine(engines) as counts:
+        client.post(f'/post/{post_id}', data={'body': 'Комментарий'})
+    results.append(check('POST-запрос', counts, True, False))
+    shutil.rmtree(directory)
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""Нагрузочный прогон смеси сценариев на синтетических данных
+(benchmarks/datagen.py): главная, пост, поиск, профиль, лайк и
+подписка. Для каждого сценария считаются запросы в секунду, задержка
+p50/p95/p99 и SQL-запросы на HTTP-запрос (заголовок X-Query-Count).
+Результат пишется в JSON, который удобно сравнивать между коммитами.
+
+Запуск:
+    python -m benchmarks.scenarios --scale 10k --duration 30 \\
+        --output before.json
+    python -m benchmarks.scenarios --target gunicorn --workers 4 \\
+        --concurrency 16 --output after.json
+    python -m benchmarks.scenarios --compare before.json after.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+from http.cookiejar import CookieJar
+
+from sqlalchemy import func
+
+from yatube import app
+from app import db, User, Post
+from benchmarks import datagen
+from benchmarks.helpers import percentile
+
+# Доля сценария в смеси по умолчанию.
+MIX = {
+    'index': 25,
+    'post_detail': 30,
+    'search': 10,
+    'user_profile': 20,
+    'like_post': 10,
+    'follow_user': 5,
+}
+# Сценарии, которые пишут в базу: их выполняет вошедший пользователь.
+WRITES = ('like_post', 'follow_user')
+
+
+def scenario_url(name, rng, counts):
+    if name == 'index':
+        return '/'
+    if name == 'post_detail':
+        return f'/post/{datagen.skewed(rng, counts["posts"])}'
+    if name == 'search':
+        return '/search?' + urllib.parse.urlencode(
+            {'q': rng.choice(datagen.WORDS)})
+    if name == 'user_profile':
+        return f'/profile/user{datagen.skewed(rng, counts["users"])}'
+    if name == 'like_post':
+        action = rng.choice(('like', 'unlike'))
+        return (f'/like_post/{datagen.skewed(rng, counts["posts"])}'
+                f'?action={action}')
+    if name == 'follow_user':
+        return f'/follow/user{datagen.skewed(rng, counts["users"])}'
+    raise ValueError(name)
+
+
+def choose(rng, mix):
+    names = list(mix)
+    return rng.choices(names, weights=[mix[name] for name in names])[0]
+
+
+def drive(send, args, counts, seed, results):
+    """Цикл запросов одного клиента. send(url, logged_in) возвращает
+    (статус, число SQL-запросов или None).
+    """
+    rng = random.Random(seed)
+    started = time.time()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.duration
+    while time.time() < deadline:
+        name = choose(rng, args.mix)
+        logged_in = name in WRITES or rng.random() >= args.anonymous
+        url = scenario_url(name, rng, counts)
+        request_started = time.perf_counter()
+        try:
+            status, queries = send(url, logged_in)
+        except Exception:
+            status, queries = 599, None
+        elapsed = time.perf_counter() - request_started
+        if time.time() >= measure_from:
+            results.append((name, elapsed, status, queries))
+
+
+def client_worker(args, counts, number, queue):
+    """Воркер с тестовым клиентом Flask в отдельном процессе."""
+    app.logger.disabled = True
+    app.config['METRICS_QUERY_HEADER'] = True
+    rng = random.Random(number)
+    results = []
+    with app.app_context():
+        # Соединения родителя после fork использовать нельзя.
+        db.engine.dispose()
+        anonymous = app.test_client()
+        user = app.test_client()
+        with user.session_transaction() as session:
+            session['_user_id'] = str(rng.randint(1, counts['users']))
+            session['_fresh'] = True
+
+        def send(url, logged_in):
+            response = (user if logged_in else anonymous).get(url)
+            return response.status_code, \
+                response.headers.get('X-Query-Count', type=int)
+
+        drive(send, args, counts, number, results)
+    queue.put(results)
+
+
+def run_client(args, counts):
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    processes = [
+        context.Process(target=client_worker,
+                        args=(args, counts, number, queue))
+        for number in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    results = []
+    for _ in processes:
+        results += queue.get()
+    for process in processes:
+        process.join()
+    return results
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Редирект после лайка или подписки - отдельная страница,
+    в замер сценария он не входит.
+    """
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def opener():
+    return urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect)
+
+
+def http_send(client, base, url, data=None):
+    try:
+        response = client.open(base + url, data=data, timeout=30)
+    except urllib.error.HTTPError as error:
+        response = error
+    with response:
+        response.read()
+        queries = response.headers.get('X-Query-Count')
+        return response.status, int(queries) if queries else None
+
+
+def wait_for(base, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn завершился при запуске')
+        try:
+            urllib.request.urlopen(base + '/about', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn не ответил за отведенное время')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(args, counts):
+    """Локальный gunicorn и --concurrency потоков-клиентов по HTTP."""
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, DATABASE_URL=args.database_url,
+               METRICS_QUERY_HEADER='1', YATUBE_ENV=args.env)
+    env.setdefault('SECRET_KEY', 'benchmark')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers),
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning',
+         'yatube:app'], env=env)
+    results = []
+    try:
+        wait_for(base, server)
+
+        def client_thread(number):
+            rng = random.Random(number)
+            anonymous, user = opener(), opener()
+            user_id = rng.randint(1, counts['users'])
+            http_send(user, base, '/login', urllib.parse.urlencode({
+                'email': f'user{user_id}@example.com',
+                'password': datagen.PASSWORD,
+            }).encode())
+            thread_results = []
+            drive(lambda url, logged_in: http_send(
+                user if logged_in else anonymous, base, url),
+                args, counts, number, thread_results)
+            results.extend(thread_results)
+
+        threads = [threading.Thread(target=client_thread, args=(number,))
+                   for number in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def summarize(rows, duration):
+    latencies = sorted(elapsed for _, elapsed, _, _ in rows)
+    queries = [count for _, _, _, count in rows if count is not None]
+    if not latencies:
+        return {'requests': 0}
+    return {
+        'requests': len(rows),
+        'errors': sum(status >= 500 for _, _, status, _ in rows),
+        'rps': round(len(rows) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2)
+        if queries else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(args, counts, results):
+    by_scenario = defaultdict(list)
+    for row in results:
+        by_scenario[row[0]].append(row)
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.utcnow().isoformat(timespec='seconds'),
+            'target': args.target,
+            'database': args.database_url.split('://')[0],
+            'workers': args.workers,
+            'concurrency': args.concurrency
+            if args.target == 'gunicorn' else args.workers,
+            'duration': args.duration,
+            'anonymous': args.anonymous,
+            'mix': args.mix,
+            'data': counts,
+            'python': platform.python_version(),
+        },
+        'total': summarize(results, args.duration),
+        'scenarios': {name: summarize(rows, args.duration)
+                      for name, rows in sorted(by_scenario.items())},
+    }
+
+
+def print_report(data):
+    print(f'{"сценарий":>14} {"запросов":>9} {"ошибок":>7} {"rps":>8} '
+          f'{"p50":>8} {"p95":>8} {"p99":>8} {"SQL/запрос":>11}')
+    rows = list(data['scenarios'].items()) + [('всего', data['total'])]
+    for name, stats in rows:
+        if not stats['requests']:
+            continue
+        queries = stats['queries_per_request']
+        print(f'{name:>14} {stats["requests"]:>9} {stats["errors"]:>7} '
+              f'{stats["rps"]:>8} {stats["p50_ms"]:>8} {stats["p95_ms"]:>8} '
+              f'{stats["p99_ms"]:>8} '
+              f'{queries if queries is not None else "-":>11}')
+
+
+def compare(old_path, new_path):
+    """Изменение rps, p95 и SQL на запрос между двумя прогонами."""
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print(f'{old["meta"]["commit"]} -> {new["meta"]["commit"]}')
+    print(f'{"сценарий":>14} {"rps":>18} {"p95, мс":>20} {"SQL/запрос":>14}')
+
+    def change(before, after):
+        if not before or after is None:
+            return f'{after}'
+        return f'{after} ({(after - before) / before:+.0%})'
+
+    scenarios = sorted(set(old['scenarios']) | set(new['scenarios']))
+    for name in scenarios + ['total']:
+        before = old['scenarios'].get(name, {}) if name != 'total' \
+            else old['total']
+        after = new['scenarios'].get(name, {}) if name != 'total' \
+            else new['total']
+        if not after.get('requests'):
+            continue
+        queries = change(before.get('queries_per_request'),
+                         after['queries_per_request'])
+        print(f'{name:>14} '
+              f'{change(before.get("rps"), after["rps"]):>18} '
+              f'{change(before.get("p95_ms"), after["p95_ms"]):>20} '
+              f'{queries:>14}')
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in MIX:
+            raise argparse.ArgumentTypeError(f'Неизвестный сценарий {name}')
+        mix[name] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--target', choices=('client', 'gunicorn'),
+                        default='client')
+    parser.add_argument('--database-url', default=None,
+                        help='По умолчанию временная база SQLite.')
+    parser.add_argument('--reuse', action='store_true',
+                        help='Не генерировать данные, база уже заполнена.')
+    parser.add_argument('--env', default='prod',
+                        help='YATUBE_ENV для gunicorn.')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Клиентов для --target gunicorn.')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--anonymous', type=float, default=0.5,
+                        help='Доля чтений от анонимных посетителей.')
+    parser.add_argument('--mix', type=parse_mix, default=dict(MIX),
+                        help='Например index=1,post_detail=3')
+    parser.add_argument('--output', default='benchmark-results.json')
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    directory = None
+    if args.database_url is None:
+        directory = tempfile.mkdtemp()
+        args.database_url = \
+            f'sqlite:///{os.path.join(directory, "scenarios.db")}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    with app.app_context():
+        if not args.reuse:
+            db.drop_all()
+            db.create_all()
+            datagen.generate(datagen.scale_counts(args), args.seed,
+                             args.batch_size)
+        counts = {
+            'users': db.session.query(func.max(User.id)).scalar(),
+            'posts': db.session.query(func.max(Post.id)).scalar(),
+        }
+        db.session.remove()
+        db.engine.dispose()
+
+    if args.target == 'gunicorn':
+        results = run_gunicorn(args, counts)
+    else:
+        results = run_client(args, counts)
+    data = report(args, counts, results)
+    print_report(data)
+    with open(args.output, 'w') as output:
+        json.dump(data, output, indent=2, sort_keys=True, ensure_ascii=False)
+        output.write('\n')
+    print(f'Результат записан в {args.output}')
+    if directory:
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
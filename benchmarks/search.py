@@ -0,0 +1,101 @@
+"""Сравнение поиска через FTS5 и LIKE на синтетическом корпусе постов.
+
+Запуск: python -m benchmarks.search --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from yatube import app
+from app import db, User
+from utils.search import LikeSearchBackend, SQLiteFTSBackend, tokenize
+
+WORDS = (
+    'пост блог новость город страна погода музыка книга фильм кино '
+    'программа python flask база данные поиск индекс сервер запрос '
+    'лето зима весна осень утро вечер друзья работа отдых путешествие '
+    'кошка собака машина дорога море горы река лес поле небо'
+).split()
+SYLLABLES = ('ка', 'ро', 'ми', 'ла', 'то', 'не', 'ва', 'су', 'де', 'по')
+VOCABULARY_SIZE = 20000
+QUERIES = ('python', 'путешествия', 'музыка кино', 'база данных',
+           'несуществующееслово')
+BATCH = 10000
+
+
+def make_vocabulary(rng):
+    """Словарь с распределением Ципфа: несколько частых слов и длинный
+    хвост редких, как в настоящих текстах.
+    """
+    words = list(WORDS)
+    while len(words) < VOCABULARY_SIZE:
+        words.append(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 5))))
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    rng.shuffle(words)
+    return words, weights
+
+
+def fill(total, rng, vocabulary):
+    """Добавляет посты в таблицы post и post_fts пачками через executemany."""
+    words, weights = vocabulary
+    connection = db.session.connection()
+    SQLiteFTSBackend.create_table(connection)
+    done = connection.execute(text('SELECT count(*) FROM post')).scalar()
+    while done < total:
+        rows = []
+        for post_id in range(done + 1, min(done + BATCH, total) + 1):
+            title = ' '.join(rng.choices(words, weights, k=4))
+            body = ' '.join(rng.choices(words, weights, k=40))
+            rows.append({'id': post_id, 'title': title, 'text': body,
+                         'title_stems': ' '.join(tokenize(title)),
+                         'text_stems': ' '.join(tokenize(body))})
+        connection.execute(text(
+            'INSERT INTO post (id, title, text, created_at, user_id) '
+            "VALUES (:id, :title, :text, datetime('now'), 1)"), rows)
+        connection.execute(text(
+            'INSERT INTO post_fts (rowid, title, text) '
+            'VALUES (:id, :title_stems, :text_stems)'), rows)
+        done += len(rows)
+    db.session.commit()
+
+
+def measure(backend, repeat):
+    timings = []
+    for q in QUERIES:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            backend.search(q, 1, 10)
+        timings.append((time.perf_counter() - started) / repeat)
+    return sum(timings) / len(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    path = os.path.join(tempfile.mkdtemp(), 'search.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='bench', email='bench@example.com',
+                            password='x'))
+        db.session.commit()
+        print(f'{"постов":>10} {"fts5, мс":>10} {"like, мс":>10}')
+        for size in sorted(args.sizes):
+            fill(size, rng, vocabulary)
+            fts = measure(SQLiteFTSBackend(), args.repeat)
+            like = measure(LikeSearchBackend(), args.repeat)
+            print(f'{size:>10} {fts:>10.2f} {like:>10.2f}')
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
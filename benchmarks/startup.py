@@ -0,0 +1,206 @@
+"""Проверка запуска приложения через create_app: сборка не открывает
+соединений с базой, не запускает потоков и не загружает alembic вне
+команд flask db. Замеряются импорт со сборкой и первый запрос в новом
+процессе, а также запуск gunicorn до первого ответа и память воркеров
+с загрузкой приложения в мастере (gunicorn.conf.py) и без нее.
+
+Запуск: python -m benchmarks.startup --repeat 5 --workers 2
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from benchmarks.helpers import check
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Выполняется в отдельном процессе: импорт и первые запросы с нуля.
+COLD_START = '''
+import json, time
+started = time.perf_counter()
+from yatube import app
+created = time.perf_counter()
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+from app import db
+timings = {'import': created - started}
+with app.app_context():
+    db.create_all()
+    client = app.test_client()
+    for url in ('/about', '/'):
+        started = time.perf_counter()
+        client.get(url)
+        timings[url] = time.perf_counter() - started
+print(json.dumps(timings))
+'''
+
+
+def cold_start(repeat):
+    """Медианы времени в миллисекундах по repeat новым процессам."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_START], cwd=ROOT, check=True,
+            capture_output=True, text=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    return {key: statistics.median(run[key] for run in runs) * 1000
+            for key in runs[0]}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def first_response(base, process, timeout=30):
+    """Ждет первого ответа gunicorn на /about."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn завершился при запуске')
+        try:
+            urllib.request.urlopen(base + '/about', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('gunicorn не ответил за отведенное время')
+
+
+def private_memory(pid):
+    """Память процесса, не разделенная с другими, в КБ (Linux)."""
+    total = 0
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1])
+    return total
+
+
+def worker_pids(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as file:
+        return [int(child) for child in file.read().split()]
+
+
+def gunicorn_start(workers, preload, database_url, requests):
+    """Секунды до первого ответа и частная память воркеров после
+    requests запросов к главной.
+    """
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, DATABASE_URL=database_url,
+               GUNICORN_PRELOAD='1' if preload else '0')
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers),
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning',
+         'yatube:app'], cwd=ROOT, env=env)
+    try:
+        first_response(base, server)
+        first = time.perf_counter() - started
+        for _ in range(requests):
+            urllib.request.urlopen(base + '/', timeout=5).read()
+        try:
+            memory = sum(private_memory(child)
+                         for child in worker_pids(server.pid))
+        except OSError:
+            memory = None
+    finally:
+        server.terminate()
+        server.wait()
+    return first, memory
+
+
+def app_state(app):
+    """Состояние расширений, которое видно из контекста app."""
+    from utils.cache import cache
+    from utils.events import broker
+    from utils.last_seen import last_seen_buffer
+    from utils.search import get_backend
+    with app.app_context():
+        return {
+            'cache': cache.backend,
+            'cache_type': type(cache.backend),
+            'broker': broker._get_current_object(),
+            'last_seen_app': last_seen_buffer.app,
+            'search': get_backend(),
+        }
+
+
+def independent_apps(create_app):
+    """Второе приложение с другими настройками не меняет первое."""
+    from config import TestingConfig
+    first = create_app(TestingConfig)
+    first.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    before = app_state(first)
+    second_config = type('SecondConfig', (TestingConfig,),
+                         {'CACHE_BACKEND': 'lru'})
+    second = create_app(second_config)
+    second.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    after, other = app_state(first), app_state(second)
+    return before == after and after['last_seen_app'] is first and \
+        other['last_seen_app'] is second and \
+        after['cache_type'] is not other['cache_type'] and \
+        all(after[key] is not other[key]
+            for key in ('cache', 'broker', 'search'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=50,
+                        help='Запросов к gunicorn перед замером памяти.')
+    args = parser.parse_args()
+    results = []
+
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    from app import create_app, db
+    app = create_app()
+    elapsed = (time.perf_counter() - started) * 1000
+    results.append(check(
+        'create_app не открывает соединений с базой',
+        not app.extensions['sqlalchemy'].connectors))
+    results.append(check('create_app не запускает потоков',
+                         threading.active_count() == 1))
+    results.append(check('alembic не загружается вне команд flask db',
+                         'flask_migrate' not in sys.modules and
+                         'alembic' not in sys.modules))
+    results.append(check('приложения из create_app независимы',
+                         independent_apps(create_app)))
+    print(f'    импорт и сборка в этом процессе: {elapsed:.0f} мс')
+
+    timings = cold_start(args.repeat)
+    print(f'    новый процесс: импорт {timings["import"]:.0f} мс, первый '
+          f'/about {timings["/about"]:.1f} мс, первый / '
+          f'{timings["/"]:.1f} мс')
+
+    directory = tempfile.mkdtemp()
+    database_url = f'sqlite:///{directory}/startup.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    with app.app_context():
+        db.create_all()
+        db.session.remove()
+        db.get_engine(app).dispose()
+    for preload in (False, True):
+        first, memory = gunicorn_start(args.workers, preload, database_url,
+                                       args.requests)
+        memory = f'{memory} КБ' if memory is not None else 'нет данных'
+        print(f'    gunicorn -w {args.workers}, preload '
+              f'{"вкл" if preload else "выкл"}: первый ответ через '
+              f'{first:.2f} с, частная память воркеров {memory}')
+    shutil.rmtree(directory)
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
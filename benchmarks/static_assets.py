@@ -0,0 +1,108 @@
+"""Проверка сборки статики (utils/assets.py) на копии каталога static:
+ссылки ведут на файлы с хешем, они отдаются сжатыми и с immutable,
+а браузеру с кешем больше не нужно перепроверять их на каждой странице.
+
+Запуск: python -m benchmarks.static_assets
+"""
+import re
+import shutil
+import sys
+import tempfile
+
+from yatube import app
+from app import db
+from utils import assets
+from benchmarks.helpers import check
+
+STATIC_RE = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+def page_assets(client):
+    response = client.get('/about')
+    return STATIC_RE.findall(response.get_data(as_text=True))
+
+
+def revalidations(client, urls):
+    """Сколько запросов дойдет до воркера, когда браузер с заполненным
+    кешем откроет страницу: все, что не помечено immutable.
+    """
+    return sum('immutable' not in client.get(url).headers.get(
+        'Cache-Control', '') for url in urls)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    static = shutil.copytree(app.static_folder, f'{directory}/static',
+                             ignore=shutil.ignore_patterns('dist'))
+    app.static_folder = static
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    results = []
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+
+        app.config['ASSETS_USE_MANIFEST'] = True
+        before_urls = page_assets(client)
+        before = revalidations(client, before_urls)
+        plain = sum(len(client.get(url).get_data()) for url in before_urls)
+
+        manifest, written = assets.build_assets()
+        urls = page_assets(client)
+        hashed = sum(url.startswith('/static/dist/') for url in urls)
+        results.append(check(
+            'ссылки на странице ведут на файлы с хешем',
+            urls and hashed == len(urls), f': {hashed} из {len(urls)}'))
+        after = revalidations(client, urls)
+        results.append(check(
+            'браузер с кешем не перепроверяет статику',
+            after == 0, f': запросов на страницу {before} -> {after}'))
+
+        compressed = 0
+        for url in urls:
+            response = client.get(url, headers={
+                'Accept-Encoding': 'gzip, deflate, br'})
+            compressed += len(response.get_data())
+        results.append(check(
+            'сжатые варианты отдаются браузеру',
+            compressed < plain,
+            f': {plain} -> {compressed} байт на первую загрузку'))
+
+        css = next(url for url in urls if url.endswith('.css'))
+        response = client.get(css, headers={'Accept-Encoding': 'gzip'})
+        results.append(check(
+            'gzip с Content-Type исходника и Vary',
+            response.content_encoding == 'gzip' and
+            response.mimetype == 'text/css' and
+            'Accept-Encoding' in response.vary and
+            response.cache_control.max_age == app.config['ASSETS_MAX_AGE']))
+        response = client.get(css)
+        with open(f'{static}/css/style.css', 'rb') as file:
+            source = file.read()
+        results.append(check('без Accept-Encoding отдается исходник',
+                             response.content_encoding is None and
+                             response.data == source))
+
+        name = 'profile_pics/' + '0' * 32 + '_65.jpg'
+        shutil.copy(f'{static}/profile_pics/default.jpg', f'{static}/{name}')
+        avatar = client.get('/static/' + name)
+        default = client.get('/static/profile_pics/default.jpg')
+        results.append(check(
+            'аватары с хешем immutable, старые ссылки перепроверяются',
+            'immutable' in avatar.headers['Cache-Control'] and
+            'immutable' not in default.headers.get('Cache-Control', '')))
+
+        with open(f'{static}/css/style.css', 'a') as file:
+            file.write('\n/* правка */\n')
+        new_manifest, written = assets.build_assets()
+        results.append(check(
+            'правка меняет имя, старая копия остается',
+            new_manifest['css/style.css'] != manifest['css/style.css'] and
+            written == 1 and
+            client.get('/static/' + manifest['css/style.css'])
+            .status_code == 200))
+    shutil.rmtree(directory)
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
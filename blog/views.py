@@ -1,25 +1,46 @@
-from flask import render_template, flash, url_for, redirect, abort, request
+from flask import (
+    Blueprint, render_template, flash, url_for, redirect, abort, request,
+    jsonify
+)
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload, load_only
 
-from app import app, db, mail, Post, Comment, Like, User
+from app import db, mail, Post, Comment, User
 from forms import (
     PostCreateForm, AddCommentForm,
     EditCommentForm, ContactUsForm
 )
-from utils.utils import send_message
+from utils.cache import cache_page
+from utils.conditional import conditional_page
+from utils.likes import (
+    add_like, liked_post_ids, remove_like, toggle_like
+)
+from utils.pagination import paginate_keyset, paginate_request
+from utils.search import search_posts
+from utils.utils import is_local_url, send_message
+
+bp = Blueprint('blog', __name__)
+
+# Количество постов на странице ленты.
+POSTS_PER_PAGE = 3
+# Сколько пользователей показывать на главной странице.
+USERS_ON_INDEX = 10
+# Количество комментариев на странице поста и в одной подгрузке.
+COMMENTS_PER_PAGE = 20
 
 
-@app.route('/')
+@bp.route('/', endpoint='index')
+@cache_page(lambda: ['posts', 'users'])
 def get_index_page():
     """Главная страница сайта. Отображение всех постов."""
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(
-        Post.created_at.desc()).paginate(page=page, per_page=3)
-    try:
-        last_post = Post.query.all()[-1]
-    except:
-        last_post = None
-    users = User.query.all()
+    # Автор подгружается вместе с постом, без отдельного запроса на карточку.
+    posts = paginate_request(
+        Post.query.options(joinedload(Post.author)), Post, POSTS_PER_PAGE)
+    last_post = Post.query.order_by(
+        Post.created_at.desc(), Post.id.desc()).first()
+    users = User.query.options(
+        load_only(User.id, User.username, User.image_file)
+    ).order_by(User.last_seen.desc()).limit(USERS_ON_INDEX).all()
     return render_template(
         'blog/index.html',
         last_post=last_post,
@@ -28,29 +49,28 @@ def get_index_page():
     )
 
 
-@app.route('/search')
+@bp.route('/search', endpoint='search')
 def search_query():
     """Отображение результатов поиска по указанному запросу."""
-    page = request.args.get('page', 1, type=int)
     q = request.args.get('q')
-    if q:
-        posts = Post.query.filter(
-            Post.title.contains(q) | Post.text.contains(q)).paginate(
-            page=page, per_page=3)
-        return render_template(
-            'blog/search_result.html',
-            posts=posts,
-            q=q
-        )
+    if not q:
+        return redirect(url_for('blog.index'))
+    page = request.args.get('page', 1, type=int)
+    posts = search_posts(q, page=page, per_page=POSTS_PER_PAGE)
+    return render_template(
+        'blog/search_result.html',
+        posts=posts,
+        q=q
+    )
 
 
-@app.route('/about')
+@bp.route('/about', endpoint='about')
 def get_about_page():
     """Страничка о создателе блога."""
     return render_template('blog/about.html', )
 
 
-@app.route('/create', methods=['GET', 'POST'])
+@bp.route('/create', methods=['GET', 'POST'], endpoint='create')
 @login_required
 def create_new_post():
     """Создание нового поста в ленту пользователем."""
@@ -64,11 +84,11 @@ def create_new_post():
         db.session.add(post)
         db.session.commit()
         flash('Пост добавлен', 'success')
-        return redirect(url_for('index'))
+        return redirect(url_for('blog.index'))
     return render_template('blog/create.html', form=form)
 
 
-@app.route('/post/edit/<post_id>', methods=['GET', 'POST'])
+@bp.route('/post/edit/<post_id>', methods=['GET', 'POST'])
 @login_required
 def post_edit(post_id: int):
     """Изменение поста."""
@@ -81,7 +101,7 @@ def post_edit(post_id: int):
         post.text = request.form['text']
         try:
             db.session.commit()
-            return redirect(url_for('post_detail', post_id=post.id))
+            return redirect(url_for('blog.post_detail', post_id=post.id))
         except Exception as error:
             return error
     elif request.method == 'GET':
@@ -93,7 +113,7 @@ def post_edit(post_id: int):
                            form=form)
 
 
-@app.route('/post/delete/<post_id>', methods=['GET', 'POST'])
+@bp.route('/post/delete/<post_id>', methods=['GET', 'POST'])
 @login_required
 def post_delete(post_id: int):
     post = Post.query.get_or_404(post_id)
@@ -103,51 +123,96 @@ def post_delete(post_id: int):
         db.session.delete(post)
         db.session.commit()
         flash('Пост удален:(', 'danger')
-        return redirect(url_for('index'))
+        return redirect(url_for('blog.index'))
     except Exception as error:
         return error
 
 
-@app.route("/post/<post_id>", methods=["GET", "POST"])
+def comments_page(post_id):
+    """Комментарии поста от новых к старым, страница по курсору из
+    запроса. Авторы загружаются тем же запросом.
+    """
+    return paginate_keyset(
+        Comment.query.options(
+            joinedload(Comment.author).load_only(User.username,
+                                                 User.image_file)
+        ).filter(Comment.post_id == post_id),
+        Comment,
+        cursor=request.args.get('cursor'),
+        per_page=COMMENTS_PER_PAGE,
+    )
+
+
+@bp.route("/post/<post_id>", methods=["GET", "POST"], endpoint="post_detail")
+@conditional_page(lambda post_id: [f'post:{post_id}', 'users'])
+@cache_page(lambda post_id: [f'post:{post_id}', 'users'])
 def get_post_detail(post_id: int):
     """Отображение конкретного поста с возможностью добавления комментария и
-    поставить отметку нравится/не нравится.
+    поставить отметку нравится/не нравится. Комментарии выводятся
+    страницами, следующие подгружаются через post_comments.
     """
-    post = Post.query.get_or_404(post_id)
-    comments = Comment.query.filter_by(post_id=post_id)
-    if current_user.is_authenticated:
-        like = Like.query.filter_by(
-            author=current_user.id,
-            post_id=post_id).first()
-    else:
-        like = False
+    post = Post.query.options(joinedload(Post.author)).get_or_404(post_id)
+    like = post.id in liked_post_ids(current_user, [post.id])
     form = AddCommentForm()
     if form.validate_on_submit() and current_user.is_authenticated:
+        # Отправка формы без JavaScript.
         comment = Comment(
-            text=form.text.data,
+            body=form.body.data,
             post_id=post.id,
             user_id=current_user.id,
         )
         db.session.add(comment)
         db.session.commit()
         flash("Комментарий добавлен.", "success")
-        return redirect(url_for("post_detail", post_id=post.id))
+        return redirect(url_for("blog.post_detail", post_id=post.id))
     return render_template("blog/post_detail.html", post=post, like=like,
-                           form=form, comments=comments)
+                           form=form, comments=comments_page(post.id))
 
 
-@app.errorhandler(404)
+@bp.route('/post/<int:post_id>/comments', methods=['GET', 'POST'],
+           endpoint='post_comments')
+@cache_page(lambda post_id: [f'post:{post_id}', 'users'])
+def post_comments(post_id: int):
+    """Разметка комментариев в JSON: GET отдает следующую страницу
+    по курсору, POST добавляет комментарий и возвращает только его.
+    """
+    if db.session.query(Post.id).filter_by(id=post_id).scalar() is None:
+        abort(404)
+    if request.method == 'POST':
+        if not current_user.is_authenticated:
+            return jsonify(error='Войдите, чтобы оставить комментарий'), 401
+        form = AddCommentForm()
+        if not form.validate_on_submit():
+            return jsonify(errors=form.errors), 400
+        comment = Comment(
+            body=form.body.data,
+            post_id=post_id,
+            user_id=current_user.id,
+        )
+        db.session.add(comment)
+        db.session.commit()
+        return jsonify(html=render_template('includes/comments.html',
+                                            comments=[comment])), 201
+    comments = comments_page(post_id)
+    return jsonify(
+        html=render_template('includes/comments.html',
+                             comments=comments.items),
+        next_cursor=comments.next_cursor,
+    )
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('error/404.html'), 404
 
 
-@app.errorhandler(403)
+@bp.app_errorhandler(403)
 def internal_error(error):
     db.session.rollback()
     return render_template('error/500.html'), 403
 
 
-@app.route("/comment/<comm_id>/", methods=["GET", "POST"])
+@bp.route("/comment/<comm_id>/", methods=["GET", "POST"])
 @login_required
 def comment_edit(comm_id: int):
     comment = Comment.query.get_or_404(comm_id)
@@ -158,7 +223,8 @@ def comment_edit(comm_id: int):
         comment.text = request.form['text']
         try:
             db.session.commit()
-            return redirect(url_for('post_detail', post_id=comment.post.id))
+            return redirect(url_for('blog.post_detail',
+                                    post_id=comment.post.id))
         except Exception as error:
             return error
     else:
@@ -166,7 +232,7 @@ def comment_edit(comm_id: int):
     return render_template('blog/comment_edit.html', form=form)
 
 
-@app.route('/contact_us', methods=["GET", "POST"])
+@bp.route('/contact_us', methods=["GET", "POST"])
 @login_required
 def contact_us():
     form = ContactUsForm()
@@ -176,22 +242,25 @@ def contact_us():
     return render_template('blog/contact_us.html', form=form)
 
 
-@app.route('/like_post/<post_id>', methods=["GET", "POST"])
+@bp.route('/like_post/<int:post_id>', methods=["GET", "POST"])
 @login_required
 def like_post(post_id: int):
-    """Поставить/убрать отметку лайк посту."""
-    post = Post.query.filter_by(id=post_id)
-    like = Like.query.filter_by(
-        author=current_user.id, post_id=post_id).first()
-    if not post:
-        flash('error', 'warning')
-    elif like:
-        # Если есть лайк к текущему посту, он удаляется из бд.
-        db.session.delete(like)
-        db.session.commit()
+    """Поставить/убрать отметку лайк посту.
+    ?action=like или unlike задает нужное состояние, поэтому повторный
+    клик по той же ссылке ничего не меняет.
+    """
+    if db.session.query(Post.id).filter_by(id=post_id).scalar() is None:
+        abort(404)
+    action = request.args.get('action')
+    if action == 'like':
+        add_like(current_user, post_id)
+    elif action == 'unlike':
+        remove_like(current_user, post_id)
     else:
-        # Если лайка нет к текущему посту, он добавляется в бд.
-        like = Like(author=current_user.id, post_id=post_id)
-        db.session.add(like)
-        db.session.commit()
-    return redirect(url_for('post_detail', post_id=post_id))
+        toggle_like(current_user, post_id)
+    db.session.commit()
+    # Возврат только на страницы этого сайта.
+    next_page = request.args.get('next', '')
+    if not is_local_url(next_page):
+        next_page = url_for('blog.post_detail', post_id=post_id)
+    return redirect(next_page)
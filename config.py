@@ -1,16 +1,222 @@
-from keys import MAIL_DEFAULT_SENDER, MAIL_USERNAME, MAIL_PASSWORD
+import os
+
+# Локальный файл с почтовыми учетными данными, в репозиторий не входит.
+try:
+    import keys
+except ImportError:
+    keys = None
+
+
+def mail_setting(name):
+    """Настройка почты из окружения, иначе из keys.py, если он есть."""
+    return os.environ.get(name, getattr(keys, name, None))
+
+
+def database_url(default):
+    """Адрес базы из DATABASE_URL. Схему postgres://, которую выдает
+    Heroku, SQLAlchemy 1.4 не принимает, поэтому она исправляется.
+    """
+    url = os.environ.get('DATABASE_URL', default)
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def replica_urls():
+    """Реплики для чтения из DATABASE_REPLICA_URLS через запятую,
+    в виде SQLALCHEMY_BINDS с ключами replica0, replica1, ...
+    """
+    urls = os.environ.get('DATABASE_REPLICA_URLS', '')
+    return {
+        f'replica{number}': url.strip().replace('postgres://',
+                                                'postgresql://', 1)
+        for number, url in enumerate(urls.split(',')) if url.strip()
+    }
+
+
+def engine_options(url):
+    """Пул соединений для PostgreSQL. Для SQLite пул выбирает
+    Flask-SQLAlchemy, а настройки задаются через SQLITE_PRAGMAS.
+    """
+    if not url.startswith('postgresql'):
+        return {}
+    timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT', 5000))
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': 10,
+        # Соединения пересоздаются раньше, чем их закроет сервер.
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'connect_args': {'options': f'-c statement_timeout={timeout}'},
+    }
 
 
 class Config(object):
-    DEBUG = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:/// test.db'
+    """Общие настройки. Профиль выбирается переменной YATUBE_ENV."""
+    DEBUG = False
+    SECRET_KEY = os.environ.get('SECRET_KEY',
+                                '5791628bb0b13ce0c676df2de280ba245')
+    SQLALCHEMY_DATABASE_URI = database_url('sqlite:/// test.db')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Реплики только для чтения (utils/routing.py). После записи
+    # пользователь читает с основной базы REPLICA_STICKY_SECONDS секунд.
+    SQLALCHEMY_BINDS = replica_urls()
+    REPLICA_STICKY_SECONDS = 5
+    # Выполняются на каждом новом соединении с SQLite (utils/database.py):
+    # WAL не блокирует чтение во время записи, busy_timeout ждет
+    # освобождения базы вместо ошибки database is locked.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+    }
+    # Поисковый движок: 'fts5', 'like' или None для выбора по базе данных.
+    SEARCH_BACKEND = None
+    # Время последнего визита обновляется не чаще раза в N секунд
+    # и записывается в базу пачками раз в LAST_SEEN_FLUSH_INTERVAL секунд.
+    LAST_SEEN_GRANULARITY = 300
+    LAST_SEEN_FLUSH_INTERVAL = 30
+    # Сколько постов хранится в ленте одного пользователя.
+    TIMELINE_MAX_ENTRIES = 500
+    # Посты авторов с большим числом подписчиков не раскладываются по лентам,
+    # а подмешиваются при чтении.
+    TIMELINE_FANOUT_LIMIT = 1000
+    # Сколько подписок пользователя просматривается при подборе
+    # рекомендаций «кого почитать» по подпискам подписок.
+    FOLLOW_SUGGESTIONS_FANOUT = 200
+    # Аватары: размеры вариантов в пикселях, ограничения загрузки
+    # и число процессов для обработки изображений.
+    AVATAR_SIZES = (65, 130, 400)
+    AVATAR_MAX_BYTES = 5 * 1024 * 1024
+    AVATAR_MAX_PIXELS = 25000000
+    AVATAR_WORKERS = 2
+    # Кеш страниц и фрагментов: 'lru' (в памяти процесса), 'redis' или None.
+    CACHE_BACKEND = 'lru'
+    CACHE_REDIS_URL = 'redis://localhost:6379/0'
+    CACHE_MAX_BYTES = 32 * 1024 * 1024
+    # Сколько версий тегов (post:{id}, user:{id}, ...) держит 'lru'.
+    CACHE_MAX_TAGS = 100000
+    CACHE_DEFAULT_TTL = 300
+    # Кеш пользователя для Flask-Login: время жизни в секундах (0 -
+    # загрузка из базы на каждый запрос) и загрузка только полей из
+    # utils/identity.py, без профильных.
+    USER_CACHE_TTL = 60
+    USER_LOADER_LOAD_ONLY = True
+    # Ответ 304 на If-None-Match для поста и страниц пользователя
+    # (utils/conditional.py). ETag строится из версий тегов кеша, без
+    # кеша (CACHE_BACKEND = None) не используется.
+    CONDITIONAL_GET = True
+    # События для SSE (/events/...). Каждое соединение держит поток
+    # воркера до EVENTS_MAX_AGE секунд, поэтому включаются, только если
+    # /events/ обслуживает асинхронный воркер (gevent), см. README.
+    EVENTS_ENABLED = False
+    # Брокер 'local' (только внутри процесса) или
+    # 'redis', размер буфера одного соединения, период пинга и время
+    # жизни соединения в секундах, после которого браузер переподключится.
+    EVENTS_BROKER = 'local'
+    EVENTS_REDIS_URL = 'redis://localhost:6379/0'
+    EVENTS_BUFFER_SIZE = 100
+    EVENTS_HEARTBEAT = 15
+    EVENTS_MAX_AGE = 300
+    # Статика (utils/assets.py): каталог внутри static для копий с хешем
+    # в имени, ссылаться ли на них через манифест и сколько секунд
+    # браузер хранит такие файлы. USE_X_SENDFILE передает отдачу файлов
+    # веб-серверу (Apache, lighttpd), иначе их отдает sendfile gunicorn.
+    ASSETS_BUILD_DIR = 'dist'
+    ASSETS_USE_MANIFEST = True
+    ASSETS_MAX_AGE = 365 * 24 * 60 * 60
+    USE_X_SENDFILE = False
+    # Метрики: токен для /metrics (None - эндпоинт выключен), порог
+    # медленного SQL-запроса в секундах и число повторов одного запроса
+    # за HTTP-запрос, после которого пишется предупреждение о N+1.
+    METRICS_TOKEN = None
+    METRICS_SLOW_QUERY = 0.1
+    METRICS_N_PLUS_ONE = 10
+    # Каталог, где воркеры gunicorn сохраняют свои счетчики раз в
+    # METRICS_SAVE_INTERVAL секунд, а /metrics их складывает. None -
+    # только счетчики процесса, который ответил на запрос.
+    METRICS_DIR = None
+    METRICS_SAVE_INTERVAL = 1.0
+    # Заголовок X-Query-Count с числом SQL-запросов в каждом ответе.
+    METRICS_QUERY_HEADER = os.environ.get('METRICS_QUERY_HEADER') == '1'
+    # Стоимость bcrypt. Хеши с другой стоимостью пересчитываются при входе.
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    # Число потоков для хеширования паролей в одном воркере и сколько
+    # секунд запрос ждет своей очереди, прежде чем получить 503.
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_TIMEOUT = 5
+    # Ограничения входа (число попыток, период в секундах): неудачные
+    # попытки для одного аккаунта и все попытки с одного IP-адреса.
+    LOGIN_LIMIT_PER_ACCOUNT = (5, 300)
+    LOGIN_LIMIT_PER_IP = (30, 60)
+    # Сколько прокси перед приложением дописывают X-Forwarded-For. Без
+    # этого адрес клиента - адрес прокси, и лимит входа по IP становится
+    # общим для всех. 0 - заголовок не читается.
+    PROXY_FIX_X_FOR = 0
     SECURITY_PASSWORD_SALT = 'salt'
     SECURITY_PASSWORD_HASH = 'bcrypt'
     WTF_CSRF_ENABLED = False
     MAIL_SERVER = 'smtp.googlemail.com'
     MAIL_PORT = 587
     MAIL_USE_TLS = True
-    MAIL_DEFAULT_SENDER = MAIL_DEFAULT_SENDER
-    MAIL_USERNAME = MAIL_USERNAME
-    MAIL_PASSWORD = MAIL_PASSWORD
+    MAIL_DEFAULT_SENDER = mail_setting('MAIL_DEFAULT_SENDER')
+    # Очередь писем: размер пачки на одно SMTP-соединение, число попыток,
+    # начальная пауза перед повтором (удваивается) и окно дедупликации.
+    MAIL_BATCH_SIZE = 50
+    MAIL_MAX_ATTEMPTS = 5
+    MAIL_RETRY_DELAY = 30
+    MAIL_DEDUP_WINDOW = 600
+    MAIL_USERNAME = mail_setting('MAIL_USERNAME')
+    MAIL_PASSWORD = mail_setting('MAIL_PASSWORD')
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    # Правки в static видны сразу, без assets-build.
+    ASSETS_USE_MANIFEST = False
+    # flask run обслуживает каждое соединение в своем потоке.
+    EVENTS_ENABLED = True
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    CACHE_BACKEND = None
+    MAIL_SUPPRESS_SEND = True
+    AVATAR_WORKERS = 1
+    BCRYPT_LOG_ROUNDS = 4
+
+
+class ProductionConfig(Config):
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', Config.CACHE_BACKEND)
+    CACHE_REDIS_URL = os.environ.get('REDIS_URL', Config.CACHE_REDIS_URL)
+    EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED') == '1'
+    EVENTS_BROKER = os.environ.get('EVENTS_BROKER', Config.EVENTS_BROKER)
+    EVENTS_REDIS_URL = os.environ.get('REDIS_URL', Config.EVENTS_REDIS_URL)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE') == '1'
+    # По умолчанию один прокси: роутер Heroku.
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 1))
+
+
+CONFIGS = {
+    'dev': DevelopmentConfig,
+    'test': TestingConfig,
+    'prod': ProductionConfig,
+}
+
+
+def get_config(name=None):
+    """Класс настроек профиля name или YATUBE_ENV, по умолчанию dev."""
+    name = name or os.environ.get('YATUBE_ENV', 'dev')
+    if name not in CONFIGS:
+        raise RuntimeError(
+            f'Неизвестный профиль {name}, '
+            f'доступны: {", ".join(CONFIGS)}')
+    if name == 'prod' and 'SECRET_KEY' not in os.environ:
+        raise RuntimeError('Для профиля prod задайте SECRET_KEY')
+    return CONFIGS[name]
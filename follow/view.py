@@ -1,38 +1,63 @@
-from flask import flash, url_for, redirect
+from flask import Blueprint, flash, url_for, redirect, render_template, request
 from flask_login import login_required, current_user
 
-from app import app, db, User
+from app import db, User
+from utils.follows import follow, suggestions, unfollow
+from utils.likes import liked_post_ids
+from utils.timeline import feed_page, on_follow, on_unfollow
 
+bp = Blueprint('follow', __name__)
 
-@app.route('/follow/<username>')
+# Количество постов на странице ленты подписок.
+POSTS_PER_PAGE = 3
+
+
+@bp.route('/feed', endpoint='feed')
+@login_required
+def get_feed():
+    """Лента постов авторов, на которых подписан пользователь."""
+    posts = feed_page(
+        current_user, request.args.get('cursor'), POSTS_PER_PAGE)
+    liked = liked_post_ids(current_user, [post.id for post in posts.items])
+    return render_template(
+        'follow/feed.html',
+        posts=posts,
+        liked=liked,
+        suggested=suggestions(current_user),
+    )
+
+
+@bp.route('/follow/<username>', endpoint='follow')
 @login_required
 def follow_user(username):
     """Добавление автора постов в избранные."""
     user = User.query.filter_by(username=username).first()
     if user is None:
         flash(f'Автор с именем {username} не найден')
-        return redirect(url_for('index'))
+        return redirect(url_for('blog.index'))
     if user == current_user:
         flash('У нас нельзя подписаться на самого себя!')
-        return redirect(url_for('user_profile', username=username))
-    current_user.follow(user)
+        return redirect(url_for('profile.user_profile', username=username))
+    if follow(current_user, user):
+        on_follow(current_user, user)
     db.session.commit()
     flash(f'Вы подписались на {username}!')
-    return redirect(url_for('user_profile', username=username))
+    return redirect(url_for('profile.user_profile', username=username))
 
 
-@app.route('/unfollow/<username>')
+@bp.route('/unfollow/<username>', endpoint='unfollow')
 @login_required
 def unfollow_user(username):
     """Удаление автора из избранных авторов."""
     user = User.query.filter_by(username=username).first()
     if user is None:
         flash(f'Автор с именем {username} не найден')
-        return redirect(url_for('index'))
+        return redirect(url_for('blog.index'))
     if user == current_user:
         flash('Нельзя отписаться от самого себя, вы чего??')
-        return redirect(url_for('user_profile', username=username))
-    current_user.unfollow(user)
+        return redirect(url_for('profile.user_profile', username=username))
+    if unfollow(current_user, user):
+        on_unfollow(current_user, user)
     db.session.commit()
     flash(f'ы больше не подписаны на {username} :(')
-    return redirect(url_for('user_profile', username=username))
+    return redirect(url_for('profile.user_profile', username=username))
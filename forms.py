@@ -60,7 +60,7 @@ class ProfileForm(FlaskForm):
                 raise ValidationError('Такое имя уже занято. Выбери другое')
 
     def validate_email(self, email):
-        if email.data != current_user.username:
+        if email.data != current_user.email:
             user = User.query.filter_by(email=email.data).first()
             if user:
                 raise ValidationError('Такой email уже занят. Выбери другой')
@@ -126,5 +126,6 @@ class ContactUsForm(FlaskForm):
 class SendMessageForm(FlaskForm):
     """Форма отправки сообщений"""
     body = TextAreaField(
-        'Отправьте ваше сообщение', validators=[Length(max=199)]
+        'Отправьте ваше сообщение',
+        validators=[DataRequired(), Length(max=199)]
     )
@@ -0,0 +1,38 @@
+"""Настройки gunicorn, подхватываются из текущего каталога.
+
+Приложение загружается один раз в мастере (preload_app), воркеры
+получают его готовым через fork: старт воркера не тратит время на
+импорт и сборку приложения, а память с кодом и шаблонами общая.
+create_app не открывает соединений с базой и не запускает потоков,
+все это создается в воркере при первом запросе. Отключить загрузку
+в мастере можно переменной GUNICORN_PRELOAD=0, например чтобы
+kill -HUP перечитывал код.
+"""
+import gc
+import glob
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def on_starting(server):
+    """Удаляет счетчики воркеров прошлого запуска из METRICS_DIR
+    (utils/metrics.py), иначе /metrics сложил бы их с новыми.
+    """
+    directory = os.environ.get('METRICS_DIR')
+    if directory:
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)
+
+
+def when_ready(server):
+    """Перед запуском воркеров компилирует все шаблоны и замораживает
+    объекты сборщика мусора: сборка в воркере не трогает страницы
+    памяти, унаследованные от мастера, и они остаются общими.
+    """
+    if not server.cfg.preload_app:
+        return
+    app = server.app.wsgi()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    gc.freeze()
@@ -0,0 +1,73 @@
+"""added conversations
+
+Revision ID: 3f9a6c1d8e25
+Revises: e41b6a9f2c07
+Create Date: 2026-10-18 16:12:40.518337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a6c1d8e25'
+down_revision = 'e41b6a9f2c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('direct_key', sa.String(length=32), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_message_at', sa.DateTime(), nullable=True),
+    sa.Column('last_message_text', sa.String(length=199), nullable=True),
+    sa.Column('last_sender_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['last_sender_id'], ['user.id'],
+                            ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('direct_key')
+    )
+    op.create_table('conversation_member',
+    sa.Column('conversation_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('unread_count', sa.Integer(), server_default='0',
+              nullable=False),
+    sa.Column('last_activity_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id'],
+                            ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('conversation_id', 'user_id')
+    )
+    op.create_index('ix_conversation_member_user_id_last_activity_at',
+                    'conversation_member',
+                    ['user_id', 'last_activity_at', 'conversation_id'],
+                    unique=False)
+    op.create_table('message',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.Integer(), nullable=False),
+    sa.Column('text', sa.String(length=199), nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id'],
+                            ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['sender_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_message_conversation_id_timestamp', 'message',
+                    ['conversation_id', 'timestamp'], unique=False)
+    op.add_column('user', sa.Column('unread_messages', sa.Integer(),
+                                    server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('unread_messages')
+    op.drop_index('ix_message_conversation_id_timestamp',
+                  table_name='message')
+    op.drop_table('message')
+    op.drop_index('ix_conversation_member_user_id_last_activity_at',
+                  table_name='conversation_member')
+    op.drop_table('conversation_member')
+    op.drop_table('conversation')
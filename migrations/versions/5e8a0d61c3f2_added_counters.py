@@ -0,0 +1,58 @@
+"""added counters
+
+Revision ID: 5e8a0d61c3f2
+Revises: 9b1f3c2a7d54
+Create Date: 2026-10-18 11:03:47.218305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8a0d61c3f2'
+down_revision = '9b1f3c2a7d54'
+branch_labels = None
+depends_on = None
+
+USER_COUNTERS = {
+    'posts_count': 'SELECT count(*) FROM post '
+                   'WHERE post.user_id = "user".id',
+    'likes_count': 'SELECT count(*) FROM "like" '
+                   'WHERE "like".author = "user".id',
+    'comments_count': 'SELECT count(*) FROM comment '
+                      'WHERE comment.user_id = "user".id',
+    'followers_count': 'SELECT count(*) FROM followers '
+                       'WHERE followers.followed_id = "user".id',
+    'following_count': 'SELECT count(*) FROM followers '
+                       'WHERE followers.follower_id = "user".id',
+}
+POST_COUNTERS = {
+    'likes_count': 'SELECT count(*) FROM "like" '
+                   'WHERE "like".post_id = post.id',
+    'comments_count': 'SELECT count(*) FROM comment '
+                      'WHERE comment.post_id = post.id',
+}
+
+
+def upgrade():
+    for column in USER_COUNTERS:
+        op.add_column('user', sa.Column(column, sa.Integer(),
+                                        server_default='0', nullable=False))
+    for column in POST_COUNTERS:
+        op.add_column('post', sa.Column(column, sa.Integer(),
+                                        server_default='0', nullable=False))
+    # Заполняем счетчики по уже существующим данным.
+    op.execute('UPDATE "user" SET ' + ', '.join(
+        f'{column} = ({query})' for column, query in USER_COUNTERS.items()))
+    op.execute('UPDATE post SET ' + ', '.join(
+        f'{column} = ({query})' for column, query in POST_COUNTERS.items()))
+
+
+def downgrade():
+    with op.batch_alter_table('post') as batch_op:
+        for column in POST_COUNTERS:
+            batch_op.drop_column(column)
+    with op.batch_alter_table('user') as batch_op:
+        for column in USER_COUNTERS:
+            batch_op.drop_column(column)
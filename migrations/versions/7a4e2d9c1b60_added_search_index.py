@@ -0,0 +1,30 @@
+"""added search index
+
+Revision ID: 7a4e2d9c1b60
+Revises: 3f9a6c1d8e25
+Create Date: 2026-10-18 16:05:12.418203
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4e2d9c1b60'
+down_revision = '3f9a6c1d8e25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Полнотекстовый индекс utils/search.py есть только в SQLite.
+    # Существующие посты индексирует flask search-rebuild.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts "
+               "USING fts5(title, text, tokenize='unicode61')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE IF EXISTS post_fts')
@@ -0,0 +1,66 @@
+"""added indexes
+
+Revision ID: 9b1f3c2a7d54
+Revises: 4cbd7e6211d6
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1f3c2a7d54'
+down_revision = '4cbd7e6211d6'
+branch_labels = None
+depends_on = None
+
+
+def remove_duplicates():
+    """Удаляет повторные лайки и подписки перед уникальными индексами."""
+    op.execute(
+        'DELETE FROM "like" WHERE id NOT IN '
+        '(SELECT min(id) FROM "like" GROUP BY author, post_id)'
+    )
+    # У таблицы подписок нет первичного ключа, поэтому строки
+    # различаются по служебному идентификатору СУБД.
+    row_id = 'ctid' if op.get_bind().dialect.name == 'postgresql' \
+        else 'rowid'
+    op.execute(
+        f'DELETE FROM followers WHERE {row_id} NOT IN '
+        f'(SELECT min({row_id}) FROM followers '
+        f'GROUP BY follower_id, followed_id)'
+    )
+
+
+def upgrade():
+    remove_duplicates()
+    op.create_index('ix_user_last_seen', 'user', ['last_seen'],
+                    unique=False)
+    op.create_index('ix_followers_follower_followed', 'followers',
+                    ['follower_id', 'followed_id'], unique=True)
+    op.create_index('ix_followers_followed_follower', 'followers',
+                    ['followed_id', 'follower_id'], unique=False)
+    op.create_index('ix_post_created_at_id', 'post',
+                    ['created_at', 'id'], unique=False)
+    op.create_index('ix_post_user_id_created_at', 'post',
+                    ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_comment_post_id_timestamp', 'comment',
+                    ['post_id', 'timestamp'], unique=False)
+    op.create_index('ix_comment_user_id_timestamp', 'comment',
+                    ['user_id', 'timestamp'], unique=False)
+    op.create_index('ix_like_author_post_id', 'like',
+                    ['author', 'post_id'], unique=True)
+    op.create_index('ix_like_post_id', 'like', ['post_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_like_post_id', table_name='like')
+    op.drop_index('ix_like_author_post_id', table_name='like')
+    op.drop_index('ix_comment_user_id_timestamp', table_name='comment')
+    op.drop_index('ix_comment_post_id_timestamp', table_name='comment')
+    op.drop_index('ix_post_user_id_created_at', table_name='post')
+    op.drop_index('ix_post_created_at_id', table_name='post')
+    op.drop_index('ix_followers_followed_follower', table_name='followers')
+    op.drop_index('ix_followers_follower_followed', table_name='followers')
+    op.drop_index('ix_user_last_seen', table_name='user')
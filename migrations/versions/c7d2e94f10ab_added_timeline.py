@@ -0,0 +1,42 @@
+"""added timeline
+
+Revision ID: c7d2e94f10ab
+Revises: 5e8a0d61c3f2
+Create Date: 2026-10-18 12:20:05.633871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e94f10ab'
+down_revision = '5e8a0d61c3f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timeline_entry',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    op.create_index('ix_timeline_entry_user_id_created_at', 'timeline_entry',
+                    ['user_id', 'created_at', 'post_id'], unique=False)
+    op.create_index('ix_timeline_entry_post_id', 'timeline_entry',
+                    ['post_id'], unique=False)
+    op.add_column('user', sa.Column('timeline_built', sa.Boolean(),
+                                    server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('timeline_built')
+    op.drop_index('ix_timeline_entry_post_id', table_name='timeline_entry')
+    op.drop_index('ix_timeline_entry_user_id_created_at',
+                  table_name='timeline_entry')
+    op.drop_table('timeline_entry')
@@ -0,0 +1,47 @@
+"""added outbox
+
+Revision ID: e41b6a9f2c07
+Revises: c7d2e94f10ab
+Create Date: 2026-10-18 13:41:19.907214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41b6a9f2c07'
+down_revision = 'c7d2e94f10ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_message',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=199), nullable=False),
+    sa.Column('recipients', sa.Text(), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('dedup_key', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_message_status_next_attempt_at',
+                    'outbox_message', ['status', 'next_attempt_at'],
+                    unique=False)
+    op.create_index('ix_outbox_message_dedup_key_created_at',
+                    'outbox_message', ['dedup_key', 'created_at'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_message_dedup_key_created_at',
+                  table_name='outbox_message')
+    op.drop_index('ix_outbox_message_status_next_attempt_at',
+                  table_name='outbox_message')
+    op.drop_table('outbox_message')
@@ -1,64 +1,75 @@
-from flask import render_template, flash, redirect, url_for, request
+from flask import (
+    Blueprint, abort, render_template, flash, redirect, url_for, request
+)
 from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
 
-from app import app, db, User, Post, Message
+from app import db, User, Post, Comment, Like
 from forms import ProfileForm, ChangeDataForm, SendMessageForm
-from utils.utils import save_pic
+from utils.conditional import conditional_page, user_tags
+from utils.follows import following_page
+from utils.messages import get_direct, get_entry, history_page, \
+    inbox_page, mark_read, send
+from utils.pagination import paginate_request
+from utils.avatars import AvatarError, avatar_url, save_avatar
 
+bp = Blueprint('profile', __name__)
 
-@app.route('/profile_edit', methods=['GET', 'POST'])
+# Количество постов на странице пользователя.
+POSTS_PER_PAGE = 3
+# Количество лайков, комментариев и подписок на странице.
+ITEMS_PER_PAGE = 10
+# Количество сообщений на странице переписки.
+MESSAGES_PER_PAGE = 20
+
+
+@bp.route('/profile_edit', methods=['GET', 'POST'], endpoint='profile_edit')
 @login_required
 def edit_profile():
     """Редактирование профиля пользователя."""
     user = User.query.filter_by(username=current_user.username).first_or_404()
-    follow = user.followed.count()
     form = ProfileForm()
     if request.method == 'POST':
         if form.validate_on_submit():
-            if form.picture.data:
-                pic_file = save_pic(form.picture.data)
-                current_user.image_file = pic_file
             current_user.username = form.username.data
             current_user.email = form.email.data
             db.session.commit()
+            if form.picture.data:
+                try:
+                    save_avatar(current_user, form.picture.data)
+                except AvatarError as error:
+                    flash(f'Фото не изменено: {error}', 'danger')
             flash('Профиль успешно изменен.', 'success')
-            return redirect(url_for('user_profile', username=current_user.username))
+            return redirect(url_for('profile.user_profile',
+                                    username=current_user.username))
     else:
         form.username.data = current_user.username
         form.email.data = current_user.email
-    image_file = url_for(
-        'static',
-        filename='profile_pics/' + current_user.image_file
-    )
+    image_file = avatar_url(current_user.image_file, 400)
     is_edit = True
     return render_template(
         'profile/profile.html',
         image_file=image_file,
-        follow=follow,
         form=form,
         is_edit=is_edit,
         user=user,
     )
 
 
-@app.route('/profile/<string:username>')
+@bp.route('/profile/<string:username>', endpoint='user_profile')
+@conditional_page(user_tags)
 def get_user_profile(username: str):
     """Отображение страницы профиля пользователя."""
     user = User.query.filter_by(username=username).first_or_404()
-    follow = user.followed.count()
-    image_file = url_for(
-        'static',
-        filename='profile_pics/' + user.image_file
-    )
+    image_file = avatar_url(user.image_file, 400)
     return render_template(
         'profile/profile.html',
         image_file=image_file,
         user=user,
-        follow=follow,
     )
 
 
-@app.route('/profile/change_data', methods=['GET', 'POST'])
+@bp.route('/profile/change_data', methods=['GET', 'POST'])
 @login_required
 def change_data():
     """Редактирование профиля пользователя."""
@@ -72,7 +83,7 @@ def change_data():
         db.session.commit()
         flash('Профиль успешно изменен.', 'success')
         return redirect(
-            url_for('user_profile', username=current_user.username))
+            url_for('profile.user_profile', username=current_user.username))
     elif request.method == 'GET':
         form.age.data = current_user.age
         form.country.data = current_user.country
@@ -85,79 +96,133 @@ def change_data():
         )
 
 
-@app.route('/user/<string:username>')
+@bp.route('/user/<string:username>', endpoint='user_posts')
+@conditional_page(user_tags)
 def get_user_posts(username: str):
     """Отображение всех постов пользователя."""
-    page = request.args.get('page', 1, type=int)
     user = User.query.filter_by(username=username).first_or_404()
-    posts = Post.query.filter_by(author=user).order_by(
-        Post.created_at.desc()).paginate(page=page, per_page=3)
+    posts = paginate_request(
+        Post.query.filter_by(user_id=user.id), Post, POSTS_PER_PAGE)
     return render_template(
         'profile/user_posts.html',
         user=user,
         posts=posts)
 
 
-@app.route('/profile/<string:username>/followers')
+@bp.route('/profile/<string:username>/followers', endpoint='user_followers')
 def get_user_followers(username: str):
-    """Отображение всех подписчиков пользователя."""
+    """Отображение всех подписок пользователя."""
     user = User.query.filter_by(username=username).first_or_404()
+    people = following_page(
+        user, request.args.get('cursor', type=int), ITEMS_PER_PAGE)
     return render_template(
         'profile/user_followers.html',
         user=user,
+        people=people,
     )
 
 
-@app.route('/profile/<string:username>/comments')
+@bp.route('/profile/<string:username>/comments', endpoint='user_comments')
 def et_user_comments(username: str):
     """Отображение всех комментариев пользователя."""
     user = User.query.filter_by(username=username).first_or_404()
-    follow = user.followed
+    # Заголовок поста подгружается в том же запросе, что и комментарий.
+    comments = paginate_request(
+        Comment.query.options(
+            joinedload(Comment.posts).load_only(Post.id, Post.title)
+        ).filter_by(user_id=user.id),
+        Comment,
+        ITEMS_PER_PAGE,
+    )
     return render_template(
         'profile/user_comments.html',
         user=user,
-        follow=follow
+        comments=comments,
     )
 
 
-@app.route('/profile/<string:username>/likes')
+@bp.route('/profile/<string:username>/likes', endpoint='user_likes')
 def get_user_likes(username: str):
     """Отображение всех лайков пользователя."""
     user = User.query.filter_by(username=username).first_or_404()
+    # На странице выводятся сами посты, поэтому выбираются посты,
+    # отмеченные пользователем, вместе с их авторами.
+    posts = paginate_request(
+        Post.query.options(joinedload(Post.author)).join(
+            Like, Like.post_id == Post.id
+        ).filter(Like.author == user.id),
+        Post,
+        ITEMS_PER_PAGE,
+    )
     return render_template(
         'profile/user_likes.html',
         user=user,
+        posts=posts,
     )
 
 
-@app.route('/profile/<string:username>/send_message')
+@bp.route('/profile/<string:username>/send_message',
+           methods=['GET', 'POST'], endpoint='send_message')
 @login_required
-def send_message(username:str):
-    """Отправление сообщения выбранному пользователю."""
+def send_message(username: str):
+    """Первое сообщение выбранному пользователю. Если переписка уже
+    есть, открывается она.
+    """
+    user = User.query.filter_by(username=username).first_or_404()
+    if user.id == current_user.id:
+        flash('Нельзя написать сообщение самому себе.', 'warning')
+        return redirect(url_for('profile.user_profile', username=username))
+    conversation = get_direct(current_user, user)
+    if conversation is not None:
+        return redirect(url_for('profile.conversation',
+                                conversation_id=conversation.id))
     form = SendMessageForm()
     if form.validate_on_submit():
-        message = Message(
-            body=form.body.data,
-            sender=current_user.username,
-            getter=username,
-        )
-        db.session.add(message)
+        conversation = get_direct(current_user, user, create=True)
+        send(current_user, conversation, form.body.data)
         db.session.commit()
         flash('Ваше сообщение отправлено', 'success')
-        return redirect(url_for(f'/profile/{username}'))
-    return render_template('profile/send_message.html', form=form)
+        return redirect(url_for('profile.conversation',
+                                conversation_id=conversation.id))
+    return render_template('profile/send_message.html', form=form, user=user)
 
 
-@app.route('/profile/all_messages')
+@bp.route('/profile/all_messages', endpoint='all_messages')
 @login_required
 def all_messages():
-    """Отображение всех сообщений пользователя."""
-    user = current_user
-    messages_sent = Message.query.filter_by(getter=user).all()
-    messages_got = Message.query.filter_by(sender=user).all()
+    """Переписки пользователя по последней активности."""
+    conversations = inbox_page(current_user, request.args.get('cursor'),
+                               ITEMS_PER_PAGE)
     return render_template(
         'profile/all_messages.html',
-        user=user,
-        messages_sent=messages_sent,
-        messages_got=messages_got,
+        conversations=conversations,
+    )
+
+
+@bp.route('/profile/messages/<int:conversation_id>',
+           methods=['GET', 'POST'], endpoint='conversation')
+@login_required
+def conversation(conversation_id: int):
+    """Переписка: история сообщений и ответ. Открытие переписки
+    отмечает ее сообщения прочитанными.
+    """
+    entry = get_entry(current_user, conversation_id)
+    if entry is None:
+        abort(404)
+    form = SendMessageForm()
+    if form.validate_on_submit():
+        send(current_user, entry.conversation, form.body.data)
+        db.session.commit()
+        return redirect(url_for('profile.conversation',
+                                conversation_id=conversation_id))
+    messages = history_page(conversation_id, request.args.get('cursor'),
+                            MESSAGES_PER_PAGE)
+    if entry.member.unread_count:
+        mark_read(current_user, entry.member)
+        db.session.commit()
+    return render_template(
+        'profile/conversation.html',
+        entry=entry,
+        messages=messages,
+        form=form,
     )
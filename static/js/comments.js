@@ -0,0 +1,72 @@
+// Комментарии поста: подгрузка следующих страниц при прокрутке и
+// отправка формы без перезагрузки. Сервер отдает готовую разметку
+// (post_comments в blog/views.py).
+(function () {
+  // Вставляет комментарии из разметки, пропуская уже показанные:
+  // свой комментарий приходит и в ответе, и событием из events.js.
+  function insert(list, html, atTop) {
+    var template = document.createElement('template');
+    template.innerHTML = html;
+    var nodes = Array.prototype.filter.call(template.content.children, function (node) {
+      return !document.getElementById(node.id);
+    });
+    if (atTop) nodes.reverse();
+    nodes.forEach(function (node) {
+      if (atTop) list.insertBefore(node, list.firstChild);
+      else list.appendChild(node);
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    var list = document.getElementById('comments');
+    if (!list || !window.fetch) return;
+    var url = list.dataset.commentsUrl;
+    var more = document.getElementById('more-comments');
+    var loading = false;
+
+    function loadMore(event) {
+      if (event) event.preventDefault();
+      if (loading || !more) return;
+      loading = true;
+      fetch(url + '?cursor=' + encodeURIComponent(more.dataset.cursor))
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          insert(list, data.html, false);
+          if (data.next_cursor) {
+            more.dataset.cursor = data.next_cursor;
+          } else {
+            more.remove();
+            more = null;
+          }
+        })
+        .finally(function () { loading = false; });
+    }
+
+    if (more) {
+      more.addEventListener('click', loadMore);
+      if (window.IntersectionObserver) {
+        new IntersectionObserver(function (entries) {
+          if (entries[0].isIntersecting) loadMore();
+        }).observe(more);
+      }
+    }
+
+    var form = document.getElementById('comment-form');
+    if (!form) return;
+    form.addEventListener('submit', function (event) {
+      event.preventDefault();
+      fetch(url, {method: 'POST', body: new FormData(form), credentials: 'same-origin'})
+        .then(function (response) {
+          if (response.status !== 201) {
+            // Ошибки формы показывает обычная отправка.
+            form.submit();
+            return;
+          }
+          return response.json().then(function (data) {
+            insert(list, data.html, true);
+            form.reset();
+          });
+        });
+    });
+  });
+})();
@@ -0,0 +1,55 @@
+// Подписка на события сервера (utils/events.py). Элемент с атрибутом
+// data-events-url открывает поток, обработчики выбираются по типу события.
+(function () {
+  function element(tag, className, text) {
+    var node = document.createElement(tag);
+    if (className) node.className = className;
+    if (text) node.textContent = text;
+    return node;
+  }
+
+  var handlers = {
+    comment: function (root, data) {
+      var list = document.getElementById('comments');
+      if (!list || document.getElementById('comment-' + data.id)) return;
+      var article = element('article', 'media content-section');
+      article.id = 'comment-' + data.id;
+      article.appendChild(element('h4', 'blog-post-title', data.author));
+      article.appendChild(element('p', 'blog-post-meta', data.timestamp));
+      article.appendChild(element('p', 'm-b-5 m-t-10', data.body));
+      list.insertBefore(article, list.firstChild);
+    },
+    like: function (root, data) {
+      var counter = document.getElementById('likes-count');
+      if (counter) counter.textContent = parseInt(counter.textContent, 10) + data.delta;
+    },
+    message: function (root, data) {
+      var list = document.getElementById('messages');
+      if (list && String(data.conversation_id) === root.dataset.conversationId) {
+        var article = element('article', 'media content-section');
+        article.appendChild(element('p', 'blog-post-meta', data.sender + ', ' + data.timestamp));
+        article.appendChild(element('p', '', data.text));
+        list.insertBefore(article, list.firstChild);
+        return;
+      }
+      var notice = document.getElementById('events-notice');
+      if (notice) notice.hidden = false;
+    }
+  };
+
+  document.addEventListener('DOMContentLoaded', function () {
+    var root = document.querySelector('[data-events-url]');
+    if (!root || !window.EventSource) return;
+    var source = new EventSource(root.dataset.eventsUrl);
+    Object.keys(handlers).forEach(function (type) {
+      source.addEventListener(type, function (event) {
+        handlers[type](root, JSON.parse(event.data));
+      });
+    });
+    // Буфер на сервере переполнился: часть событий потеряна.
+    source.addEventListener('reset', function () {
+      source.close();
+      window.location.reload();
+    });
+  });
+})();
@@ -0,0 +1,30 @@
+import pytest
+
+from app import create_app, db
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    """Приложение с пустой базой в памяти. Запросы тестового клиента
+    выполняются вне контекста, каждый в своем, как в gunicorn.
+    """
+    app = create_app(TestingConfig)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
@@ -0,0 +1,25 @@
+"""Версии тегов в 'lru' ограничены по числу и после вытеснения не
+возвращаются к уже использованным значениям.
+"""
+from utils.cache import LRUCache
+
+
+def test_tag_versions_are_bounded():
+    cache = LRUCache(max_bytes=1024, max_versions=10)
+    for number in range(1000):
+        cache.incr(f'tag:post:{number}')
+    assert len(cache._versions) == 10
+
+
+def test_evicted_tag_does_not_reuse_old_version():
+    cache = LRUCache(max_bytes=1024, max_versions=2)
+    used = set(cache.get_versions(['tag:a']))
+    used.add(cache.incr('tag:a'))
+    last = cache.incr('tag:a')
+    # Тег a вытесняется другими тегами.
+    cache.incr('tag:b')
+    cache.incr('tag:c')
+    assert 'tag:a' not in cache._versions
+    assert cache.get_versions(['tag:a'])[0] >= last
+    assert cache.get_versions(['tag:a'])[0] not in used
+    assert cache.incr('tag:a') > last
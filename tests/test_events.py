@@ -0,0 +1,43 @@
+"""Без EVENTS_ENABLED страницы не подписываются на события, а потоков
+/events/ нет: в обычном воркере gunicorn поток занял бы его целиком.
+"""
+import pytest
+
+from app import create_app, db, User, Post
+from config import TestingConfig
+
+
+def seed(app):
+    with app.app_context():
+        db.session.add(User(id=1, username='author',
+                            email='author@example.com', password='x'))
+        db.session.add(Post(id=1, title='Пост', text='Текст', user_id=1))
+        db.session.commit()
+
+
+def test_events_disabled_by_default(app, client):
+    seed(app)
+    page = client.get('/post/1').get_data(as_text=True)
+    assert 'data-events-url' not in page and 'events.js' not in page
+    assert client.get('/events/post/1').status_code == 404
+
+
+@pytest.fixture
+def events_app():
+    config = type('EventsConfig', (TestingConfig,), {'EVENTS_ENABLED': True})
+    app = create_app(config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_events_enabled(events_app):
+    seed(events_app)
+    client = events_app.test_client()
+    page = client.get('/post/1').get_data(as_text=True)
+    assert 'data-events-url="/events/post/1"' in page
+    assert 'events.js' in page
@@ -0,0 +1,49 @@
+"""Число запросов главной страницы не зависит от количества постов и
+пользователей и от размера страницы ленты.
+"""
+import pytest
+
+from app import db, User, Post
+from utils.queries import count_queries
+
+SIZES = (5, 50, 200)
+
+
+def seed(app, size):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(username=f'user{i}', email=f'user{i}@example.com',
+                      password='x') for i in range(size)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all(
+            Post(title=f'Пост {i}', text='Текст поста',
+                 user_id=users[i % size].id)
+            for i in range(size))
+        db.session.commit()
+
+
+def index_queries(app, client):
+    with count_queries(app) as counter:
+        response = client.get('/')
+    assert response.status_code == 200
+    return counter.count
+
+
+def test_index_queries_do_not_grow_with_data(app, client):
+    counts = {}
+    for size in SIZES:
+        seed(app, size)
+        counts[size] = index_queries(app, client)
+    assert len(set(counts.values())) == 1, counts
+
+
+@pytest.mark.parametrize('per_page', (3, 30))
+def test_index_queries_do_not_grow_with_page_size(app, client, monkeypatch,
+                                                  per_page):
+    seed(app, SIZES[-1])
+    monkeypatch.setattr('blog.views.POSTS_PER_PAGE', 3)
+    expected = index_queries(app, client)
+    monkeypatch.setattr('blog.views.POSTS_PER_PAGE', per_page)
+    assert index_queries(app, client) == expected
@@ -0,0 +1,26 @@
+"""Визит отмечается не чаще раза в LAST_SEEN_GRANULARITY, даже если
+объект пользователя из кеша не знает о прошлых визитах.
+"""
+from datetime import datetime, timedelta
+
+from app import User
+from utils.last_seen import LastSeenBuffer
+
+
+def test_stale_user_is_throttled(app):
+    buffer = LastSeenBuffer(app)
+    yesterday = datetime(2026, 10, 17, 12, 0)
+    # Объект из кеша: last_seen не меняется между запросами.
+    user = User(id=1, username='user', email='user@example.com',
+                password='x', last_seen=yesterday)
+    now = datetime(2026, 10, 18, 12, 0)
+    buffer.touch(user, now)
+    assert buffer._pending == {1: now} and buffer._new_day == {1}
+    buffer._pending.clear()
+    buffer._new_day.clear()
+    buffer.touch(user, now + timedelta(seconds=10))
+    assert not buffer._pending and not buffer._new_day
+    later = now + buffer.granularity
+    buffer.touch(user, later)
+    # День не сменился относительно последнего визита.
+    assert buffer._pending == {1: later} and not buffer._new_day
@@ -0,0 +1,46 @@
+"""Лимиты входа: регистр адреса не обходит лимит аккаунта, а за
+прокси лимит по IP считается для адреса клиента, а не прокси.
+"""
+import pytest
+
+from app import create_app, db
+from config import TestingConfig
+
+
+@pytest.fixture
+def proxied_app():
+    config = type('ProxiedConfig', (TestingConfig,), {
+        'PROXY_FIX_X_FOR': 1,
+        'LOGIN_LIMIT_PER_ACCOUNT': (3, 300),
+        'LOGIN_LIMIT_PER_IP': (3, 60),
+    })
+    app = create_app(config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def attempt(client, email, client_ip):
+    return client.post('/login', data={'email': email, 'password': 'x'},
+                       headers={'X-Forwarded-For': client_ip}).status_code
+
+
+def test_account_limit_ignores_case(proxied_app):
+    client = proxied_app.test_client()
+    for number, email in enumerate(('Case@example.com', 'CASE@example.com',
+                                    'case@EXAMPLE.com')):
+        assert attempt(client, email, f'10.0.1.{number}') == 200
+    assert attempt(client, 'case@example.com', '10.0.1.9') == 429
+
+
+def test_ip_limit_per_client(proxied_app):
+    client = proxied_app.test_client()
+    for number in range(3):
+        attempt(client, f'ip{number}@example.com', '10.0.2.1')
+    assert attempt(client, 'ip9@example.com', '10.0.2.1') == 429
+    # Другой клиент за тем же прокси входит как обычно.
+    assert attempt(client, 'ip9@example.com', '10.0.2.2') == 200
@@ -0,0 +1,53 @@
+"""Письмо, которое не ушло, получает одну попытку на пачку, даже если
+потом оборвалось соединение с SMTP-сервером.
+"""
+import smtplib
+
+from app import mail, OutboxMessage
+from utils.mail_queue import enqueue_mail, send_pending
+
+
+class DroppingConnection:
+    """SMTP-соединение, которое отклоняет письма адресатам из refused и
+    обрывается при закрытии.
+    """
+
+    def __init__(self, refused):
+        self.refused = refused
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        raise smtplib.SMTPServerDisconnected('соединение оборвалось')
+
+    def send(self, message):
+        if message.recipients[0] in self.refused:
+            raise smtplib.SMTPRecipientsRefused({})
+
+
+def test_refused_message_is_not_retried_twice(app, monkeypatch):
+    monkeypatch.setattr(
+        mail, 'connect', lambda: DroppingConnection({'b@example.com'}))
+    with app.app_context():
+        for address in ('a@example.com', 'b@example.com', 'c@example.com'):
+            enqueue_mail('Тема', [address], 'Текст')
+        assert send_pending() == 2
+        messages = {message.recipients: message
+                    for message in OutboxMessage.query}
+        assert messages['a@example.com'].status == 'sent'
+        assert messages['c@example.com'].status == 'sent'
+        assert messages['b@example.com'].status == 'pending'
+        assert messages['b@example.com'].attempts == 1
+
+
+def test_unsent_messages_wait_when_smtp_is_down(app, monkeypatch):
+    def connect():
+        raise smtplib.SMTPConnectError(421, 'недоступен')
+
+    monkeypatch.setattr(mail, 'connect', connect)
+    with app.app_context():
+        enqueue_mail('Тема', ['a@example.com'], 'Текст')
+        assert send_pending() == 0
+        message = OutboxMessage.query.one()
+        assert message.status == 'pending' and message.attempts == 1
@@ -0,0 +1,36 @@
+"""Счетчики /metrics: сумма по всем воркерам из METRICS_DIR и
+отсутствие утечек при ошибке SQL-запроса.
+"""
+import pytest
+from sqlalchemy import text
+
+from app import db
+from utils.metrics import MetricsRegistry, RequestMetrics
+
+
+def worker_registry(app, directory, requests):
+    registry = MetricsRegistry(app, directory)
+    for _ in range(requests):
+        registry.record('blog.index', RequestMetrics(), 0.01, False)
+    return registry
+
+
+def test_workers_are_summed(app, tmp_path, monkeypatch):
+    with app.app_context():
+        first = worker_registry(app, str(tmp_path), 2)
+        first.save()
+        # Второй воркер - другой процесс со своим файлом.
+        monkeypatch.setattr('os.getpid', lambda: 1)
+        second = worker_registry(app, str(tmp_path), 3)
+        second.save()
+        monkeypatch.undo()
+        rendered = first.combined().render()
+    assert 'yatube_requests_total{endpoint="blog.index"} 5' in rendered
+
+
+def test_failed_query_does_not_leak(app):
+    with app.app_context():
+        connection = db.session.connection()
+        with pytest.raises(Exception):
+            connection.execute(text('SELECT * FROM missing_table'))
+        assert not connection.connection.info.get('query_started')
@@ -0,0 +1,112 @@
+"""Страницы профиля и поста выполняют одинаковое число запросов при
+любом количестве постов, лайков, комментариев и подписок: число
+запросов на маленьких данных - предел для больших. Новый комментарий
+отдается одним фрагментом разметки.
+"""
+import pytest
+
+from app import db, User, Post, Comment, Like
+from tests.conftest import login
+from utils.follows import follow
+from utils.queries import assert_max_queries, count_queries
+
+SMALL, LARGE = 5, 100
+PROFILE_PAGES = ('/profile/reader', '/user/reader', '/profile/reader/likes',
+                 '/profile/reader/comments', '/profile/reader/followers')
+POST_PAGES = ('/post/1', '/post/1/comments')
+
+
+def seed_profile(app, size):
+    """Пользователь reader подписан на size авторов, лайкнул и
+    прокомментировал по посту каждого из них.
+    """
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        reader = User(username='reader', email='reader@example.com',
+                      password='x')
+        authors = [User(username=f'user{i}', email=f'user{i}@example.com',
+                        password='x') for i in range(size)]
+        db.session.add(reader)
+        db.session.add_all(authors)
+        db.session.flush()
+        posts = [Post(title=f'Пост {i}', text='Текст', user_id=author.id)
+                 for i, author in enumerate(authors)]
+        posts.append(Post(title='Свой пост', text='Текст',
+                          user_id=reader.id))
+        db.session.add_all(posts)
+        db.session.flush()
+        for author, post in zip(authors, posts):
+            follow(reader, author)
+            db.session.add(Like(author=reader.id, post_id=post.id))
+            db.session.add(Comment(body='Комментарий', post_id=post.id,
+                                   user_id=reader.id))
+        db.session.commit()
+
+
+def seed_post(app, size):
+    """Пост с size комментариями от size разных авторов."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all(
+            User(id=i, username=f'user{i}', email=f'user{i}@example.com',
+                 password='x') for i in range(1, size + 1))
+        db.session.flush()
+        db.session.add(Post(id=1, title='Пост', text='Текст', user_id=1))
+        db.session.add_all(
+            Comment(body=f'Комментарий {i}', post_id=1, user_id=i)
+            for i in range(1, size + 1))
+        db.session.commit()
+
+
+def page_queries(app, client, url):
+    with count_queries(app) as counter:
+        response = client.get(url)
+    assert response.status_code == 200, url
+    return counter.count
+
+
+@pytest.mark.parametrize('url', PROFILE_PAGES)
+def test_profile_page_queries(app, client, url):
+    seed_profile(app, SMALL)
+    limit = page_queries(app, client, url)
+    seed_profile(app, LARGE)
+    with assert_max_queries(limit, app):
+        assert client.get(url).status_code == 200
+
+
+@pytest.mark.parametrize('url', POST_PAGES)
+def test_post_page_queries(app, client, url):
+    seed_post(app, SMALL)
+    login(client, 1)
+    limit = page_queries(app, client, url)
+    seed_post(app, LARGE)
+    login(client, 1)
+    with assert_max_queries(limit, app):
+        assert client.get(url).status_code == 200
+
+
+def more_comments_url(client):
+    cursor = client.get('/post/1/comments').get_json()['next_cursor']
+    return f'/post/1/comments?cursor={cursor}'
+
+
+def test_more_comments_queries(app, client):
+    seed_post(app, 50)
+    login(client, 1)
+    limit = page_queries(app, client, more_comments_url(client))
+    seed_post(app, LARGE)
+    login(client, 1)
+    url = more_comments_url(client)
+    with assert_max_queries(limit, app):
+        assert client.get(url).status_code == 200
+
+
+def test_new_comment_is_one_fragment(app, client):
+    seed_post(app, SMALL)
+    login(client, 1)
+    response = client.post('/post/1/comments', data={'body': 'Новый'})
+    assert response.status_code == 201
+    html = response.get_json()['html']
+    assert html.count('<article') == 1 and 'Новый' in html
@@ -0,0 +1,37 @@
+"""Параметр next ведет только на страницы этого сайта."""
+import pytest
+
+from app import db, User, Post
+from tests.conftest import login
+
+UNSAFE = ('//evil.com', '/\\evil.com', '\\\\evil.com', '/\t/evil.com',
+          'https://evil.com', 'javascript:alert(1)', 'evil.com')
+
+
+@pytest.fixture
+def post_id(app):
+    with app.app_context():
+        user = User(username='reader', email='reader@example.com',
+                    password='x')
+        db.session.add(user)
+        db.session.flush()
+        post = Post(title='Пост', text='Текст', user_id=user.id)
+        db.session.add(post)
+        db.session.commit()
+        return post.id
+
+
+@pytest.mark.parametrize('target', UNSAFE)
+def test_like_rejects_foreign_next(client, post_id, target):
+    login(client, 1)
+    response = client.get(f'/like_post/{post_id}',
+                          query_string={'next': target})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(f'/post/{post_id}')
+
+
+def test_like_keeps_local_next(client, post_id):
+    login(client, 1)
+    response = client.get(f'/like_post/{post_id}',
+                          query_string={'next': '/user/reader?page=2'})
+    assert response.headers['Location'].endswith('/user/reader?page=2')
@@ -0,0 +1,48 @@
+"""Поиск находит пост по множественному числу и родительному падежу
+слов из него и не создает таблиц в GET-запросе.
+"""
+import pytest
+from sqlalchemy import text
+
+import utils.search
+from app import db, User, Post
+from utils.queries import count_queries
+from utils.search import search_posts
+
+QUERIES = ('городов', 'постов', 'блогов', 'новых', 'город', 'пост')
+
+
+@pytest.fixture(params=['snowball', 'fallback'])
+def stemmer(request, monkeypatch):
+    if request.param == 'snowball':
+        pytest.importorskip('snowballstemmer')
+    else:
+        monkeypatch.setattr(utils.search, '_russian_stemmer', None)
+
+
+def seed(app):
+    with app.app_context():
+        db.session.add(User(id=1, username='author',
+                            email='author@example.com', password='x'))
+        db.session.add(Post(id=1, title='Новый блог',
+                            text='Пост про город', user_id=1))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('q', QUERIES)
+def test_word_forms(app, stemmer, q):
+    seed(app)
+    with app.app_context():
+        assert [post.id for post in search_posts(q).items] == [1]
+
+
+def test_search_without_index_table(app, client):
+    with app.app_context():
+        db.session.execute(text('DROP TABLE post_fts'))
+        db.session.commit()
+    seed(app)
+    with count_queries(app) as counter:
+        response = client.get('/search?q=город')
+    assert response.status_code == 200
+    assert 'Новый блог' in response.get_data(as_text=True)
+    assert not any('CREATE' in statement for statement in counter.statements)
@@ -0,0 +1,71 @@
+"""Лента подписок не пишет в базу при чтении, а лишние записи
+удаляются при раскладке нового поста.
+"""
+from app import db, User, Post, TimelineEntry
+from tests.conftest import login
+from utils.follows import follow
+from utils.queries import count_queries
+from utils.timeline import trim_timelines
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def seed(app):
+    with app.app_context():
+        reader = User(username='reader', email='reader@example.com',
+                      password='x')
+        author = User(username='author', email='author@example.com',
+                      password='x')
+        db.session.add_all([reader, author])
+        db.session.flush()
+        follow(reader, author)
+        db.session.commit()
+        return reader.id, author.id
+
+
+def add_posts(app, author_id, count):
+    with app.app_context():
+        db.session.add_all(Post(title=f'Пост {i}', text='Текст',
+                                user_id=author_id) for i in range(count))
+        db.session.commit()
+
+
+def test_feed_read_does_not_write(app, client):
+    reader_id, author_id = seed(app)
+    login(client, reader_id)
+    # Первое чтение строит ленту.
+    client.get('/feed')
+    add_posts(app, author_id, 10)
+    with count_queries(app) as counter:
+        assert client.get('/feed').status_code == 200
+    assert not [statement for statement in counter.statements
+                if statement.lstrip().upper().startswith(WRITES)]
+    with app.app_context():
+        assert TimelineEntry.query.filter_by(user_id=reader_id).count() == 10
+
+
+def test_new_posts_keep_timeline_bounded(app, client):
+    app.config['TIMELINE_MAX_ENTRIES'] = 5
+    reader_id, author_id = seed(app)
+    login(client, reader_id)
+    client.get('/feed')
+    add_posts(app, author_id, 10)
+    with app.app_context():
+        titles = {title for title, in db.session.query(Post.title).join(
+            TimelineEntry, TimelineEntry.post_id == Post.id
+        ).filter(TimelineEntry.user_id == reader_id)}
+    assert titles == {f'Пост {i}' for i in range(5, 10)}
+
+
+def test_trim_timelines(app, client):
+    reader_id, author_id = seed(app)
+    login(client, reader_id)
+    client.get('/feed')
+    add_posts(app, author_id, 10)
+    # Команда нужна, когда настройку уменьшили.
+    app.config['TIMELINE_MAX_ENTRIES'] = 5
+    with app.app_context():
+        assert trim_timelines() == 1
+        assert TimelineEntry.query.filter_by(user_id=reader_id).count() == 5
+    runner = app.test_cli_runner()
+    assert 'Обрезано лент: 0' in runner.invoke(args=['timeline-trim']).output
@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Исходники, которые собирает assets-build. Загруженные аватары сюда не
+# входят: их имена и так содержат хеш содержимого (utils/avatars.py).
+SOURCE_DIRS = ('css', 'js', 'img')
+SOURCE_FILES = ('profile_pics/default.jpg',)
+# Форматы, которые имеет смысл сжимать заранее.
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.map')
+# Варианты сжатия в порядке предпочтения: Content-Encoding и суффикс файла.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Варианты аватаров из конвейера: digest.jpg и digest_size.jpg/webp.
+AVATAR_RE = re.compile(r'^profile_pics/[0-9a-f]{32}(_\d+)?\.(jpg|webp)$')
+
+_manifests = {}
+
+
+def build_dir():
+    return os.path.join(current_app.static_folder,
+                        current_app.config['ASSETS_BUILD_DIR'])
+
+
+def manifest_path():
+    return os.path.join(build_dir(), 'manifest.json')
+
+
+def get_manifest():
+    """Исходное имя -> имя с хешем. Читается один раз на процесс,
+    без сборки пустой: тогда ссылки ведут на исходные файлы.
+    """
+    path = manifest_path()
+    if path not in _manifests:
+        try:
+            with open(path, encoding='utf-8') as file:
+                _manifests[path] = json.load(file)
+        except FileNotFoundError:
+            _manifests[path] = {}
+    return _manifests[path]
+
+
+def source_files():
+    static = current_app.static_folder
+    for directory in SOURCE_DIRS:
+        for parent, _, names in os.walk(os.path.join(static, directory)):
+            for name in sorted(names):
+                path = os.path.join(parent, name)
+                yield os.path.relpath(path, static).replace(os.sep, '/')
+    for name in SOURCE_FILES:
+        if os.path.isfile(os.path.join(static, name)):
+            yield name
+
+
+def write_file(path, data):
+    """Запись через временный файл: воркер не отдаст половину файла."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def compressed_variants(data):
+    """Сжатые варианты, которые меньше исходника."""
+    variants = {'.gz': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {suffix: compressed for suffix, compressed in variants.items()
+            if len(compressed) < len(data)}
+
+
+def build_assets():
+    """Пишет копии статики с хешем содержимого в имени, их сжатые
+    варианты и манифест. Старые копии не удаляются: страницы, открытые
+    до выкладки, продолжают получать свои файлы.
+    """
+    manifest = {}
+    written = 0
+    static = current_app.static_folder
+    build = current_app.config['ASSETS_BUILD_DIR']
+    for name in source_files():
+        with open(os.path.join(static, name), 'rb') as file:
+            data = file.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, extension = os.path.splitext(name)
+        hashed = f'{build}/{stem}.{digest}{extension}'
+        manifest[name] = hashed
+        target = os.path.join(static, hashed)
+        if os.path.exists(target):
+            continue
+        write_file(target, data)
+        if extension in COMPRESSIBLE:
+            for suffix, compressed in compressed_variants(data).items():
+                write_file(target + suffix, compressed)
+        written += 1
+    write_file(manifest_path(), json.dumps(
+        manifest, indent=2, sort_keys=True).encode('utf-8'))
+    _manifests.pop(manifest_path(), None)
+    return manifest, written
+
+
+def fingerprint_static(endpoint, values):
+    """url_for('static', filename=...) ссылается на копию с хешем."""
+    if endpoint != 'static' or not current_app.config['ASSETS_USE_MANIFEST']:
+        return
+    hashed = get_manifest().get(values.get('filename'))
+    if hashed is not None:
+        values['filename'] = hashed
+
+
+def is_immutable(filename):
+    """Файл под этим именем никогда не изменится."""
+    build = current_app.config['ASSETS_BUILD_DIR']
+    return filename.startswith(build + '/') or \
+        AVATAR_RE.match(filename) is not None
+
+
+def serve_static(filename):
+    """Отдача статики вместо стандартной. Файлы с хешем в имени
+    кешируются браузером навсегда и не перепроверяются, из сжатых
+    вариантов выбирается тот, что понимает браузер. Сами байты
+    отправляет send_file: через sendfile у gunicorn или X-Sendfile
+    при USE_X_SENDFILE.
+    """
+    if not is_immutable(filename):
+        return current_app.send_static_file(filename)
+    static = current_app.static_folder
+    path, encoding, vary = filename, None, False
+    for name, suffix in ENCODINGS:
+        variant = safe_join(static, filename + suffix)
+        if variant is None or not os.path.isfile(variant):
+            continue
+        vary = True
+        if encoding is None and request.accept_encodings[name]:
+            path, encoding = filename + suffix, name
+    response = send_from_directory(
+        static, path, max_age=current_app.config['ASSETS_MAX_AGE'],
+        mimetype=mimetypes.guess_type(filename)[0]
+        or 'application/octet-stream')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if encoding is not None:
+        response.content_encoding = encoding
+    if vary:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+@click.command('assets-build')
+@with_appcontext
+def assets_build_command():
+    """Собирает статику с хешами в именах и сжатыми вариантами."""
+    manifest, written = build_assets()
+    click.echo(f'Файлов в манифесте: {len(manifest)}, новых копий: {written}.')
+    if brotli is None:
+        click.echo('Пакет brotli не установлен, собраны только варианты gzip.')
+
+
+def init_app(app):
+    app.url_defaults(fingerprint_static)
+    app.view_functions['static'] = serve_static
+    app.cli.add_command(assets_build_command)
@@ -0,0 +1,172 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, request, url_for
+from PIL import Image, ImageOps
+
+from app import db, User
+
+DEFAULT_AVATAR = 'default.jpg'
+# Имя аватара из конвейера: sha256 содержимого, обрезанный до 32 символов.
+# Старые аватары (token_hex(10) + расширение) под шаблон не подходят.
+PROCESSED_RE = re.compile(r'^(?P<digest>[0-9a-f]{32})\.jpg$')
+
+
+class AvatarError(ValueError):
+    """Загруженный файл нельзя использовать как аватар."""
+
+
+def avatar_dir():
+    return os.path.join(current_app.static_folder, 'profile_pics')
+
+
+def variant_name(digest, size, extension):
+    return f'{digest}_{size}.{extension}'
+
+
+def process_avatar(data, directory, digest, sizes, max_pixels):
+    """Декодирует изображение и сохраняет квадратные варианты всех
+    размеров в JPEG и WebP. Выполняется в отдельном процессе.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    image = Image.open(io.BytesIO(data))
+    # Поворот по EXIF до того, как метаданные будут отброшены.
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    for size in sizes:
+        variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        # Новый файл сохраняется без exif/icc: метаданные не переносятся.
+        variant.save(os.path.join(directory,
+                                  variant_name(digest, size, 'jpg')),
+                     'JPEG', quality=85, optimize=True, progressive=True)
+        variant.save(os.path.join(directory,
+                                  variant_name(digest, size, 'webp')),
+                     'WEBP', quality=80, method=4)
+    # Самый большой вариант под основным именем, для старых ссылок.
+    largest = variant_name(digest, max(sizes), 'jpg')
+    with open(os.path.join(directory, largest), 'rb') as source, \
+            open(os.path.join(directory, f'{digest}.jpg'), 'wb') as target:
+        target.write(source.read())
+    return f'{digest}.jpg'
+
+
+_executor = None
+_executor_pid = None
+
+
+def get_executor():
+    """Пул процессов, свой в каждом воркере gunicorn. Процессы пула
+    запускает forkserver, а не fork: копия многопоточного воркера могла
+    бы унаследовать захваченные блокировки пула соединений и фоновых
+    потоков и зависнуть.
+    """
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ProcessPoolExecutor(
+            max_workers=current_app.config['AVATAR_WORKERS'],
+            mp_context=multiprocessing.get_context('forkserver'))
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def read_upload(file_storage):
+    """Читает загрузку с проверкой размера файла и числа пикселей,
+    не декодируя само изображение.
+    """
+    max_bytes = current_app.config['AVATAR_MAX_BYTES']
+    data = file_storage.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise AvatarError(
+            f'Файл больше {max_bytes // (1024 * 1024)} МБ')
+    try:
+        width, height = Image.open(io.BytesIO(data)).size
+    except Exception:
+        raise AvatarError('Файл не является изображением')
+    if width * height > current_app.config['AVATAR_MAX_PIXELS']:
+        raise AvatarError('Слишком большое разрешение изображения')
+    return data
+
+
+def save_avatar(user, file_storage):
+    """Проверяет загрузку и отправляет обработку в пул процессов.
+    Аватар пользователя меняется, когда все варианты готовы.
+    """
+    data = read_upload(file_storage)
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    directory = avatar_dir()
+    if os.path.exists(os.path.join(directory, f'{digest}.jpg')):
+        # Такое же изображение уже обработано.
+        replace_avatar(user.id, f'{digest}.jpg')
+        return
+    future = get_executor().submit(
+        process_avatar, data, directory, digest,
+        current_app.config['AVATAR_SIZES'],
+        current_app.config['AVATAR_MAX_PIXELS'])
+    user_id = user.id
+    # Колбэк выполняется в потоке пула, вне контекста запроса.
+    app = current_app._get_current_object()
+
+    def done(future):
+        if future.exception() is not None:
+            app.logger.error('Не удалось обработать аватар: %s',
+                             future.exception())
+            return
+        with app.app_context():
+            replace_avatar(user_id, future.result())
+
+    future.add_done_callback(done)
+
+
+def replace_avatar(user_id, image_file):
+    """Назначает новый аватар и удаляет файлы старого."""
+    user = db.session.get(User, user_id)
+    old = user.image_file
+    if old == image_file:
+        return
+    user.image_file = image_file
+    db.session.commit()
+    remove_unused_avatar(old)
+
+
+def remove_unused_avatar(image_file):
+    """Удаляет файлы аватара, если им больше никто не пользуется."""
+    if not image_file or image_file == DEFAULT_AVATAR:
+        return
+    if User.query.filter_by(image_file=image_file).first() is not None:
+        return
+    names = [image_file]
+    match = PROCESSED_RE.match(image_file)
+    if match:
+        names += [variant_name(match['digest'], size, extension)
+                  for size in current_app.config['AVATAR_SIZES']
+                  for extension in ('jpg', 'webp')]
+    for name in names:
+        try:
+            os.remove(os.path.join(avatar_dir(), os.path.basename(name)))
+        except FileNotFoundError:
+            pass
+
+
+def avatar_url(image_file, size):
+    """Ссылка на наименьший вариант аватара не меньше size пикселей,
+    в WebP, если браузер его поддерживает.
+    """
+    image_file = image_file or DEFAULT_AVATAR
+    match = PROCESSED_RE.match(image_file)
+    if not match:
+        return url_for('static', filename='profile_pics/' + image_file)
+    sizes = sorted(current_app.config['AVATAR_SIZES'])
+    variant = next((s for s in sizes if s >= size), sizes[-1])
+    # Точное совпадение: */* у старых браузеров не означает поддержку WebP.
+    webp = any(value == 'image/webp'
+               for value, _ in request.accept_mimetypes)
+    extension = 'webp' if webp else 'jpg'
+    return url_for('static', filename='profile_pics/' + variant_name(
+        match['digest'], variant, extension))
+
+
+def init_app(app):
+    app.add_template_global(avatar_url)
@@ -0,0 +1,347 @@
+import functools
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import (
+    current_app, has_app_context, make_response, request, session
+)
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db, Post, Comment, Like, User
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class CacheBackend:
+    """Базовый класс хранилища кеша. Считает попадания и промахи."""
+
+    # Версии тегов общие для всех воркеров.
+    shared_versions = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def get_versions(self, keys):
+        """Текущие значения счетчиков версий, 0 для отсутствующих."""
+        raise NotImplementedError
+
+    def incr(self, key):
+        raise NotImplementedError
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _sizeof(value):
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_sizeof(item) for item in value)
+    return 64
+
+
+class LRUCache(CacheBackend):
+    """Кеш в памяти процесса, ограниченный по суммарному размеру значений.
+    Каждый воркер держит свою копию, поэтому сброс в одном воркере
+    не виден другим: для нескольких воркеров нужен Redis.
+    """
+
+    def __init__(self, max_bytes, max_versions):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        # Версии тегов вытесняются отдельно от записей, по числу тегов.
+        self.max_versions = max_versions
+        self._versions = OrderedDict()
+        # Версия тегов, которых нет в _versions. Растет при вытеснении,
+        # чтобы вытесненный тег не вернулся к уже использованной версии
+        # и не открыл устаревшие записи.
+        self._base_version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self._data[key] = (value, time.monotonic() + ttl, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.size -= evicted
+
+    def get_versions(self, keys):
+        with self._lock:
+            versions = []
+            for key in keys:
+                version = self._versions.get(key)
+                if version is None:
+                    version = self._base_version
+                else:
+                    self._versions.move_to_end(key)
+                versions.append(version)
+            return versions
+
+    def incr(self, key):
+        with self._lock:
+            version = self._versions.pop(key, self._base_version) + 1
+            self._versions[key] = version
+            while len(self._versions) > self.max_versions:
+                _, evicted = self._versions.popitem(last=False)
+                self._base_version = max(self._base_version, evicted)
+            return version
+
+
+class RedisCache(CacheBackend):
+    """Кеш в Redis, общий для всех воркеров. Размер ограничивается
+    настройкой maxmemory самого Redis и временем жизни записей.
+    """
+
+    shared_versions = True
+
+    def __init__(self, url):
+        super().__init__()
+        if redis is None:
+            raise RuntimeError('Для CACHE_BACKEND="redis" нужен пакет redis')
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, pickle.dumps(value), ex=ttl)
+
+    def get_versions(self, keys):
+        return [int(value or 0) for value in self.client.mget(keys)]
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+class NullCache(CacheBackend):
+    """Кеш выключен."""
+
+    def get(self, key):
+        self.misses += 1
+
+    def set(self, key, value, ttl):
+        pass
+
+    def get_versions(self, keys):
+        return [0] * len(keys)
+
+    def incr(self, key):
+        return 0
+
+
+def make_backend(config):
+    name = config['CACHE_BACKEND']
+    if name == 'lru':
+        return LRUCache(config['CACHE_MAX_BYTES'], config['CACHE_MAX_TAGS'])
+    if name == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'])
+    return NullCache()
+
+
+class Cache:
+    """Кеш текущего приложения. Хранилище создается в init_app по
+    CACHE_BACKEND и живет в app.extensions['cache'], поэтому у каждого
+    приложения из create_app свое. Вне контекста приложения кеш
+    выключен. Остальные атрибуты берутся у хранилища.
+    """
+
+    _disabled = NullCache()
+
+    def init_app(self, app):
+        app.extensions['cache'] = make_backend(app.config)
+
+    @property
+    def backend(self):
+        if not has_app_context():
+            return self._disabled
+        return current_app.extensions.get('cache', self._disabled)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+cache = Cache()
+
+
+def tag_versions(tags):
+    """Текущие версии тегов. Версия входит в ключ записи, поэтому
+    увеличение версии делает все записи с этим тегом недоступными.
+    """
+    versions = cache.get_versions([f'tag:{tag}' for tag in tags])
+    return ':'.join(str(version) for version in versions)
+
+
+def invalidate(*tags):
+    for tag in tags:
+        cache.incr(f'tag:{tag}')
+
+
+def request_variant():
+    """Часть ключа, от которой зависит разметка: формат аватаров."""
+    return 'webp' if any(value == 'image/webp'
+                         for value, _ in request.accept_mimetypes) else 'jpg'
+
+
+def cache_page(tags):
+    """Кеширует страницу целиком для анонимных посетителей.
+    tags получает аргументы представления и возвращает теги страницы.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            if request.method != 'GET' or current_user.is_authenticated \
+                    or session.get('_flashes'):
+                return view(**kwargs)
+            page_tags = tags(**kwargs)
+            key = (f'page:{request_variant()}:{request.full_path}:'
+                   f'{tag_versions(page_tags)}')
+            cached = cache.get(key)
+            if cached is not None:
+                body, status, mimetype = cached
+                return current_app.response_class(body, status,
+                                                    mimetype=mimetype)
+            response = make_response(view(**kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                cache.set(key, (response.get_data(), response.status_code,
+                                response.mimetype),
+                          current_app.config['CACHE_DEFAULT_TTL'])
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+class FragmentCacheExtension(Extension):
+    """Тег шаблона {% cache key, tags %}...{% endcache %}.
+    Кеширует отрендеренный фрагмент до изменения любого из тегов.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        parser.stream.expect('comma')
+        tags = parser.parse_expression()
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [key, tags]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, key, tags, caller):
+        key = f'fragment:{request_variant()}:{key}:{tag_versions(tags)}'
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value, current_app.config['CACHE_DEFAULT_TTL'])
+        return value
+
+
+def init_app(app):
+    cache.init_app(app)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+def mark_changed(session, *tags):
+    """Запоминает теги изменившихся данных до коммита транзакции."""
+    session.info.setdefault('cache_tags', set()).update(tags)
+
+
+def _collect(target, *tags):
+    session = Session.object_session(target)
+    if session is not None:
+        mark_changed(session, *tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_committed(session):
+    # Сброс после коммита: иначе параллельный запрос мог бы сохранить
+    # старые данные под уже новой версией тега.
+    invalidate(*session.info.pop('cache_tags', ()))
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_rolled_back(session, previous_transaction):
+    session.info.pop('cache_tags', None)
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+@event.listens_for(Post, 'after_delete')
+def post_changed(mapper, connection, target):
+    _collect(target, 'posts', f'post:{target.id}', f'user:{target.user_id}')
+
+
+@event.listens_for(Comment, 'after_insert')
+@event.listens_for(Comment, 'after_update')
+@event.listens_for(Comment, 'after_delete')
+def comment_changed(mapper, connection, target):
+    _collect(target, f'post:{target.post_id}', f'user:{target.user_id}')
+
+
+def like_tags(user_id, post_id):
+    return f'post:{post_id}', f'user:{user_id}'
+
+
+@event.listens_for(Like, 'after_insert')
+@event.listens_for(Like, 'after_delete')
+def like_changed(mapper, connection, target):
+    _collect(target, *like_tags(target.author, target.post_id))
+
+
+@event.listens_for(User, 'after_update')
+def user_changed(mapper, connection, target):
+    state = db.inspect(target)
+    # Имя и аватар выводятся в карточках чужих постов и комментариев,
+    # остальные поля, включая счетчики, только на странице профиля.
+    if state.attrs.username.history.has_changes() or \
+            state.attrs.image_file.history.has_changes():
+        _collect(target, 'users')
+    _collect(target, f'user:{target.id}')
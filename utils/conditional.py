@@ -0,0 +1,124 @@
+import functools
+import hashlib
+import os
+import time
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from app import db, User
+from utils.cache import NullCache, cache, request_variant, tag_versions
+
+_release = None
+
+
+def release_stamp():
+    """Отпечаток шаблонов и манифеста статики: после выкладки новой
+    разметки старые ETag перестают совпадать. Считается раз на процесс.
+    """
+    global _release
+    if _release is None:
+        digest = hashlib.sha1()
+        folders = (
+            os.path.join(current_app.root_path, current_app.template_folder),
+            os.path.join(current_app.static_folder,
+                         current_app.config['ASSETS_BUILD_DIR']),
+        )
+        for folder in folders:
+            for parent, _, names in sorted(os.walk(folder)):
+                for name in sorted(names):
+                    stat = os.stat(os.path.join(parent, name))
+                    digest.update(
+                        f'{parent}/{name}:{stat.st_mtime_ns}:'
+                        f'{stat.st_size};'.encode())
+        _release = digest.hexdigest()[:12]
+    return _release
+
+
+def epoch():
+    """Номер периода, после которого ETag меняется без изменения данных.
+    У 'lru' версии тегов свои в каждом воркере и изменение в соседнем
+    воркере не видно, поэтому устаревание ограничено CACHE_DEFAULT_TTL,
+    как у кеша страниц. CSRF-токен в форме тоже живет ограниченное время.
+    """
+    config = current_app.config
+    periods = []
+    if not cache.shared_versions:
+        periods.append(config['CACHE_DEFAULT_TTL'])
+    if config.get('WTF_CSRF_ENABLED', True):
+        periods.append(config.get('WTF_CSRF_TIME_LIMIT', 3600) // 2)
+    return int(time.time() // min(periods)) if periods else 0
+
+
+def page_etag(tags):
+    """ETag страницы из версий ее тегов. Для вошедшего пользователя в
+    него входят id и тег user:{id}: имя и непрочитанные сообщения в
+    шапке, свой лайк и подписка на странице.
+    """
+    if current_user.is_authenticated:
+        viewer = f'user{current_user.id}'
+        tags = [*tags, f'user:{current_user.id}']
+    else:
+        viewer = 'anonymous'
+    key = (f'{release_stamp()}:{epoch()}:{request_variant()}:{viewer}:'
+           f'{tag_versions(tags)}')
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def set_validators(response, etag):
+    response.set_etag(etag, weak=True)
+    # Разметка зависит от того, кто вошел, и от формата аватаров.
+    response.vary.update(('Cookie', 'Accept'))
+    response.cache_control.no_cache = True
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
+
+
+def conditional_page(tags):
+    """Отвечает 304 без запросов к данным и рендера, если ETag из
+    If-None-Match совпадает с текущим. tags получает аргументы
+    представления и возвращает теги страницы или None, если страница
+    не найдена.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            if request.method not in ('GET', 'HEAD') or \
+                    not current_app.config['CONDITIONAL_GET'] or \
+                    isinstance(cache.backend, NullCache) or \
+                    session.get('_flashes'):
+                return view(**kwargs)
+            page_tags = tags(**kwargs)
+            if page_tags is None:
+                return view(**kwargs)
+            etag = page_etag(page_tags)
+            if request.if_none_match.contains_weak(etag):
+                return set_validators(
+                    current_app.response_class(status=304), etag)
+            response = make_response(view(**kwargs))
+            if response.status_code == 200:
+                set_validators(response, etag)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def user_tags(username):
+    """Теги страниц пользователя по имени из адреса. id по имени
+    кешируется до переименования любого пользователя (тег users).
+    """
+    key = f'user-id:{username}:{tag_versions(["users"])}'
+    user_id = cache.get(key)
+    if user_id is None:
+        user_id = db.session.query(User.id).filter_by(
+            username=username).scalar()
+        if user_id is None:
+            return None
+        cache.set(key, user_id, current_app.config['CACHE_DEFAULT_TTL'])
+    return [f'user:{user_id}']
@@ -0,0 +1,121 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, or_, select
+
+from app import db, User, Post, Comment, Like, followers
+
+user_table = User.__table__
+post_table = Post.__table__
+
+
+def change_counters(connection, table, row_id, delta, *columns):
+    """Увеличивает счетчики строки на delta в той же транзакции."""
+    connection.execute(
+        table.update().where(table.c.id == row_id).values(
+            {column: table.c[column] + delta for column in columns})
+    )
+
+
+@event.listens_for(Post, 'after_insert')
+def post_created(mapper, connection, target):
+    change_counters(connection, user_table, target.user_id, 1,
+                    'posts_count')
+
+
+@event.listens_for(Post, 'after_delete')
+def post_deleted(mapper, connection, target):
+    change_counters(connection, user_table, target.user_id, -1,
+                    'posts_count')
+
+
+@event.listens_for(Comment, 'after_insert')
+def comment_created(mapper, connection, target):
+    change_counters(connection, user_table, target.user_id, 1,
+                    'comments_count')
+    change_counters(connection, post_table, target.post_id, 1,
+                    'comments_count')
+
+
+@event.listens_for(Comment, 'after_delete')
+def comment_deleted(mapper, connection, target):
+    change_counters(connection, user_table, target.user_id, -1,
+                    'comments_count')
+    change_counters(connection, post_table, target.post_id, -1,
+                    'comments_count')
+
+
+def count_like(connection, user_id, post_id, delta):
+    """Счетчики лайков пользователя и поста. Вызывается и из событий
+    модели, и из utils/likes.py, где лайки пишутся без ORM.
+    """
+    change_counters(connection, user_table, user_id, delta, 'likes_count')
+    change_counters(connection, post_table, post_id, delta, 'likes_count')
+
+
+@event.listens_for(Like, 'after_insert')
+def like_created(mapper, connection, target):
+    count_like(connection, target.author, target.post_id, 1)
+
+
+@event.listens_for(Like, 'after_delete')
+def like_deleted(mapper, connection, target):
+    count_like(connection, target.author, target.post_id, -1)
+
+
+def actual_counts():
+    """Подзапросы с реальными значениями счетчиков по таблицам."""
+
+    def count(table, column, owner):
+        return select(func.count()).select_from(table).where(
+            column == owner.c.id).scalar_subquery()
+
+    like_table = Like.__table__
+    comment_table = Comment.__table__
+    return {
+        user_table: {
+            'posts_count': count(post_table, post_table.c.user_id,
+                                 user_table),
+            'likes_count': count(like_table, like_table.c.author,
+                                 user_table),
+            'comments_count': count(comment_table, comment_table.c.user_id,
+                                    user_table),
+            'followers_count': count(followers, followers.c.followed_id,
+                                     user_table),
+            'following_count': count(followers, followers.c.follower_id,
+                                     user_table),
+        },
+        post_table: {
+            'likes_count': count(like_table, like_table.c.post_id,
+                                 post_table),
+            'comments_count': count(comment_table, comment_table.c.post_id,
+                                    post_table),
+        },
+    }
+
+
+def reconcile_counters(connection):
+    """Пересчитывает разошедшиеся счетчики. Возвращает число
+    исправленных строк по каждой таблице.
+    """
+    fixed = {}
+    for table, counts in actual_counts().items():
+        drift = or_(*(table.c[column] != value
+                      for column, value in counts.items()))
+        result = connection.execute(
+            table.update().where(drift).values(counts))
+        fixed[table.name] = result.rowcount
+    return fixed
+
+
+@click.command('counters-reconcile')
+@with_appcontext
+def reconcile_counters_command():
+    """Исправляет расхождения счетчиков с реальными данными."""
+    fixed = reconcile_counters(db.session.connection())
+    db.session.commit()
+    for table, rows in fixed.items():
+        click.echo(f'{table}: исправлено строк {rows}')
+
+
+def init_app(app):
+    app.cli.add_command(reconcile_counters_command)
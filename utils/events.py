@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from flask import Response, abort, current_app
+from flask_login import current_user, login_required
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from werkzeug.local import LocalProxy
+
+from app import db, Comment, Like, Post, User
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+user_table = User.__table__
+
+
+class Subscription:
+    """Очередь событий одного соединения. Буфер ограничен: медленный
+    клиент не копит память, а при переполнении получает reset и
+    перезагружает страницу.
+    """
+
+    def __init__(self, channels, size):
+        self.channels = channels
+        self.overflowed = False
+        self._events = deque()
+        self._size = size
+        self._ready = threading.Condition()
+
+    def put(self, event):
+        with self._ready:
+            if len(self._events) >= self._size:
+                self.overflowed = True
+                return
+            self._events.append(event)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """События из буфера; пустой список, если за timeout ничего
+        не пришло.
+        """
+        with self._ready:
+            if not self._events and not self.overflowed:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+
+class LocalBroker:
+    """Pub/sub внутри процесса. Подходит, когда события публикует тот же
+    воркер, который держит соединения.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels, size):
+        subscription = Subscription(channels, size)
+        with self._lock:
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, channel, event):
+        self._deliver(channel, event)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribers(self):
+        with self._lock:
+            return len(set().union(*self._channels.values()))
+
+
+class RedisBroker(LocalBroker):
+    """Pub/sub через Redis: события доходят до соединений во всех
+    воркерах и процессах. Каждый процесс держит одну подписку на Redis
+    и раздает события своим соединениям.
+    """
+
+    prefix = 'events:'
+
+    def __init__(self, url, logger):
+        super().__init__()
+        if redis is None:
+            raise RuntimeError('Для EVENTS_BROKER="redis" нужен пакет redis')
+        self.client = redis.Redis.from_url(url)
+        self.logger = logger
+        self._listener_pid = None
+
+    def subscribe(self, channels, size):
+        if self._listener_pid != os.getpid():
+            self._listener_pid = os.getpid()
+            threading.Thread(target=self._listen, name='events-listener',
+                             daemon=True).start()
+        return super().subscribe(channels, size)
+
+    def publish(self, channel, event):
+        self.client.publish(self.prefix + channel, json.dumps(event))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for message in pubsub.listen():
+                    channel = message['channel'].decode()
+                    self._deliver(channel[len(self.prefix):],
+                                  json.loads(message['data']))
+            except redis.RedisError:
+                self.logger.exception(
+                    'Потеряно соединение с Redis для событий')
+                time.sleep(1)
+
+
+def make_broker(app):
+    if app.config['EVENTS_BROKER'] == 'redis':
+        return RedisBroker(app.config['EVENTS_REDIS_URL'], app.logger)
+    return LocalBroker()
+
+
+# Брокер текущего приложения, создается в init_app по EVENTS_BROKER.
+broker = LocalProxy(lambda: current_app.extensions['events'])
+
+
+def publish(session, channel, event):
+    """Откладывает событие до коммита транзакции: подписчики не должны
+    узнать о данных, которые еще могут откатиться.
+    """
+    session.info.setdefault('events', []).append((channel, event))
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_committed(session):
+    for channel, payload in session.info.pop('events', ()):
+        try:
+            broker.publish(channel, payload)
+        except Exception:
+            # Данные уже сохранены, клиент увидит их при обновлении.
+            current_app.logger.exception(
+                'Не удалось отправить событие %s', channel)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_rolled_back(session, previous_transaction):
+    session.info.pop('events', None)
+
+
+def _username(session, connection, user_id):
+    """Имя автора из сессии, без запроса, если пользователь загружен."""
+    user = session.identity_map.get(identity_key(User, user_id))
+    if user is not None and 'username' in user.__dict__:
+        return user.username
+    return connection.execute(select(user_table.c.username).where(
+        user_table.c.id == user_id)).scalar()
+
+
+@event.listens_for(Comment, 'after_insert')
+def comment_created(mapper, connection, target):
+    session = Session.object_session(target)
+    publish(session, f'post:{target.post_id}', {
+        'type': 'comment',
+        'id': target.id,
+        'author': _username(session, connection, target.user_id),
+        'body': target.body,
+        'timestamp': target.timestamp.strftime('%d-%m-%Y'),
+    })
+
+
+def like_event(post_id, delta):
+    return f'post:{post_id}', {'type': 'like', 'post_id': post_id,
+                               'delta': delta}
+
+
+@event.listens_for(Like, 'after_insert')
+def like_created(mapper, connection, target):
+    publish(Session.object_session(target), *like_event(target.post_id, 1))
+
+
+@event.listens_for(Like, 'after_delete')
+def like_deleted(mapper, connection, target):
+    publish(Session.object_session(target), *like_event(target.post_id, -1))
+
+
+def format_event(event):
+    return (f'event: {event["type"]}\n'
+            f'data: {json.dumps(event, ensure_ascii=False)}\n\n')
+
+
+def stream(broker, channels, heartbeat, max_age, buffer_size):
+    """Поток SSE. Не использует базу и контекст приложения: к моменту
+    первой итерации Flask уже вернул соединение с базой в пул, поэтому
+    открытое соединение стоит только буфера и ожидающего потока
+    (гринлета в воркере gevent).
+    """
+    deadline = time.monotonic() + max_age
+    subscription = broker.subscribe(channels, buffer_size)
+    try:
+        # Через сколько миллисекунд браузер переподключится.
+        yield f'retry: {heartbeat * 1000}\n\n'
+        while time.monotonic() < deadline:
+            events = subscription.get(heartbeat)
+            if subscription.overflowed:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            if not events:
+                # Комментарий держит соединение через прокси и
+                # показывает, что клиент уже отключился.
+                yield ': ping\n\n'
+            for item in events:
+                yield format_event(item)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def event_response(channels):
+    config = current_app.config
+    # Генератор работает вне контекста, поэтому получает сам брокер.
+    events = stream(current_app.extensions['events'], channels,
+                    config['EVENTS_HEARTBEAT'],
+                    config['EVENTS_MAX_AGE'], config['EVENTS_BUFFER_SIZE'])
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # nginx не должен буферизовать поток.
+        'X-Accel-Buffering': 'no',
+    })
+
+
+def post_events(post_id: int):
+    """Новые комментарии и лайки поста."""
+    if db.session.query(Post.id).filter_by(id=post_id).first() is None:
+        abort(404)
+    return event_response([f'post:{post_id}'])
+
+
+@login_required
+def inbox_events():
+    """Новые личные сообщения пользователя."""
+    return event_response([f'inbox:{current_user.id}'])
+
+
+def init_app(app):
+    app.extensions['events'] = make_broker(app)
+    # Без асинхронного воркера поток занял бы воркер целиком.
+    if not app.config['EVENTS_ENABLED']:
+        return
+    app.add_url_rule('/events/post/<int:post_id>', 'post_events', post_events)
+    app.add_url_rule('/events/inbox', 'inbox_events', inbox_events)
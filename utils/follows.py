@@ -0,0 +1,125 @@
+from flask import current_app
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.orm import load_only
+
+from app import db, User, followers
+from utils.pagination import KeysetPage
+from utils.queries import insert_ignore
+
+# Поля пользователя, которые нужны спискам подписок.
+LIST_COLUMNS = (User.username, User.image_file, User.last_seen,
+                User.followers_count)
+
+
+def _change_counts(user, author, delta):
+    # Выражение вместо значения: UPDATE сложит счетчик в базе и не
+    # затрет параллельное изменение. Flush сразу, иначе следующая
+    # подписка того же объекта заменит еще не записанное выражение.
+    user.following_count = User.following_count + delta
+    author.followers_count = User.followers_count + delta
+    db.session.flush()
+
+
+def follow(user, author):
+    """Подписывает user на author одним INSERT. Повторная подписка
+    ничего не меняет. True, если подписка добавлена.
+    """
+    added = insert_ignore(db.session.connection(), followers, {
+        'follower_id': user.id, 'followed_id': author.id})
+    if added:
+        _change_counts(user, author, 1)
+    return bool(added)
+
+
+def unfollow(user, author):
+    """Отписывает user от author. True, если подписка была."""
+    removed = db.session.execute(followers.delete().where(
+        followers.c.follower_id == user.id,
+        followers.c.followed_id == author.id,
+    )).rowcount
+    if removed:
+        _change_counts(user, author, -removed)
+    return bool(removed)
+
+
+def is_following_many(user, user_ids):
+    """Множество id из user_ids, на которых подписан user,
+    одним запросом на весь список.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not user.is_authenticated:
+        return set()
+    return set(db.session.execute(select(followers.c.followed_id).where(
+        followers.c.follower_id == user.id,
+        followers.c.followed_id.in_(user_ids),
+    )).scalars())
+
+
+def _user_page(query, key, cursor, per_page):
+    """Курсорная пагинация списка пользователей по id из таблицы
+    подписок: сортировка идет по индексу, без OFFSET и COUNT(*).
+    """
+    if cursor:
+        query = query.filter(key > cursor)
+    items = query.options(load_only(*LIST_COLUMNS)).order_by(key).limit(
+        per_page + 1).all()
+    has_next = len(items) > per_page
+    items = items[:per_page]
+    return KeysetPage(
+        items, next_cursor=items[-1].id if items and has_next else None)
+
+
+def followers_page(user, cursor=None, per_page=10):
+    """Подписчики пользователя."""
+    query = User.query.join(
+        followers, followers.c.follower_id == User.id
+    ).filter(followers.c.followed_id == user.id)
+    return _user_page(query, followers.c.follower_id, cursor, per_page)
+
+
+def following_page(user, cursor=None, per_page=10):
+    """Авторы, на которых подписан пользователь."""
+    query = User.query.join(
+        followers, followers.c.followed_id == User.id
+    ).filter(followers.c.follower_id == user.id)
+    return _user_page(query, followers.c.followed_id, cursor, per_page)
+
+
+def mutual_page(user, cursor=None, per_page=10):
+    """Взаимные подписки: авторы, которые подписаны на user в ответ."""
+    back = followers.alias('back')
+    query = User.query.join(
+        followers, followers.c.followed_id == User.id
+    ).join(
+        back, and_(back.c.follower_id == User.id,
+                   back.c.followed_id == user.id)
+    ).filter(followers.c.follower_id == user.id)
+    return _user_page(query, followers.c.followed_id, cursor, per_page)
+
+
+def suggestions(user, limit=5):
+    """Кого почитать: авторы, на которых подписаны авторы из подписок
+    user, по числу таких общих связей. Возвращает пары (автор, число).
+    """
+    mine = followers.alias('mine')
+    theirs = followers.alias('theirs')
+    followees = select(followers.c.followed_id).where(
+        followers.c.follower_id == user.id
+    ).limit(current_app.config['FOLLOW_SUGGESTIONS_FANOUT'])
+    candidate = theirs.c.followed_id
+    already = exists().where(mine.c.follower_id == user.id,
+                             mine.c.followed_id == candidate)
+    ranked = select(
+        candidate.label('id'), func.count().label('mutual')
+    ).where(
+        theirs.c.follower_id.in_(followees),
+        candidate != user.id,
+        ~already,
+    ).group_by(candidate).order_by(
+        func.count().desc(), candidate
+    ).limit(limit).subquery()
+    return db.session.query(User, ranked.c.mutual).options(
+        load_only(*LIST_COLUMNS)
+    ).join(ranked, ranked.c.id == User.id).order_by(
+        ranked.c.mutual.desc(), User.id
+    ).all()
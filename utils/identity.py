@@ -0,0 +1,63 @@
+from flask import current_app
+from sqlalchemy.orm import load_only, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db, login_manager, User
+from utils.cache import cache, invalidate, tag_versions
+
+# Поля, которые нужны почти каждой странице: шапка со счетчиком
+# непрочитанных сообщений, last_seen, лента.
+# Профильные поля и остальные счетчики догружаются одним запросом
+# при обращении.
+IDENTITY_COLUMNS = ('id', 'username', 'email', 'image_file', 'last_seen',
+                    'timeline_built', 'unread_messages')
+
+
+def _tags(user_id):
+    # user:{id} меняется после коммита любых правок пользователя
+    # (utils/cache.py), session:{id} - при выходе.
+    return [f'user:{user_id}', f'session:{user_id}']
+
+
+def _key(user_id):
+    return f'identity:{user_id}:{tag_versions(_tags(user_id))}'
+
+
+def _restore(values):
+    """Пользователь из закешированных полей, привязанный к сессии
+    без запроса в базу. Незагруженные поля остаются отложенными.
+    """
+    user = User.__mapper__.class_manager.new_instance()
+    for name, value in values.items():
+        set_committed_value(user, name, value)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def _query(user_id):
+    query = User.query
+    if current_app.config['USER_LOADER_LOAD_ONLY']:
+        query = query.options(load_only(*IDENTITY_COLUMNS))
+    return query.get(user_id)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    ttl = current_app.config['USER_CACHE_TTL']
+    if not ttl:
+        return _query(user_id)
+    key = _key(user_id)
+    values = cache.get(key)
+    if values is not None:
+        return _restore(values)
+    user = _query(user_id)
+    if user is not None:
+        cache.set(key, {name: getattr(user, name)
+                        for name in IDENTITY_COLUMNS}, ttl)
+    return user
+
+
+def forget_user(user_id):
+    """Сбрасывает закешированного пользователя, например при выходе."""
+    invalidate(f'session:{user_id}')
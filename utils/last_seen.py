@@ -0,0 +1,106 @@
+import atexit
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam
+from werkzeug.local import LocalProxy
+
+from app import db, User
+from utils.cache import invalidate
+
+
+class LastSeenBuffer:
+    """Копит время последнего визита пользователей в памяти и
+    записывает его в базу пачками из фонового потока.
+
+    Вместо UPDATE и commit на каждый запрос посещения одного пользователя
+    схлопываются, а запись происходит не чаще раза в granularity.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.granularity = timedelta(
+            seconds=app.config['LAST_SEEN_GRANULARITY'])
+        self.flush_interval = app.config['LAST_SEEN_FLUSH_INTERVAL']
+        self._pending = {}
+        # Последний отмеченный визит: объект пользователя из кеша
+        # (utils/identity.py) не знает о визитах, которые еще не записаны.
+        self._touched = {}
+        # Пользователи, у которых сменится дата визита на странице профиля.
+        self._new_day = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def touch(self, user, now=None):
+        """Отмечает визит пользователя, если прошлый был достаточно давно."""
+        now = now or datetime.utcnow()
+        last = max(filter(None, (self._touched.get(user.id),
+                                 user.last_seen)), default=None)
+        if last and now - last < self.granularity:
+            return
+        with self._lock:
+            self._pending[user.id] = now
+            self._touched[user.id] = now
+            if not last or last.date() != now.date():
+                self._new_day.add(user.id)
+        self._ensure_flusher()
+
+    def flush(self):
+        """Записывает накопленные визиты одним executemany."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            new_day, self._new_day = self._new_day, set()
+            # Старые визиты уже не сдерживают запись, их можно забыть.
+            expired = datetime.utcnow() - self.granularity
+            self._touched = {user_id: seen
+                             for user_id, seen in self._touched.items()
+                             if seen > expired}
+        if not pending:
+            return 0
+        table = User.__table__
+        statement = table.update().where(
+            table.c.id == bindparam('user_id')
+        ).values(last_seen=bindparam('seen'))
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(statement, [
+                    {'user_id': user_id, 'seen': seen}
+                    for user_id, seen in pending.items()
+                ])
+            invalidate(*(f'user:{user_id}' for user_id in new_day))
+        return len(pending)
+
+    def _ensure_flusher(self):
+        # После fork в воркере gunicorn поток родителя не существует,
+        # поэтому поток запускается заново по смене pid.
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='last-seen-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._wakeup.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Не удалось записать last_seen')
+
+
+# Буфер текущего приложения, у каждого приложения из create_app свой.
+last_seen_buffer = LocalProxy(lambda: current_app.extensions['last_seen'])
+
+
+def init_app(app):
+    """Поток записи запускается первым визитом."""
+    buffer = app.extensions['last_seen'] = LastSeenBuffer(app)
+    # При остановке воркера дописываем то, что не успел записать поток.
+    atexit.register(buffer.flush)
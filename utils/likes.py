@@ -0,0 +1,64 @@
+from sqlalchemy import select
+
+from app import db, Like
+from utils.cache import like_tags, mark_changed
+from utils.counters import count_like
+from utils.events import like_event, publish
+from utils.queries import insert_ignore
+
+like_table = Like.__table__
+
+
+def _changed(connection, user_id, post_id, delta):
+    # Core-запросы не вызывают события модели Like, поэтому счетчики,
+    # сброс кеша и событие для подписчиков выполняются здесь явно.
+    count_like(connection, user_id, post_id, delta)
+    mark_changed(db.session, *like_tags(user_id, post_id))
+    publish(db.session, *like_event(post_id, delta))
+
+
+def add_like(user, post_id):
+    """Ставит лайк. Повторный вызов ничего не меняет, в том числе при
+    двойном клике из двух параллельных запросов. True, если лайк добавлен.
+    """
+    connection = db.session.connection()
+    added = insert_ignore(connection, like_table,
+                          {'author': user.id, 'post_id': post_id})
+    if added:
+        _changed(connection, user.id, post_id, 1)
+    return bool(added)
+
+
+def remove_like(user, post_id):
+    """Убирает лайк, если он есть. True, если лайк удален."""
+    connection = db.session.connection()
+    removed = connection.execute(like_table.delete().where(
+        like_table.c.author == user.id,
+        like_table.c.post_id == post_id,
+    )).rowcount
+    if removed:
+        _changed(connection, user.id, post_id, -removed)
+    return bool(removed)
+
+
+def toggle_like(user, post_id):
+    """Переключает лайк для старых ссылок без явного действия.
+    Возвращает новое состояние.
+    """
+    if add_like(user, post_id):
+        return True
+    remove_like(user, post_id)
+    return False
+
+
+def liked_post_ids(user, post_ids):
+    """Множество id постов из post_ids, отмеченных пользователем,
+    одним запросом на всю страницу.
+    """
+    post_ids = list(post_ids)
+    if not post_ids or not user.is_authenticated:
+        return set()
+    return set(db.session.execute(select(like_table.c.post_id).where(
+        like_table.c.author == user.id,
+        like_table.c.post_id.in_(post_ids),
+    )).scalars())
@@ -0,0 +1,111 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_mail import Message
+
+from app import db, mail, OutboxMessage
+
+
+def enqueue_mail(subject, recipients, body):
+    """Ставит письмо в очередь вместо отправки внутри запроса.
+    Повторное такое же письмо в окне MAIL_DEDUP_WINDOW не добавляется.
+    """
+    recipients = ','.join(recipients)
+    dedup_key = hashlib.sha256(
+        '\n'.join((subject, recipients, body)).encode()).hexdigest()
+    window = datetime.utcnow() - timedelta(
+        seconds=current_app.config['MAIL_DEDUP_WINDOW'])
+    duplicate = OutboxMessage.query.filter(
+        OutboxMessage.dedup_key == dedup_key,
+        OutboxMessage.created_at >= window,
+    ).first()
+    if duplicate is not None:
+        return duplicate
+    message = OutboxMessage(subject=subject, recipients=recipients,
+                            body=body, dedup_key=dedup_key)
+    db.session.add(message)
+    db.session.commit()
+    return message
+
+
+def retry_later(message, error):
+    """Откладывает письмо с экспоненциальной паузой между попытками."""
+    message.attempts += 1
+    message.last_error = str(error)
+    if message.attempts >= current_app.config['MAIL_MAX_ATTEMPTS']:
+        message.status = 'failed'
+    else:
+        delay = current_app.config['MAIL_RETRY_DELAY'] * \
+            2 ** (message.attempts - 1)
+        message.next_attempt_at = datetime.utcnow() + timedelta(
+            seconds=delay)
+
+
+def send_pending(batch_size=None):
+    """Отправляет пачку писем, которым пора уходить, через одно
+    SMTP-соединение. Возвращает число отправленных писем.
+    """
+    batch = OutboxMessage.query.filter(
+        OutboxMessage.status == 'pending',
+        OutboxMessage.next_attempt_at <= datetime.utcnow(),
+    ).order_by(OutboxMessage.next_attempt_at).limit(
+        batch_size or current_app.config['MAIL_BATCH_SIZE']).all()
+    if not batch:
+        return 0
+    sent = 0
+    # Письма, судьба которых в этой пачке уже решена.
+    handled = set()
+    try:
+        with mail.connect() as connection:
+            for message in batch:
+                handled.add(message.id)
+                try:
+                    connection.send(Message(
+                        message.subject,
+                        recipients=message.recipients.split(','),
+                        body=message.body,
+                    ))
+                except Exception as error:
+                    retry_later(message, error)
+                else:
+                    message.status = 'sent'
+                    message.sent_at = datetime.utcnow()
+                    sent += 1
+    except Exception as error:
+        # Соединение с сервером не удалось или оборвалось: письма, до
+        # которых не дошла очередь, ждут следующей попытки.
+        current_app.logger.warning('SMTP недоступен: %s', error)
+        for message in batch:
+            if message.id not in handled:
+                retry_later(message, error)
+    db.session.commit()
+    return sent
+
+
+@click.command('mail-worker')
+@with_appcontext
+@click.option('--once', is_flag=True, help='Отправить одну пачку и выйти.')
+@click.option('--interval', default=5.0,
+              help='Пауза между проверками очереди, секунд.')
+@click.option('--batch-size', default=None, type=int)
+def mail_worker(once, interval, batch_size):
+    """Фоновая отправка писем из очереди. Запускается в одном экземпляре."""
+    while True:
+        started = time.perf_counter()
+        sent = send_pending(batch_size)
+        if sent:
+            elapsed = time.perf_counter() - started
+            click.echo(f'Отправлено писем: {sent}, '
+                       f'{sent / elapsed:.1f} писем/с')
+        if once:
+            break
+        if not sent:
+            time.sleep(interval)
+
+
+def init_app(app):
+    app.cli.add_command(mail_worker)
@@ -0,0 +1,167 @@
+from datetime import datetime
+
+from sqlalchemy import and_, case, select, tuple_
+from sqlalchemy.orm import Load, aliased
+
+from app import db, User, Conversation, ConversationMember, Message
+from utils.cache import mark_changed
+from utils.events import publish
+from utils.pagination import KeysetPage, decode_cursor, encode_cursor, \
+    paginate_keyset
+from utils.queries import insert_ignore
+
+conversation_table = Conversation.__table__
+member_table = ConversationMember.__table__
+user_table = User.__table__
+
+
+class InboxEntry:
+    """Строка списка переписок: участие пользователя, сама переписка
+    и собеседник.
+    """
+
+    def __init__(self, member, conversation, companion):
+        self.member = member
+        self.conversation = conversation
+        self.companion = companion
+
+    # Позиция строки для курсора из utils/pagination.py.
+    @property
+    def created_at(self):
+        return self.member.last_activity_at
+
+    @property
+    def id(self):
+        return self.conversation.id
+
+
+def direct_key(user, other):
+    low, high = sorted((user.id, other.id))
+    return f'{low}:{high}'
+
+
+def get_direct(user, other, create=False):
+    """Личная переписка двух пользователей. С create=True создается,
+    если ее еще нет; одновременное создание не дает дубликатов.
+    """
+    key = direct_key(user, other)
+    conversation = Conversation.query.filter_by(direct_key=key).first()
+    if conversation is not None or not create:
+        return conversation
+    connection = db.session.connection()
+    insert_ignore(connection, conversation_table, {'direct_key': key})
+    conversation = Conversation.query.filter_by(direct_key=key).one()
+    for member in (user, other):
+        insert_ignore(connection, member_table, {
+            'conversation_id': conversation.id, 'user_id': member.id})
+    return conversation
+
+
+def send(user, conversation, text):
+    """Добавляет сообщение и обновляет последнюю активность переписки
+    и счетчики непрочитанных у остальных участников.
+    """
+    now = datetime.utcnow()
+    message = Message(conversation_id=conversation.id, sender_id=user.id,
+                      text=text, timestamp=now)
+    db.session.add(message)
+    db.session.flush()
+    recipients = db.session.execute(select(member_table.c.user_id).where(
+        member_table.c.conversation_id == conversation.id,
+        member_table.c.user_id != user.id,
+    )).scalars().all()
+    db.session.execute(conversation_table.update().where(
+        conversation_table.c.id == conversation.id
+    ).values(last_message_at=now, last_message_text=text,
+             last_sender_id=user.id))
+    db.session.execute(member_table.update().where(
+        member_table.c.conversation_id == conversation.id
+    ).values(
+        last_activity_at=now,
+        unread_count=case(
+            (member_table.c.user_id == user.id, member_table.c.unread_count),
+            else_=member_table.c.unread_count + 1),
+    ))
+    if recipients:
+        db.session.execute(user_table.update().where(
+            user_table.c.id.in_(recipients)
+        ).values(unread_messages=user_table.c.unread_messages + 1))
+        # Счетчик в шапке берется из кеша пользователя (utils/identity.py).
+        mark_changed(db.session, *(f'user:{user_id}'
+                                   for user_id in recipients))
+    for user_id in recipients:
+        publish(db.session, f'inbox:{user_id}', {
+            'type': 'message',
+            'conversation_id': conversation.id,
+            'sender': user.username,
+            'text': text,
+            'timestamp': now.strftime('%d-%m-%Y %H:%M'),
+        })
+    return message
+
+
+def mark_read(user, member):
+    """Обнуляет непрочитанные пользователя в переписке. Вычитается
+    прочитанное число, а не записывается ноль, чтобы не потерять
+    сообщения, пришедшие параллельно.
+    """
+    unread = member.unread_count
+    if not unread:
+        return
+    db.session.execute(member_table.update().where(
+        member_table.c.conversation_id == member.conversation_id,
+        member_table.c.user_id == user.id,
+    ).values(unread_count=member_table.c.unread_count - unread))
+    db.session.execute(user_table.update().where(
+        user_table.c.id == user.id
+    ).values(unread_messages=user_table.c.unread_messages - unread))
+    mark_changed(db.session, f'user:{user.id}')
+
+
+def _entries(user):
+    """Переписки пользователя вместе с собеседником, одним запросом."""
+    other = aliased(ConversationMember)
+    return db.session.query(ConversationMember, Conversation, User).join(
+        Conversation, Conversation.id == ConversationMember.conversation_id
+    ).join(other, and_(
+        other.conversation_id == ConversationMember.conversation_id,
+        other.user_id != ConversationMember.user_id,
+    )).join(User, User.id == other.user_id).options(
+        Load(User).load_only(User.username, User.image_file)
+    ).filter(ConversationMember.user_id == user.id)
+
+
+def get_entry(user, conversation_id):
+    """Переписка пользователя или None, если он в ней не участвует."""
+    row = _entries(user).filter(
+        ConversationMember.conversation_id == conversation_id).first()
+    return InboxEntry(*row) if row else None
+
+
+def inbox_page(user, cursor=None, per_page=10):
+    """Переписки по последней активности, от новых к старым. Один
+    запрос по индексу участников независимо от числа сообщений.
+    """
+    key = tuple_(ConversationMember.last_activity_at,
+                 ConversationMember.conversation_id)
+    query = _entries(user).filter(Conversation.last_message_at.isnot(None))
+    if cursor:
+        last_activity_at, conversation_id, _ = decode_cursor(cursor)
+        query = query.filter(key < tuple_(last_activity_at, conversation_id))
+    rows = query.order_by(
+        ConversationMember.last_activity_at.desc(),
+        ConversationMember.conversation_id.desc(),
+    ).limit(per_page + 1).all()
+    entries = [InboxEntry(*row) for row in rows[:per_page]]
+    return KeysetPage(
+        entries, next_cursor=encode_cursor(entries[-1], 'next')
+        if len(rows) > per_page else None)
+
+
+def history_page(conversation_id, cursor=None, per_page=20):
+    """Сообщения переписки от новых к старым, по индексу
+    (conversation_id, timestamp).
+    """
+    return paginate_keyset(
+        Message.query.filter(Message.conversation_id == conversation_id),
+        Message, cursor=cursor, per_page=per_page)
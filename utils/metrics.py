@@ -0,0 +1,344 @@
+import atexit
+import glob
+import hmac
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import (
+    abort, before_render_template, current_app, g, has_request_context,
+    request, request_finished, request_started, template_rendered,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.local import LocalProxy
+
+from utils.cache import cache
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST_RE = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(statement):
+    """Форма запроса без значений: литералы и списки IN (?, ?, ...)
+    заменяются одним ?, чтобы одинаковые запросы сравнивались как равные.
+    """
+    statement = _STRING_RE.sub('?', statement)
+    statement = _NUMBER_RE.sub('?', statement)
+    statement = _LIST_RE.sub('(?)', statement)
+    return _SPACE_RE.sub(' ', statement).strip()
+
+
+class RequestMetrics:
+    """Замеры одного запроса, хранятся в g.metrics."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        self.shapes = Counter()
+        self.slow = []
+
+
+class MetricsRegistry:
+    """Накопленные по эндпоинтам счетчики с момента запуска процесса.
+
+    Каждый воркер gunicorn считает свое, а запрос Prometheus к /metrics
+    попадает в случайный воркер. Поэтому с METRICS_DIR фоновый поток
+    воркера раз в METRICS_SAVE_INTERVAL секунд сохраняет его счетчики
+    в файл, а /metrics отдает сумму файлов всех воркеров. Без
+    METRICS_DIR метрики верны, только если процесс один.
+    """
+
+    # Счетчики, которые сохраняются в файл и складываются между воркерами.
+    fields = ('requests', 'request_time', 'queries', 'db_time',
+              'render_time', 'n_plus_one', 'slow_count', 'slow_time',
+              'cache')
+
+    def __init__(self, app=None, directory=None, save_interval=1.0,
+                 max_slow_statements=50):
+        self.app = app
+        self.directory = directory
+        self.save_interval = save_interval
+        self.max_slow_statements = max_slow_statements
+        for name in self.fields:
+            setattr(self, name, Counter())
+        self._changed = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def record(self, endpoint, metrics, duration, n_plus_one):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.request_time[endpoint] += duration
+            self.queries[endpoint] += metrics.queries
+            self.db_time[endpoint] += metrics.db_time
+            self.render_time[endpoint] += metrics.render_time
+            if n_plus_one:
+                self.n_plus_one[endpoint] += 1
+            for shape, elapsed in metrics.slow:
+                key = (endpoint, shape)
+                # Число разных медленных запросов ограничено, чтобы
+                # /metrics не разрастался из-за уникальных выражений.
+                if key not in self.slow_count and \
+                        len(self.slow_count) >= self.max_slow_statements:
+                    continue
+                self.slow_count[key] += 1
+                self.slow_time[key] += elapsed
+            self._changed = True
+        if self.directory:
+            self._ensure_saver()
+
+    def save(self):
+        """Сохраняет счетчики воркера в METRICS_DIR/<pid>.json."""
+        if not self.directory:
+            return
+        self._update_cache()
+        with self._lock:
+            self._changed = False
+            data = {name: [[key, value]
+                           for key, value in getattr(self, name).items()]
+                    for name in self.fields}
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(data, file)
+        # Читатель видит либо старый файл, либо новый целиком.
+        os.replace(path + '.tmp', path)
+
+    def _ensure_saver(self):
+        # Как в utils/last_seen.py: после fork поток запускается заново.
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='metrics-saver', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.save_interval)
+            if not self._changed:
+                continue
+            try:
+                with self.app.app_context():
+                    self.save()
+            except Exception:
+                self.app.logger.exception('Не удалось сохранить метрики')
+
+    def _update_cache(self):
+        # Кеш ведет свои счетчики, здесь хранится их последнее значение.
+        stats = cache.stats()
+        with self._lock:
+            self.cache['hits'] = stats['hits']
+            self.cache['misses'] = stats['misses']
+
+    def combined(self):
+        """Сумма счетчиков всех воркеров из METRICS_DIR. Файлы
+        завершившихся воркеров тоже учитываются: счетчики не убывают.
+        """
+        if not self.directory:
+            self._update_cache()
+            return self
+        self.save()
+        total = MetricsRegistry()
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name in self.fields:
+                counter = getattr(total, name)
+                for key, value in data.get(name, ()):
+                    counter[tuple(key) if isinstance(key, list)
+                            else key] += value
+        return total
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(str(label))}"'
+                                      for key, label in labels)
+                lines.append(f'{name}{{{label_text}}} {value}'
+                             if label_text else f'{name} {value}')
+
+        with self._lock:
+            by_endpoint = sorted(self.requests)
+            family('yatube_requests_total', 'counter',
+                   'Обработанные запросы.',
+                   [((('endpoint', e),), self.requests[e])
+                    for e in by_endpoint])
+            family('yatube_request_seconds_total', 'counter',
+                   'Суммарное время обработки запросов.',
+                   [((('endpoint', e),), round(self.request_time[e], 6))
+                    for e in by_endpoint])
+            family('yatube_db_queries_total', 'counter',
+                   'Выполненные SQL-запросы.',
+                   [((('endpoint', e),), self.queries[e])
+                    for e in by_endpoint])
+            family('yatube_db_seconds_total', 'counter',
+                   'Суммарное время SQL-запросов.',
+                   [((('endpoint', e),), round(self.db_time[e], 6))
+                    for e in by_endpoint])
+            family('yatube_render_seconds_total', 'counter',
+                   'Суммарное время рендера шаблонов.',
+                   [((('endpoint', e),), round(self.render_time[e], 6))
+                    for e in by_endpoint])
+            family('yatube_n_plus_one_total', 'counter',
+                   'Запросы, в которых один SQL повторялся слишком часто.',
+                   [((('endpoint', e),), self.n_plus_one[e])
+                    for e in sorted(self.n_plus_one)])
+            slow = sorted(self.slow_count)
+            family('yatube_slow_queries_total', 'counter',
+                   'Медленные SQL-запросы по форме выражения.',
+                   [((('endpoint', e), ('statement', s)),
+                     self.slow_count[e, s]) for e, s in slow])
+            family('yatube_slow_query_seconds_total', 'counter',
+                   'Суммарное время медленных SQL-запросов.',
+                   [((('endpoint', e), ('statement', s)),
+                     round(self.slow_time[e, s], 6)) for e, s in slow])
+            family('yatube_cache_hits_total', 'counter',
+                   'Попадания в кеш страниц и фрагментов.',
+                   [((), self.cache['hits'])])
+            family('yatube_cache_misses_total', 'counter',
+                   'Промахи кеша страниц и фрагментов.',
+                   [((), self.cache['misses'])])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Счетчики текущего приложения, у каждого приложения из create_app свои.
+registry = LocalProxy(lambda: current_app.extensions['metrics'])
+
+
+def current_metrics():
+    if has_request_context():
+        return g.get('metrics')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'handle_error')
+def query_failed(context):
+    # after_cursor_execute после ошибки не вызывается, и время начала
+    # осталось бы на стеке соединения.
+    if context.connection is not None:
+        started = context.connection.info.get('query_started')
+        if started:
+            started.pop()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def query_finished(conn, cursor, statement, parameters, context,
+                   executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    metrics = current_metrics()
+    if metrics is None:
+        return
+    shape = normalize_sql(statement)
+    metrics.queries += 1
+    metrics.db_time += elapsed
+    metrics.shapes[shape] += 1
+    if elapsed >= current_app.config['METRICS_SLOW_QUERY']:
+        metrics.slow.append((shape, elapsed))
+
+
+def start_request(sender, **extra):
+    g.metrics = RequestMetrics()
+
+
+def start_render(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.render_started = time.perf_counter()
+
+
+def finish_render(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None and metrics.render_started is not None:
+        metrics.render_time += time.perf_counter() - metrics.render_started
+        metrics.render_started = None
+
+
+def finish_request(sender, response, **extra):
+    metrics = current_metrics()
+    if metrics is None:
+        return
+    endpoint = request.endpoint or 'unknown'
+    threshold = current_app.config['METRICS_N_PLUS_ONE']
+    n_plus_one = False
+    if threshold and metrics.shapes:
+        shape, repeats = metrics.shapes.most_common(1)[0]
+        if repeats > threshold:
+            n_plus_one = True
+            current_app.logger.warning(
+                'Возможный N+1 в %s: запрос выполнен %d раз: %s',
+                endpoint, repeats, shape)
+    registry.record(endpoint, metrics,
+                    time.perf_counter() - metrics.started, n_plus_one)
+
+
+def add_query_count(response):
+    # Для нагрузочных тестов (benchmarks/scenarios.py): число SQL-запросов
+    # видно клиенту и тогда, когда приложение работает в gunicorn.
+    metrics = current_metrics()
+    if current_app.config['METRICS_QUERY_HEADER'] and metrics is not None:
+        response.headers['X-Query-Count'] = str(metrics.queries)
+    return response
+
+
+def get_metrics():
+    """Метрики для Prometheus. Доступны по токену METRICS_TOKEN
+    в заголовке Authorization: Bearer, без токена выключены.
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode(),
+                               f'Bearer {token}'.encode()):
+        abort(401)
+    return current_app.response_class(
+        registry.combined().render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    counters = app.extensions['metrics'] = MetricsRegistry(
+        app, app.config['METRICS_DIR'], app.config['METRICS_SAVE_INTERVAL'])
+    if counters.directory:
+        os.makedirs(counters.directory, exist_ok=True)
+
+        def save():
+            with app.app_context():
+                counters.save()
+        # Последние счетчики воркера не теряются при его остановке.
+        atexit.register(save)
+    request_started.connect(start_request, app)
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(finish_render, app)
+    request_finished.connect(finish_request, app)
+    app.after_request(add_query_count)
+    app.add_url_rule('/metrics', 'metrics', get_metrics)
@@ -0,0 +1,115 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import abort, request, url_for
+from sqlalchemy import tuple_
+
+
+class KeysetPage:
+    """Страница выборки с курсорной пагинацией по (created_at, id).
+
+    В отличие от Pagination из Flask-SQLAlchemy не выполняет COUNT(*)
+    и OFFSET, поэтому любая страница стоит столько же, сколько первая.
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None,
+                 total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # Общее количество записей, считается только по запросу.
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(item, direction):
+    """Упаковывает позицию записи в непрозрачный токен для ссылки."""
+    payload = json.dumps([item.created_at.isoformat(), item.id, direction])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковывает токен в (created_at, id, направление)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, item_id, direction = json.loads(raw)
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return datetime.fromisoformat(created_at), int(item_id), direction
+    except (ValueError, TypeError):
+        abort(404)
+
+
+def paginate_keyset(query, model, cursor=None, per_page=3,
+                    with_total=False):
+    """Курсорная пагинация запроса по (created_at, id), от новых к старым."""
+    key = tuple_(model.created_at, model.id)
+    total = query.order_by(None).count() if with_total else None
+    direction = 'next'
+    if cursor:
+        created_at, item_id, direction = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(key < tuple_(created_at, item_id))
+        else:
+            query = query.filter(key > tuple_(created_at, item_id))
+    if direction == 'next':
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at.asc(), model.id.asc())
+    # Лишняя запись показывает, есть ли страница дальше, без COUNT(*).
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if direction == 'next':
+        has_next, has_prev = has_more, bool(cursor)
+    else:
+        items.reverse()
+        has_next, has_prev = True, has_more
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1], 'next')
+        if items and has_next else None,
+        prev_cursor=encode_cursor(items[0], 'prev')
+        if items and has_prev else None,
+        total=total,
+    )
+
+
+def paginate_request(query, model, per_page=3):
+    """Выбирает режим пагинации по параметрам запроса.
+
+    ?page=N оставлен для старых ссылок, по умолчанию используется курсор.
+    ?count=1 добавляет подсчет общего количества записей.
+    """
+    page = request.args.get('page', type=int)
+    if page:
+        return query.order_by(
+            model.created_at.desc(), model.id.desc()
+        ).paginate(page=page, per_page=per_page)
+    return paginate_keyset(
+        query,
+        model,
+        cursor=request.args.get('cursor'),
+        per_page=per_page,
+        with_total='count' in request.args,
+    )
+
+
+def url_for_page(**params):
+    """Ссылка на текущую страницу с замененными параметрами запроса."""
+    args = request.args.to_dict()
+    args.pop('page', None)
+    args.update(params)
+    return url_for(request.endpoint, **request.view_args, **args)
+
+
+def init_app(app):
+    app.add_template_global(url_for_page)
@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app, flash, render_template
+
+from app import bcrypt
+
+
+class PasswordBusy(RuntimeError):
+    """Очередь хеширования паролей не успела дойти до запроса."""
+
+
+_executor = None
+_executor_pid = None
+
+
+def get_executor():
+    """Пул потоков для bcrypt, свой в каждом воркере gunicorn.
+    bcrypt отпускает GIL, поэтому пул ограничивает число ядер, занятых
+    хешированием, а страницы продолжают рендериться в других потоках.
+    """
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config['PASSWORD_HASH_WORKERS'],
+            thread_name_prefix='password-hash')
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def _run(function, *args):
+    timeout = current_app.config['PASSWORD_HASH_TIMEOUT']
+    future = get_executor().submit(function, *args)
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        future.cancel()
+        raise PasswordBusy('Очередь хеширования паролей переполнена')
+
+
+def hash_password(password):
+    """Хеш пароля с текущей стоимостью BCRYPT_LOG_ROUNDS."""
+    return _run(bcrypt.generate_password_hash, password,
+                current_app.config['BCRYPT_LOG_ROUNDS']).decode('utf-8')
+
+
+def hash_rounds(password_hash):
+    """Стоимость, с которой получен хеш вида $2b$12$..."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def check_password(user, password):
+    """Проверяет пароль. Если хеш получен с другой стоимостью,
+    заменяет его новым; сохранить изменение должен вызывающий код.
+    """
+    try:
+        valid = _run(bcrypt.check_password_hash, user.password, password)
+    except ValueError:
+        # В базе не bcrypt-хеш.
+        return False
+    if valid and hash_rounds(user.password) != \
+            current_app.config['BCRYPT_LOG_ROUNDS']:
+        user.password = hash_password(password)
+    return valid
+
+
+def password_busy(error):
+    flash('Сервер перегружен, попробуйте еще раз через минуту.', 'warning')
+    return render_template('error/500.html'), 503
+
+
+def init_app(app):
+    app.register_error_handler(PasswordBusy, password_busy)
@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+
+class QueryCounter:
+    """Список SQL-выражений, выполненных внутри блока count_queries."""
+
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context,
+                 executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+
+@contextmanager
+def count_queries(app=None):
+    """Подсчет запросов к базе данных внутри блока with. app нужен,
+    если блок выполняется вне контекста приложения.
+    """
+    counter = QueryCounter()
+    engine = db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+
+@contextmanager
+def assert_max_queries(limit, app=None):
+    """Падает с AssertionError, если в блоке выполнено больше limit
+    запросов. В сообщении перечислены все выполненные запросы.
+    """
+    with count_queries(app) as counter:
+        yield counter
+    if counter.count > limit:
+        statements = '\n'.join(
+            f'{number}. {statement}'
+            for number, statement in enumerate(counter.statements, 1))
+        raise AssertionError(
+            f'Выполнено {counter.count} запросов вместо не более {limit}:\n'
+            f'{statements}')
+
+
+def insert_ignore(connection, table, values):
+    """INSERT, который ничего не делает, если строка нарушает
+    уникальный индекс. Возвращает число вставленных строк.
+    """
+    if connection.dialect.name == 'sqlite':
+        statement = sqlite.insert(table).on_conflict_do_nothing()
+    elif connection.dialect.name == 'postgresql':
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    else:
+        # Для остальных баз повтор ловится уникальным индексом.
+        try:
+            with connection.begin_nested():
+                return connection.execute(
+                    table.insert().values(values)).rowcount
+        except IntegrityError:
+            return 0
+    return connection.execute(statement.values(values)).rowcount
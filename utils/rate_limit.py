@@ -0,0 +1,75 @@
+import threading
+import time
+
+from flask import current_app
+
+from utils.cache import RedisCache, cache
+
+
+class RateLimit:
+    """Ограничение числа событий на ключ за период, фиксированными окнами.
+
+    С CACHE_BACKEND='redis' счетчики общие для всех воркеров, иначе
+    каждый процесс считает сам, и предел фактически умножается на
+    число воркеров.
+    """
+
+    def __init__(self, name, setting):
+        self.name = name
+        # Настройка вида (число событий, период в секундах).
+        self.setting = setting
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return current_app.config[self.setting][0]
+
+    @property
+    def period(self):
+        return current_app.config[self.setting][1]
+
+    def _key(self, key):
+        window = int(time.time() // self.period)
+        return f'rate:{self.name}:{key}:{window}', window
+
+    def count(self, key):
+        """Сколько событий уже было в текущем окне."""
+        full_key, window = self._key(key)
+        if isinstance(cache.backend, RedisCache):
+            return int(cache.client.get(full_key) or 0)
+        with self._lock:
+            return self._counts.get(full_key, (window, 0))[1]
+
+    def exceeded(self, key):
+        return self.count(key) >= self.limit
+
+    def hit(self, key):
+        """Отмечает событие. Возвращает новое значение счетчика."""
+        full_key, window = self._key(key)
+        if isinstance(cache.backend, RedisCache):
+            pipeline = cache.client.pipeline()
+            pipeline.incr(full_key)
+            pipeline.expire(full_key, self.period)
+            return pipeline.execute()[0]
+        with self._lock:
+            # Счетчики прошлых окон больше не нужны.
+            if len(self._counts) > 10000:
+                self._counts = {
+                    k: v for k, v in self._counts.items() if v[0] == window}
+            count = self._counts.get(full_key, (window, 0))[1] + 1
+            self._counts[full_key] = (window, count)
+            return count
+
+    def reset(self, key):
+        full_key, _ = self._key(key)
+        if isinstance(cache.backend, RedisCache):
+            cache.client.delete(full_key)
+            return
+        with self._lock:
+            self._counts.pop(full_key, None)
+
+
+# Неудачные входы в один аккаунт и все попытки входа с одного адреса.
+login_account_limit = RateLimit('login-account', 'LOGIN_LIMIT_PER_ACCOUNT')
+login_ip_limit = RateLimit('login-ip', 'LOGIN_LIMIT_PER_IP')
@@ -0,0 +1,72 @@
+import random
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm
+from sqlalchemy.sql.selectable import SelectBase
+from sqlalchemy.sql.dml import UpdateBase
+
+# Методы, которые не меняют данные. Только такие запросы читают с реплик.
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def replica_binds(config):
+    """Ключи реплик в SQLALCHEMY_BINDS."""
+    return sorted(key for key in config.get('SQLALCHEMY_BINDS') or ()
+                  if key.startswith('replica'))
+
+
+class RoutingSession(SignallingSession):
+    """Сессия, которая отправляет SELECT безопасных HTTP-запросов на
+    реплику, в том числе текстовые text(...).columns(...). Запись, flush
+    и все, что идет после записи в том же запросе, остаются на основной
+    базе.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or clause is None or isinstance(clause, UpdateBase):
+            # Без выражения (session.connection()) намерение неизвестно,
+            # поэтому такие обращения тоже считаются записью.
+            self.info['wrote'] = True
+        elif isinstance(clause, SelectBase) and not self.info.get('wrote') \
+                and has_request_context() and g.get('replica'):
+            return self.db.get_engine(self.app, bind=g.replica)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy с чтением с реплик из SQLALCHEMY_BINDS (ключи replica*).
+
+    После записи пользователь читает с основной базы еще
+    REPLICA_STICKY_SECONDS секунд, чтобы видеть свои изменения,
+    пока они не дошли до реплик.
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.before_request(self._choose_bind)
+        app.after_request(self._remember_write)
+
+    def _choose_bind(self):
+        g.replica = None
+        replicas = replica_binds(self.get_app().config)
+        if replicas and request.method in SAFE_METHODS \
+                and session.get('primary_until', 0) < time.time():
+            g.replica = random.choice(replicas)
+
+    def _remember_write(self, response):
+        wrote = self.session().info.pop('wrote', False)
+        if not replica_binds(self.get_app().config):
+            return response
+        if request.method not in SAFE_METHODS or wrote:
+            session['primary_until'] = time.time() + \
+                self.get_app().config['REPLICA_STICKY_SECONDS']
+        return response
@@ -0,0 +1,267 @@
+import re
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import DDL, Integer, String, column, event, text
+from sqlalchemy.orm import joinedload
+from flask_sqlalchemy import Pagination
+
+from app import db, Post
+
+try:
+    import snowballstemmer
+except ImportError:
+    snowballstemmer = None
+
+# Окончания для упрощенного стемминга, если snowballstemmer не установлен.
+# Отсортированы по длине, чтобы сначала отрезалось самое длинное.
+RUSSIAN_ENDINGS = sorted((
+    'ившись', 'ывшись', 'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ешь', 'ете', 'ишь', 'ите',
+    'ила', 'ыла', 'ена', 'ило', 'ыло', 'ено', 'ует', 'уют', 'иев', 'ьев',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий', 'ый', 'ом',
+    'ем', 'ам', 'ям', 'ах', 'ях', 'ую', 'юю', 'ия', 'ья', 'ов', 'ев',
+    'ых', 'их', 'ью', 'ть', 'ла', 'ли', 'ло', 'на', 'ет', 'ют', 'ит',
+    'ат', 'ят', 'а', 'я', 'о', 'е', 'и', 'ы',
+    'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+if snowballstemmer is not None:
+    _russian_stemmer = snowballstemmer.stemmer('russian')
+else:
+    _russian_stemmer = None
+
+
+def stem(word):
+    """Приводит слово к основе, чтобы 'посты' находили 'пост'."""
+    word = word.lower().replace('ё', 'е')
+    if _russian_stemmer is not None:
+        return _russian_stemmer.stemWord(word)
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= \
+                MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(value):
+    """Разбивает текст на основы слов."""
+    return [stem(word) for word in WORD_RE.findall(value or '')]
+
+
+class SearchBackend:
+    """Базовый класс поискового движка по постам."""
+
+    name = None
+
+    def search(self, q, page, per_page):
+        """Возвращает (id постов в порядке релевантности, всего найдено)."""
+        raise NotImplementedError
+
+    def index_post(self, connection, post):
+        pass
+
+    def remove_post(self, connection, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class LikeSearchBackend(SearchBackend):
+    """Поиск через LIKE, для баз без полнотекстового индекса."""
+
+    name = 'like'
+
+    def search(self, q, page, per_page):
+        query = Post.query.with_entities(Post.id).filter(
+            Post.title.contains(q) | Post.text.contains(q))
+        total = query.order_by(None).count()
+        ids = [row.id for row in query.order_by(
+            Post.created_at.desc(), Post.id.desc()
+        ).limit(per_page).offset((page - 1) * per_page)]
+        return ids, total
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Полнотекстовый поиск на виртуальной таблице SQLite FTS5.
+
+    В таблицу пишутся уже выделенные основы слов, rowid совпадает с id
+    поста, поэтому поиск не сканирует таблицу post.
+    """
+
+    name = 'fts5'
+    table = 'post_fts'
+    # Совпадение в заголовке весит больше, чем в тексте.
+    title_weight = 2.0
+    # Дальше этого числа совпадения не считаются, чтобы частое слово
+    # не заставляло обходить весь индекс ради номера последней страницы.
+    max_counted = 1000
+    create_sql = (f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} '
+                  f"USING fts5(title, text, tokenize='unicode61')")
+
+    def __init__(self):
+        self._ready = False
+
+    @classmethod
+    def create_table(cls, connection):
+        connection.execute(text(cls.create_sql))
+
+    def table_exists(self, executor):
+        """executor - соединение или сессия. Через сессию это обычный
+        SELECT: в GET-запросе он идет на реплику.
+        """
+        if not self._ready:
+            self._ready = executor.execute(text(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'table' AND name = :name"
+            ).columns(column('name', String)),
+                {'name': self.table}).first() is not None
+        return self._ready
+
+    @staticmethod
+    def match_expression(q):
+        """Строка запроса FTS5: все слова, каждое как префикс основы."""
+        return ' '.join(f'"{token}"*' for token in tokenize(q))
+
+    def search(self, q, page, per_page):
+        expression = self.match_expression(q)
+        if not expression:
+            return [], 0
+        if not self.table_exists(db.session):
+            # Таблицу создают миграция или flask search-rebuild, не GET.
+            current_app.logger.warning(
+                'Нет таблицы %s, поиск через LIKE до flask search-rebuild',
+                self.table)
+            return LikeSearchBackend().search(q, page, per_page)
+        params = {'q': expression}
+        # Через session.execute и с columns(): RoutingSession видит, что
+        # это SELECT, и в GET-запросе отправляет его на реплику.
+        total = db.session.execute(text(
+            f'SELECT count(*) AS total FROM (SELECT 1 FROM {self.table} '
+            f'WHERE {self.table} MATCH :q LIMIT :max_counted)'
+        ).columns(column('total', Integer)),
+            dict(params, max_counted=self.max_counted)).scalar()
+        ids = db.session.execute(text(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH :q '
+            f'ORDER BY bm25({self.table}, :weight, 1.0) '
+            f'LIMIT :limit OFFSET :offset'
+        ).columns(column('rowid', Integer)),
+            dict(params, weight=self.title_weight, limit=per_page,
+                 offset=(page - 1) * per_page)).scalars().all()
+        return ids, total
+
+    def index_post(self, connection, post):
+        if not self.table_exists(connection):
+            return
+        self.remove_post(connection, post.id)
+        connection.execute(text(
+            f'INSERT INTO {self.table} (rowid, title, text) '
+            f'VALUES (:id, :title, :text)'
+        ), {'id': post.id, 'title': ' '.join(tokenize(post.title)),
+            'text': ' '.join(tokenize(post.text))})
+
+    def remove_post(self, connection, post_id):
+        if not self.table_exists(connection):
+            return
+        connection.execute(
+            text(f'DELETE FROM {self.table} WHERE rowid = :id'),
+            {'id': post_id})
+
+    def rebuild(self, batch_size=1000):
+        connection = db.session.connection()
+        connection.execute(text(f'DROP TABLE IF EXISTS {self.table}'))
+        self.create_table(connection)
+        self._ready = True
+        rows = Post.query.with_entities(
+            Post.id, Post.title, Post.text).yield_per(batch_size)
+        batch = []
+        for row in rows:
+            batch.append({'id': row.id,
+                          'title': ' '.join(tokenize(row.title)),
+                          'text': ' '.join(tokenize(row.text))})
+            if len(batch) >= batch_size:
+                self._insert_many(connection, batch)
+                batch = []
+        if batch:
+            self._insert_many(connection, batch)
+        connection.execute(text(
+            f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')"))
+        db.session.commit()
+
+    def _insert_many(self, connection, batch):
+        connection.execute(text(
+            f'INSERT INTO {self.table} (rowid, title, text) '
+            f'VALUES (:id, :title, :text)'
+        ), batch)
+
+
+BACKENDS = {
+    LikeSearchBackend.name: LikeSearchBackend,
+    SQLiteFTSBackend.name: SQLiteFTSBackend,
+}
+
+
+def get_backend():
+    """Поисковый движок из SEARCH_BACKEND, по умолчанию FTS5 для SQLite.
+    Создается при первом обращении, свой у каждого приложения.
+    """
+    backend = current_app.extensions.get('search')
+    if backend is None:
+        name = current_app.config.get('SEARCH_BACKEND')
+        if name is None:
+            name = 'fts5' if db.engine.dialect.name == 'sqlite' else 'like'
+        backend = current_app.extensions['search'] = BACKENDS[name]()
+    return backend
+
+
+def search_posts(q, page=1, per_page=3):
+    """Страница найденных постов, отсортированных по релевантности."""
+    ids, total = get_backend().search(q, page, per_page)
+    posts = {post.id: post for post in Post.query.options(
+        joinedload(Post.author)).filter(Post.id.in_(ids))}
+    items = [posts[post_id] for post_id in ids if post_id in posts]
+    return Pagination(None, page, per_page, total, items)
+
+
+# Таблица индекса создается вместе с таблицей post (db.create_all),
+# в существующей базе - миграцией.
+event.listen(Post.__table__, 'after_create', DDL(
+    SQLiteFTSBackend.create_sql).execute_if(dialect='sqlite'))
+event.listen(Post.__table__, 'after_drop', DDL(
+    f'DROP TABLE IF EXISTS {SQLiteFTSBackend.table}'
+).execute_if(dialect='sqlite'))
+
+
+@event.listens_for(Post, 'after_insert')
+def index_new_post(mapper, connection, target):
+    get_backend().index_post(connection, target)
+
+
+@event.listens_for(Post, 'after_update')
+def reindex_post(mapper, connection, target):
+    state = db.inspect(target)
+    if state.attrs.title.history.has_changes() or \
+            state.attrs.text.history.has_changes():
+        get_backend().index_post(connection, target)
+
+
+@event.listens_for(Post, 'after_delete')
+def unindex_post(mapper, connection, target):
+    get_backend().remove_post(connection, target.id)
+
+
+@click.command('search-rebuild')
+@with_appcontext
+def rebuild_search_index():
+    """Перестраивает поисковый индекс по всем постам."""
+    backend = get_backend()
+    backend.rebuild()
+    click.echo(f'Поисковый индекс {backend.name} перестроен.')
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_search_index)
@@ -0,0 +1,205 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, literal, select, tuple_
+from sqlalchemy.orm import joinedload
+
+from app import db, User, Post, TimelineEntry, followers
+from utils.pagination import KeysetPage, decode_cursor, encode_cursor
+
+user_table = User.__table__
+post_table = Post.__table__
+entry_table = TimelineEntry.__table__
+
+
+def is_celebrity(followers_count):
+    """Посты такого автора читаются из его ленты, а не раскладываются."""
+    return followers_count > current_app.config['TIMELINE_FANOUT_LIMIT']
+
+
+@event.listens_for(Post, 'after_insert')
+def fan_out_post(mapper, connection, target):
+    """Раскладывает новый пост по уже построенным лентам подписчиков
+    и тут же обрезает их до TIMELINE_MAX_ENTRIES.
+    """
+    followers_count = connection.execute(
+        select(user_table.c.followers_count).where(
+            user_table.c.id == target.user_id)
+    ).scalar()
+    if is_celebrity(followers_count or 0):
+        return
+    connection.execute(entry_table.insert().from_select(
+        ['user_id', 'post_id', 'created_at'],
+        select(
+            followers.c.follower_id,
+            literal(target.id, db.Integer),
+            literal(target.created_at, db.DateTime),
+        ).join(
+            user_table, user_table.c.id == followers.c.follower_id
+        ).where(
+            followers.c.followed_id == target.user_id,
+            user_table.c.timeline_built.is_(True),
+        ),
+    ))
+    trim_timelines_of(connection, select(followers.c.follower_id).where(
+        followers.c.followed_id == target.user_id))
+
+
+@event.listens_for(Post, 'before_delete')
+def remove_post_from_timelines(mapper, connection, target):
+    connection.execute(
+        entry_table.delete().where(entry_table.c.post_id == target.id))
+
+
+def fill_timeline(user, author_ids):
+    """Добавляет в ленту пользователя последние посты авторов."""
+    posts = select(post_table.c.id, post_table.c.created_at).where(
+        post_table.c.user_id.in_(author_ids)
+    ).order_by(
+        post_table.c.created_at.desc()
+    ).limit(current_app.config['TIMELINE_MAX_ENTRIES']).subquery()
+    db.session.execute(entry_table.insert().from_select(
+        ['user_id', 'post_id', 'created_at'],
+        select(literal(user.id, db.Integer), posts.c.id, posts.c.created_at),
+    ))
+
+
+def build_timeline(user):
+    """Заполняет ленту при первом чтении последними постами
+    авторов, на которых подписан пользователь.
+    """
+    authors = select(followers.c.followed_id).join(
+        user_table, user_table.c.id == followers.c.followed_id
+    ).where(
+        followers.c.follower_id == user.id,
+        user_table.c.followers_count <=
+        current_app.config['TIMELINE_FANOUT_LIMIT'],
+    )
+    fill_timeline(user, authors)
+    user.timeline_built = True
+
+
+def on_follow(user, author):
+    """Добавляет в ленту посты автора, на которого подписался user."""
+    if not user.timeline_built or is_celebrity(author.followers_count):
+        return
+    fill_timeline(user, [author.id])
+    trim_timeline(user.id)
+
+
+def on_unfollow(user, author):
+    """Убирает из ленты посты автора после отписки."""
+    db.session.execute(entry_table.delete().where(
+        entry_table.c.user_id == user.id,
+        entry_table.c.post_id.in_(
+            select(post_table.c.id).where(post_table.c.user_id == author.id)),
+    ))
+
+
+def trim_timelines_of(executor, user_ids):
+    """Одним DELETE удаляет из лент пользователей user_ids (список или
+    SELECT) записи сверх TIMELINE_MAX_ENTRIES. executor - соединение
+    или сессия.
+    """
+    ranked = select(
+        entry_table.c.user_id, entry_table.c.post_id,
+        func.row_number().over(
+            partition_by=entry_table.c.user_id,
+            order_by=(entry_table.c.created_at.desc(),
+                      entry_table.c.post_id.desc()),
+        ).label('position'),
+    ).where(entry_table.c.user_id.in_(user_ids)).subquery()
+    executor.execute(entry_table.delete().where(
+        tuple_(entry_table.c.user_id, entry_table.c.post_id).in_(
+            select(ranked.c.user_id, ranked.c.post_id).where(
+                ranked.c.position >
+                current_app.config['TIMELINE_MAX_ENTRIES']))
+    ))
+
+
+def trim_timeline(user_id):
+    """Удаляет из ленты записи сверх TIMELINE_MAX_ENTRIES. Вызывается
+    при записи (новый пост, подписка), а не при чтении ленты.
+    """
+    trim_timelines_of(db.session, [user_id])
+
+
+def trim_timelines():
+    """Обрезает все ленты длиннее TIMELINE_MAX_ENTRIES, например после
+    уменьшения настройки. Возвращает число обрезанных лент.
+    """
+    user_ids = db.session.execute(
+        select(entry_table.c.user_id).group_by(entry_table.c.user_id).having(
+            func.count() > current_app.config['TIMELINE_MAX_ENTRIES'])
+    ).scalars().all()
+    if user_ids:
+        trim_timelines_of(db.session, user_ids)
+    db.session.commit()
+    return len(user_ids)
+
+
+def feed_page(user, cursor=None, per_page=3):
+    """Страница ленты: посты из материализованной ленты плюс посты
+    популярных авторов, которые подмешиваются при чтении.
+    """
+    if not user.timeline_built:
+        build_timeline(user)
+        db.session.commit()
+    after = None
+    if cursor:
+        created_at, post_id, _ = decode_cursor(cursor)
+        after = tuple_(created_at, post_id)
+
+    entries = select(
+        entry_table.c.post_id.label('id'), entry_table.c.created_at
+    ).where(entry_table.c.user_id == user.id)
+    if after is not None:
+        entries = entries.where(
+            tuple_(entry_table.c.created_at, entry_table.c.post_id) < after)
+    rows = db.session.execute(entries.order_by(
+        entry_table.c.created_at.desc(), entry_table.c.post_id.desc()
+    ).limit(per_page + 1)).all()
+
+    celebrities = select(followers.c.followed_id).join(
+        user_table, user_table.c.id == followers.c.followed_id
+    ).where(
+        followers.c.follower_id == user.id,
+        user_table.c.followers_count >
+        current_app.config['TIMELINE_FANOUT_LIMIT'],
+    )
+    posts = select(post_table.c.id, post_table.c.created_at).where(
+        post_table.c.user_id.in_(celebrities))
+    if after is not None:
+        posts = posts.where(
+            tuple_(post_table.c.created_at, post_table.c.id) < after)
+    rows += db.session.execute(posts.order_by(
+        post_table.c.created_at.desc(), post_table.c.id.desc()
+    ).limit(per_page + 1)).all()
+
+    # Пост может прийти из обоих источников, если автор стал популярным
+    # уже после того, как пост попал в ленту.
+    rows = sorted({row.id: row for row in rows}.values(),
+                  key=lambda row: (row.created_at, row.id), reverse=True)
+    ids = [row.id for row in rows[:per_page]]
+    loaded = {post.id: post for post in Post.query.options(
+        joinedload(Post.author)).filter(Post.id.in_(ids))}
+    items = [loaded[post_id] for post_id in ids if post_id in loaded]
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1], 'next')
+        if items and len(rows) > per_page else None,
+    )
+
+
+@click.command('timeline-trim')
+@with_appcontext
+def trim_timelines_command():
+    """Удаляет из лент записи сверх TIMELINE_MAX_ENTRIES. Ленты
+    обрезаются при каждом новом посте, команда нужна только после
+    уменьшения настройки.
+    """
+    click.echo(f'Обрезано лент: {trim_timelines()}')
+
+
+def init_app(app):
+    app.cli.add_command(trim_timelines_command)
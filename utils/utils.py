@@ -1,27 +1,22 @@
-import os
-import secrets
+from urllib.parse import urlparse
 
 from flask import flash, url_for, redirect, abort
 from flask_login import login_required, current_user
-from flask_mail import Message
-from PIL import Image
 
-from app import app, db, mail, Post, Comment, Like, User, bcrypt
+from app import db, Post, Comment, Like, User
+from utils.mail_queue import enqueue_mail
+from utils.passwords import hash_password
 
 
-def save_pic(form_pic):
-    """Сохраняет изображение."""
-    random = secrets.token_hex(10)
-    _, file_extention = os.path.splitext(form_pic.filename)
-    pic_file_name = random + file_extention
-    pic_path = os.path.join(
-        app.root_path, 'static/profile_pics', pic_file_name)
-    # Сохраняем фото в определенном размере
-    pic_size = (400, 400)
-    image = Image.open(form_pic)
-    image.thumbnail(pic_size)
-    image.save(pic_path)
-    return pic_file_name
+def is_local_url(target):
+    """Адрес на этом же сайте: путь без схемы и хоста. Обратная косая
+    заменяется, потому что браузеры читают /\\evil.com как //evil.com.
+    """
+    if not target:
+        return False
+    parsed = urlparse(target.replace('\\', '/'))
+    return not parsed.scheme and not parsed.netloc and \
+        parsed.path.startswith('/')
 
 
 def send_message(form):
@@ -29,13 +24,10 @@ def send_message(form):
     if not current_user.is_authenticated:
         abort(403)
     author = current_user.username
-    message = form.message.data
-    msg = Message(f'Отзыв пользователя {author}',
-                  recipients=['pozdeev1994@mail.ru'])
-    msg.body = message
-    mail.send(msg)
+    enqueue_mail(f'Отзыв пользователя {author}',
+                 ['pozdeev1994@mail.ru'], form.message.data)
     flash('Сообщение отправлено', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('blog.index'))
 
 
 def send_reset_email(user):
@@ -43,17 +35,13 @@ def send_reset_email(user):
      по которой тот должен перейти и поменять пароль.
      """
     token = user.get_reset_token()
-    msg = Message('Смена пароля',
-                  recipients=[user.email])
-    msg.body = f'''
+    body = f'''
     Чтобы поменять пароль,перейдите по ссылке:
-    {url_for('reset_token', token=token, _external=True)}
+    {url_for('auth.reset_token', token=token, _external=True)}
     Если вы не получали этого сообщения,просто проигнорируйте данное сообщение.
     '''
-    mail.send(msg)
+    enqueue_mail('Смена пароля', [user.email], body)
 
 
 def make_hashed_password(form):
-    hashed_password = bcrypt.generate_password_hash(
-        form.password.data).decode('utf-8')
-    return hashed_password
+    return hash_password(form.password.data)
@@ -1,9 +1,6 @@
-from app import app
-from blog import views
-import models
-from auth import views
-from follow import view
-from profile import views
+from app import create_app
+
+app = create_app()
 
 
 if __name__ == '__main__':